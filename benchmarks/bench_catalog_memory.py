@@ -0,0 +1,97 @@
+"""Measures tracemalloc peak and retained memory for loading and saving a large synthetic catalog:
+the whole-string json.loads path vs the streaming parser, raw dict groups vs catalog.Group
+records, and the binary snapshot.
+
+    python benchmarks/bench_catalog_memory.py [--groups 50000] [--variants 8]
+
+The payload (benchmarks/synthetic.py) is written to a temporary JSON file first. Each row runs
+with tracemalloc started fresh, so "peak" is the most the step held at once and "retained" is
+what its result keeps alive. "json.loads(f.read())" is how the scrape response used to be
+parsed (the whole text, then the document); "json.dump(indent=2)" is how scraped_products.json
+used to be rewritten.
+"""
+import argparse
+import gc
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(step):
+    """Runs step() under tracemalloc; returns (seconds, peak bytes, retained bytes)."""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = step()
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, peak, retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--groups", type=int, default=50000)
+    parser.add_argument("--variants", type=int, default=8)
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    import catalog
+    import catalog_io
+    import synthetic
+
+    scratch = tempfile.mkdtemp(prefix="bench-catalog-")
+    payload_path = os.path.join(scratch, "scrape.json")
+    snapshot_path = os.path.join(scratch, "products.snapshot")
+    result = synthetic.scrape_result(args.groups, args.variants)
+    with open(payload_path, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+    catalog_io.write_snapshot(snapshot_path, result)
+    variants = sum(len(g["products"]) for g in result["data"])
+    del result
+    size = os.path.getsize(payload_path)
+
+    def whole_string():
+        with open(payload_path, "r", encoding="utf-8") as f:
+            return json.loads(f.read())
+
+    def snapshot_records():
+        data = catalog_io.load_snapshot(snapshot_path)
+        data["data"] = catalog.build_catalog(data["data"])
+        return data
+
+    loaded = whole_string()
+
+    def dump_indented():
+        with open(os.path.join(scratch, "scraped_products.json"), "w", encoding="utf-8") as f:
+            json.dump(loaded, f, indent=2)
+
+    steps = [
+        ("json.loads(f.read()) -> dicts", whole_string),
+        ("load_catalog -> dicts", lambda: catalog_io.load_catalog(payload_path)),
+        ("load_catalog -> Group records", lambda: catalog_io.load_catalog(payload_path, on_item=catalog.Group)),
+        ("load_snapshot -> dicts", lambda: catalog_io.load_snapshot(snapshot_path)),
+        ("load_snapshot -> Group records", snapshot_records),
+        ("json.dump(indent=2)", dump_indented),
+        ("write_snapshot", lambda: catalog_io.write_snapshot(snapshot_path, loaded)),
+    ]
+
+    print(f"{args.groups} groups / {variants} variants, {size / 2**20:.0f}MB of JSON")
+    print(f"{'step':32} {'time':>8} {'peak':>9} {'retained':>10}")
+    for name, step in steps:
+        elapsed, peak, retained = measure(step)
+        print(f"{name:32} {elapsed:7.1f}s {peak / 2**20:7.0f}MB {retained / 2**20:8.0f}MB")
+
+    shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
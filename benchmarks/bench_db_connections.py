@@ -0,0 +1,143 @@
+"""Replays the database side of handle_dm (ban check, started check, registration, open-ticket
+lookup, activity bump) and reports messages per second, connect-per-call vs the pooled layer.
+
+    python benchmarks/bench_db_connections.py [--messages 5000] [--users 2000] [--db PATH]
+
+The "connect-per-call" column runs copies of the original helpers, which opened a fresh
+sqlite3 connection per statement on a rollback-journal database. The "pooled" column runs the
+bot's own db_* helpers: the per-thread WAL connection from get_db() with USER_CACHE loaded, so
+the ban/started checks are dict lookups. Both replay the same message sequence on identical
+copies of one synthetic database.
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# Connect-per-call helpers as they were before the pooled connection layer
+def legacy_is_user_banned(db_file, user_id):
+    conn = sqlite3.connect(db_file)
+    c = conn.cursor()
+    c.execute("SELECT banned FROM users WHERE user_id = ?", (user_id,))
+    row = c.fetchone()
+    conn.close()
+    return row and row[0] == 1
+
+
+def legacy_check_user_started(db_file, user_id):
+    conn = sqlite3.connect(db_file)
+    c = conn.cursor()
+    c.execute("SELECT started FROM users WHERE user_id = ?", (user_id,))
+    row = c.fetchone()
+    conn.close()
+    return row is not None
+
+
+def legacy_register_user(db_file, user_id):
+    conn = sqlite3.connect(db_file)
+    c = conn.cursor()
+    c.execute("INSERT OR IGNORE INTO users (user_id, started) VALUES (?, 1)", (user_id,))
+    conn.commit()
+    conn.close()
+
+
+def legacy_get_active_tickets(db_file, user_id):
+    conn = sqlite3.connect(db_file)
+    conn.row_factory = sqlite3.Row
+    c = conn.cursor()
+    c.execute("SELECT * FROM tickets WHERE user_id = ? AND closed = 0 ORDER BY created_at DESC", (user_id,))
+    rows = c.fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+
+def legacy_update_ticket_activity(db_file, ticket_id):
+    conn = sqlite3.connect(db_file)
+    c = conn.cursor()
+    c.execute("UPDATE tickets SET last_activity = ?, last_prompt_at = NULL, snooze_until = NULL WHERE id = ?", (time.time(), ticket_id))
+    conn.commit()
+    conn.close()
+
+
+def populate(conn, users, now):
+    """Every other user has started the bot and has one open ticket; 1% of them are banned."""
+    rng = random.Random(42)
+    with conn:
+        conn.executemany("INSERT INTO users (user_id, started, banned) VALUES (?, 1, ?)",
+                         [(u, int(rng.random() < 0.01)) for u in range(0, users, 2)])
+        conn.executemany(
+            "INSERT INTO tickets (id, user_id, section, created_at, last_activity, closed, next_check_at) VALUES (?, ?, ?, ?, ?, 0, ?)",
+            [(f"T{u:07d}", u, "Singles", now - 3600, now - 60, now + 3600) for u in range(0, users, 2)])
+
+
+def replay(messages, banned, started, register, active_tickets, update_activity):
+    """handle_dm's DB calls for each message; returns messages per second."""
+    started_at = time.perf_counter()
+    for user_id in messages:
+        if banned(user_id):
+            continue
+        if not started(user_id):
+            register(user_id)
+        tickets = active_tickets(user_id)
+        if tickets:
+            update_activity(tickets[0]['id'])
+    return len(messages) / (time.perf_counter() - started_at)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--db", help="directory for the two databases (default: a temporary one)")
+    args = parser.parse_args()
+
+    scratch = args.db or tempfile.mkdtemp(prefix="bench-db-conn-")
+    os.makedirs(scratch, exist_ok=True)
+    os.environ["DB_FILE"] = os.path.join(scratch, "pooled.db")
+    sys.path.insert(0, ROOT)
+    import bot
+
+    conn = bot.init_db()
+    populate(conn, args.users, time.time())
+    legacy_db = os.path.join(scratch, "legacy.db")
+    legacy = sqlite3.connect(legacy_db)
+    conn.backup(legacy)
+    legacy.execute("PRAGMA journal_mode=DELETE")
+    legacy.close()
+
+    rng = random.Random(7)
+    messages = [rng.randrange(args.users) for _ in range(args.messages)]
+
+    old = replay(
+        messages,
+        lambda u: legacy_is_user_banned(legacy_db, u),
+        lambda u: legacy_check_user_started(legacy_db, u),
+        lambda u: legacy_register_user(legacy_db, u),
+        lambda u: legacy_get_active_tickets(legacy_db, u),
+        lambda t: legacy_update_ticket_activity(legacy_db, t),
+    )
+    bot.load_user_cache()
+    new = replay(messages, bot.db_is_user_banned, bot.db_check_user_started, bot.db_register_user,
+                 bot.db_get_active_tickets, bot.db_update_ticket_activity)
+
+    stats = bot.USER_CACHE_STATS
+    print(f"{args.messages} messages from {args.users} users ({stats['hits']} cache hits / {stats['misses']} misses)")
+    print(f"{'path':20} {'msg/s':>10}")
+    print(f"{'connect-per-call':20} {old:10.0f}")
+    print(f"{'pooled':20} {new:10.0f}")
+    print(f"{'speedup':20} {new / old:9.1f}x")
+
+    conn.close()
+    if not args.db:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
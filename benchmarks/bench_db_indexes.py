@@ -0,0 +1,106 @@
+"""Times the hot ticket/referral queries on a synthetic database, without and with the
+schema's indexes.
+
+    python benchmarks/bench_db_indexes.py [--tickets 500000] [--runs 20] [--db PATH]
+
+The database is built through bot.init_db() in a temporary directory (or at --db, which is kept),
+filled with --tickets tickets (3% open) and one referral per user. Every query is timed through the
+db_* helper the bot uses: first with the migration indexes dropped, then with them recreated from
+the definitions the migrations wrote.
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INDEXES = ("idx_tickets_user_open", "idx_tickets_closed_activity", "idx_tickets_open_deadline", "idx_referrals_user")
+
+
+def populate(conn, tickets, users, now):
+    rng = random.Random(42)
+    rows = []
+    for i in range(tickets):
+        last_activity = now - rng.uniform(0, 120 * 86400)
+        closed = 0 if rng.random() < 0.03 else 1
+        # As after a check_timeouts pass: only deadlines from the last minute are due
+        next_check_at = None if closed else now + rng.uniform(-60, 14 * 86400)
+        rows.append((f"T{i:07d}", rng.randrange(users), "Singles", last_activity - 3600, last_activity, closed, next_check_at))
+        if len(rows) == 50000:
+            conn.executemany("INSERT INTO tickets (id, user_id, section, created_at, last_activity, closed, next_check_at) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            rows = []
+    if rows:
+        conn.executemany("INSERT INTO tickets (id, user_id, section, created_at, last_activity, closed, next_check_at) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.executemany("INSERT INTO referrals (code, user_id, created_at) VALUES (?, ?, ?)",
+                     [(f"R{u:06d}", u, now) for u in range(users)])
+    conn.commit()
+
+
+def time_queries(bot, runs, users, now):
+    rng = random.Random(7)
+    cases = {
+        "db_get_active_tickets": lambda: bot.db_get_active_tickets(rng.randrange(users)),
+        "db_get_due_tickets": lambda: bot.db_get_due_tickets(now),
+        "db_get_recent_open_tickets": lambda: bot.db_get_recent_open_tickets(20),
+        "db_get_user_referral_code": lambda: bot.db_get_user_referral_code(rng.randrange(users)),
+        # Nothing is older than the cutoff, so this measures finding rows without deleting (or VACUUMing)
+        "db_delete_closed_tickets": lambda: bot.db_delete_closed_tickets(0),
+    }
+    results = {}
+    for name, call in cases.items():
+        samples = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            call()
+            samples.append((time.perf_counter() - started) * 1000)
+        results[name] = statistics.median(samples)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tickets", type=int, default=500000)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--db", help="database path (default: a temporary file)")
+    args = parser.parse_args()
+
+    scratch = None if args.db else tempfile.mkdtemp(prefix="bench-db-")
+    os.environ["DB_FILE"] = args.db or os.path.join(scratch, "bench.db")
+    sys.path.insert(0, ROOT)
+    import bot
+
+    users = max(1, args.tickets // 10)
+    now = time.time()
+    conn = bot.init_db()
+    started = time.perf_counter()
+    populate(conn, args.tickets, users, now)
+    print(f"Built {args.tickets} tickets / {users} users in {time.perf_counter() - started:.1f}s at {bot.DB_FILE}")
+
+    definitions = [row[0] for row in conn.execute(
+        f"SELECT sql FROM sqlite_master WHERE type = 'index' AND name IN ({', '.join('?' * len(INDEXES))})", INDEXES)]
+    for name in INDEXES:
+        conn.execute(f"DROP INDEX {name}")
+    without = time_queries(bot, args.runs, users, now)
+
+    with conn:
+        for sql in definitions:
+            conn.execute(sql)
+    with_indexes = time_queries(bot, args.runs, users, now)
+
+    print(f"{'query':30} {'no index':>12} {'indexed':>12} {'speedup':>9}")
+    for name in without:
+        print(f"{name:30} {without[name]:10.3f}ms {with_indexes[name]:10.3f}ms {without[name] / max(with_indexes[name], 1e-6):8.0f}x")
+
+    conn.close()
+    if scratch:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""Times the scraper's image sync against a local image server and reports wall time and peak RSS,
+the old Chromium/base64 path vs the direct HTTP download engine.
+
+    python benchmarks/bench_image_download.py [--images 14000] [--size 40000] [--only old|new]
+
+The server (in this process) answers every /uploads/ URL with --size bytes over keep-alive
+HTTP/1.1. Each path runs in its own child process with a fresh cache directory. "old" is the
+batch loop _download_images used before the engine: a page on the server's origin fetches 50
+templates per page.evaluate, returns them as base64 data URLs and Python decodes and stores
+them; it needs pyppeteer and a Chromium (PUPPETEER_EXECUTABLE_PATH) and is skipped without
+them. "new" is RogersRoofingScraper._download_images with the browser already closed, as
+the scraper runs it. Peak RSS is sampled over the child's whole process tree, so the old row
+includes Chromium. Browser start-up is not timed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMG_PREFIX = "/uploads/products/"
+
+
+def make_handler(size):
+    body = random.Random(1).randbytes(size)
+
+    class ImageServer(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if self.path.startswith("/uploads/"):
+                self._send("image/jpeg", body)
+            else:
+                self._send("text/html", b"<html><body>bench</body></html>")
+
+        def _send(self, content_type, data):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return ImageServer
+
+
+def tree_rss_kb(root_pid):
+    """Summed VmRSS of root_pid and all its descendants (Linux /proc)."""
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                pass
+    pids, frontier = {root_pid}, [root_pid]
+    while frontier:
+        parent = frontier.pop()
+        for pid, ppid in parents.items():
+            if ppid == parent and pid not in pids:
+                pids.add(pid)
+                frontier.append(pid)
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+        except (OSError, StopIteration):
+            pass
+    return total
+
+
+class RssSampler(threading.Thread):
+    def __init__(self, interval=0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = 0
+        self.running = True
+
+    def run(self):
+        while self.running:
+            self.peak = max(self.peak, tree_rss_kb(os.getpid()))
+            time.sleep(self.interval)
+
+    def stop(self):
+        self.running = False
+        self.join()
+        return max(self.peak, tree_rss_kb(os.getpid()))
+
+
+def groups_for(count):
+    return [{"name": f"Group {i}", "products": [{"id": i, "images": [f"x_imgvariantsize-{i:012x}.jpg"]}]}
+            for i in range(count)]
+
+
+async def legacy_download(page, scraper, image_cache, groups):
+    """The pre-engine batch loop: fetch in the page, ship base64 data URLs back, decode and store."""
+    import base64
+    url_map = {}
+    for g in groups:
+        for p in g["products"]:
+            for img in p["images"]:
+                variants = scraper._get_image_url_variants(img, IMG_PREFIX)
+                url_map[img] = (variants, image_cache.cache_name(variants[0]))
+    items = list(url_map.items())
+    stored = 0
+    for i in range(0, len(items), 50):
+        batch = items[i:i + 50]
+        results = await page.evaluate('''async (variantsMap) => {
+            const out = {};
+            const templates = Object.keys(variantsMap);
+            for (let ti = 0; ti < templates.length; ti += 10) {
+                await Promise.allSettled(templates.slice(ti, ti + 10).map(async (template) => {
+                    for (const url of variantsMap[template]) {
+                        try {
+                            const r = await fetch(url, {credentials: 'include'});
+                            if (r.ok) {
+                                const blob = await r.blob();
+                                const reader = new FileReader();
+                                const b64 = await new Promise((resolve, reject) => {
+                                    reader.onload = () => resolve(reader.result);
+                                    reader.onerror = reject;
+                                    reader.readAsDataURL(blob);
+                                });
+                                out[template] = {data: b64, url: url};
+                                return;
+                            }
+                        } catch (e) {}
+                    }
+                    out[template] = {error: 'All variants failed'};
+                }));
+            }
+            return out;
+        }''', {template: variants for template, (variants, _) in batch})
+        for template, (_, cache_fname) in batch:
+            b64_data = (results.get(template) or {}).get("data")
+            if b64_data and "," in b64_data:
+                if image_cache.store(cache_fname, base64.b64decode(b64_data.split(",", 1)[1])):
+                    stored += 1
+        await asyncio.sleep(0.05)
+    return stored
+
+
+async def run_mode(mode, base_url, count):
+    import image_cache
+    import scraper
+
+    s = scraper.RogersRoofingScraper()
+    s.base_url = base_url
+    groups = groups_for(count)
+    browser = None
+    if mode == "old":
+        browser = await scraper.launch(
+            headless=True, executablePath=s._find_chromium(),
+            args=["--no-sandbox", "--disable-gpu", "--disable-dev-shm-usage"],
+            handleSIGINT=False, handleSIGTERM=False, handleSIGHUP=False,
+        )
+        page = await browser.newPage()
+        await page.goto(base_url + "/")
+
+    sampler = RssSampler()
+    sampler.start()
+    started = time.perf_counter()
+    try:
+        if mode == "old":
+            await legacy_download(page, s, image_cache, groups)
+        else:
+            await s._download_images(groups, IMG_PREFIX)
+        elapsed = time.perf_counter() - started
+    finally:
+        peak = sampler.stop()
+        if browser:
+            await browser.close()
+    stored = sum(1 for name in os.listdir(image_cache.CACHE_DIR) if image_cache.CACHE_NAME_PATTERN.match(name))
+    return {"seconds": elapsed, "peak_rss_kb": peak, "stored": stored}
+
+
+def child(args):
+    sys.path.insert(0, ROOT)
+    import image_cache
+    import scraper
+    image_cache.CACHE_DIR = os.path.join(args.scratch, f"cache-{args.child}")
+    scraper.SESSION_FILE = os.path.join(args.scratch, "session.json")
+    os.makedirs(image_cache.CACHE_DIR, exist_ok=True)
+    with open(os.devnull, "w") as quiet:
+        stdout, sys.stdout = sys.stdout, quiet
+        try:
+            result = asyncio.run(run_mode(args.child, args.base, args.images))
+        finally:
+            sys.stdout = stdout
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--images", type=int, default=14000)
+    parser.add_argument("--size", type=int, default=40000, help="bytes per image")
+    parser.add_argument("--only", choices=["old", "new"])
+    parser.add_argument("--child", choices=["old", "new"], help=argparse.SUPPRESS)
+    parser.add_argument("--base", help=argparse.SUPPRESS)
+    parser.add_argument("--scratch", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args)
+        return
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(args.size))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    scratch = tempfile.mkdtemp(prefix="bench-images-")
+
+    modes = [args.only] if args.only else ["old", "new"]
+    print(f"{args.images} images x {args.size // 1000}KB from {base}")
+    print(f"{'path':22} {'wall':>9} {'peak RSS':>10} {'stored':>8}")
+    for mode in modes:
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", mode, "--base", base,
+             "--scratch", scratch, "--images", str(args.images)],
+            capture_output=True, text=True,
+        )
+        label = "old (Chromium base64)" if mode == "old" else "new (direct HTTP)"
+        if proc.returncode != 0:
+            reason = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"
+            print(f"{label:22} skipped: {reason}")
+            continue
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f"{label:22} {result['seconds']:8.1f}s {result['peak_rss_kb'] / 1024:8.0f}MB {result['stored']:8}")
+
+    server.shutdown()
+    shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Load-tests GET /api/products on the bot's HTTP server and reports requests per second and bytes
+on the wire per response, per-request json.dumps vs the pre-serialized payload.
+
+    python benchmarks/bench_products_api.py [--groups 1700] [--clients 16] [--seconds 5]
+
+The server runs in this process on a synthetic catalog (benchmarks/synthetic.py); --clients
+keep-alive connections are driven from separate processes so the clients do not share the
+server's GIL. "json.dumps per request" answers the way the handler did before the payload was
+precomputed (send_json of the cached scrape result, uncompressed); the other rows serve the
+precomputed bytes for each Accept-Encoding, and "304" revalidates with the current ETag.
+"""
+import argparse
+import asyncio
+import http.client
+import multiprocessing
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def client(port, headers, seconds):
+    """One keep-alive connection issuing requests for `seconds`; returns (requests, wire bytes)."""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    requests = wire = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        conn.request("GET", "/api/products", headers=headers)
+        response = conn.getresponse()
+        body = response.read()
+        if response.status not in (200, 304):
+            raise RuntimeError(f"HTTP {response.status}")
+        requests += 1
+        # Status line + headers + body as the server sent them
+        wire += len(f"HTTP/1.1 {response.status} {response.reason}\r\n") + len(bytes(response.msg)) + len(body)
+    conn.close()
+    return requests, wire
+
+
+def run_load(pool, port, clients, headers, seconds):
+    results = pool.starmap(client, [(port, headers, seconds)] * clients)
+    requests = sum(r for r, _ in results)
+    return requests / seconds, sum(w for _, w in results) / max(requests, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--groups", type=int, default=1700)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="bench-products-")
+    os.environ["DB_FILE"] = os.path.join(scratch, "bench.db")
+    sys.path.insert(0, ROOT)
+    import bot
+    import synthetic
+
+    raw = synthetic.scrape_result(args.groups)
+    bot._set_product_cache(raw)
+    bot.CATALOG_LOADED.set()
+    etag = bot.PRODUCT_CACHE["payload"]["gzip"][1]
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    loop = asyncio.new_event_loop()
+    server = loop.create_task(bot.serve_http("127.0.0.1", port))
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    time.sleep(0.5)
+
+    def legacy_send_products(self, payload=None):
+        self.send_json(raw)
+
+    cases = [
+        ("json.dumps per request", {}, legacy_send_products),
+        ("pre-serialized identity", {}, None),
+        ("pre-serialized gzip", {"Accept-Encoding": "gzip"}, None),
+    ]
+    if bot.brotli:
+        cases.append(("pre-serialized br", {"Accept-Encoding": "gzip, br"}, None))
+    cases.append(("304 (If-None-Match)", {"Accept-Encoding": "gzip", "If-None-Match": etag}, None))
+
+    send_products = bot.BotRequestHandler.send_products
+    print(f"{len(raw['data'])} groups / {sum(len(g['products']) for g in raw['data'])} variants, "
+          f"{args.clients} clients x {args.seconds:g}s")
+    print(f"{'response':26} {'req/s':>9} {'bytes/resp':>12}")
+    with multiprocessing.get_context("spawn").Pool(args.clients) as pool:
+        for name, headers, handler in cases:
+            bot.BotRequestHandler.send_products = handler or send_products
+            rate, size = run_load(pool, port, args.clients, headers, args.seconds)
+            print(f"{name:26} {rate:9.0f} {size:12,.0f}")
+    bot.BotRequestHandler.send_products = send_products
+
+    loop.call_soon_threadsafe(server.cancel)
+    shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Times /api/search queries against the token index at production size (~14k variants) and ten
+times that (~140k), next to the substring scan the WebApp ran on every keystroke.
+
+    python benchmarks/bench_search.py [--sizes 1700,17000] [--runs 200]
+
+Each size builds the query and search indexes through build_catalog_index from a synthetic
+catalog (benchmarks/synthetic.py), then times search_catalog over exact, prefix, typo,
+multi-word and no-hit queries. "scan" is a linear `term in text` pass over every group's
+name/brand/variant text, as render() in webapp.html does (matching only, no ranking).
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUERIES = {
+    "exact": ["mango", "watermelon", "cola", "geekd"],
+    "prefix": ["ma", "stra", "wat", "pe"],
+    "typo": ["mnago", "watermelln", "strawbery", "vanila"],
+    "multi-word": ["blue razz", "mango ice 50mg", "cloud ultra", "lemon tart 20"],
+    "no hit": ["zzzz", "quantum", "xq"],
+}
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1], samples[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="1700,17000", help="comma-separated group counts")
+    parser.add_argument("--runs", type=int, default=200, help="timed runs per query class")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="bench-search-")
+    os.environ["DB_FILE"] = os.path.join(scratch, "bench.db")
+    sys.path.insert(0, ROOT)
+    import bot
+    import catalog
+    import synthetic
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        groups = catalog.build_catalog(synthetic.scrape_result(size)["data"])
+        variants = sum(len(g.products) for g in groups)
+        started = time.perf_counter()
+        bot.build_catalog_index(1, [f"k{i}" for i in range(len(groups))], groups)
+        built = time.perf_counter() - started
+        search = bot.CATALOG_INDEX["search"]
+        print(f"\n{len(groups)} groups / {variants} variants: indexes built in {built * 1000:.0f}ms, "
+              f"{len(search['postings'])} tokens, {len(search['deletions'])} deletion keys")
+        print(f"{'queries':12} {'hits':>6} {'p50':>9} {'p95':>9} {'max':>9} {'scan p50':>10}")
+
+        entries = bot.CATALOG_INDEX["entries"]
+        for name, queries in QUERIES.items():
+            samples, scan_samples = [], []
+            hits = 0
+            for run in range(args.runs):
+                query = queries[run % len(queries)]
+                started = time.perf_counter()
+                hits = max(hits, bot.search_catalog(query)["total"])
+                samples.append((time.perf_counter() - started) * 1000)
+
+                term = query.lower()
+                started = time.perf_counter()
+                [e for e in entries if term in e["search"]]
+                scan_samples.append((time.perf_counter() - started) * 1000)
+            p50, p95, worst = percentiles(samples)
+            print(f"{name:12} {hits:6} {p50:7.3f}ms {p95:7.3f}ms {worst:7.3f}ms {statistics.median(scan_samples):8.3f}ms")
+
+    shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Synthetic scrape results shaped like the shop's /api/products/scrape response, shared by the
+catalog benchmarks. The defaults match production (~1,700 groups, ~14,000 variants)."""
+import random
+
+BRANDS = ["Geekd", "Northern Leaf", "Cloud Co", "Lumen", "Harbor", "In-House", "Vapor Labs", "Peak", "Kinfolk", "Arc"]
+CATEGORIES = ["Disposables", "Pods", "E-Liquid", "Devices", "Coils", "Accessories", "Salt Nic", "Product"]
+FLAVOURS = ["Blue Razz", "Mango Ice", "Strawberry Kiwi", "Watermelon", "Mint", "Grape", "Peach Rings", "Cola",
+            "Lemon Tart", "Tobacco", "Cherry Lime", "Pineapple", "Cotton Candy", "Banana", "Honeydew", "Vanilla"]
+WORDS = ["Ultra", "Max", "Pro", "Bar", "Stick", "Cube", "Mini", "Plus", "Edge", "Flow", "Wave", "Core", "Nova", "Spark"]
+TAGS = ["new", "sale", "nic-salt", "50mg", "20mg", "rechargeable", "mesh", "limited", "bestseller"]
+
+
+def scrape_result(groups=1700, variants=8, seed=42):
+    """A scrape result dict with `groups` groups of `variants` variants on average."""
+    rng = random.Random(seed)
+    data = []
+    next_id = 1
+    for g in range(groups):
+        brand = rng.choice(BRANDS)
+        products = []
+        for _ in range(max(1, int(rng.gauss(variants, variants / 4)))):
+            flavour = rng.choice(FLAVOURS)
+            price = round(rng.uniform(5, 60), 2)
+            products.append({
+                "id": next_id,
+                "name": f"{flavour} {rng.choice([0, 20, 35, 50])}mg",
+                "price": price,
+                "qty": rng.choice([0, 0, 1, 3, 8, 12, 25, 40]),
+                "desc": "",
+                "tags": rng.sample(TAGS, 2),
+                "images": [f"/uploads/products/{rng.getrandbits(64):016x}.jpg"],
+                "tiers": [{"price": round(price * 0.9, 2), "qty": "5+"}, {"price": round(price * 0.8, 2), "qty": "10+"}],
+            })
+            next_id += 1
+        data.append({
+            "name": f"{brand} {rng.choice(WORDS)} {rng.choice(WORDS)} {g}",
+            "desc": f"{brand} {rng.choice(WORDS).lower()} series. " * 3,
+            "brand": brand,
+            "cat": rng.choice(CATEGORIES),
+            "tags": rng.sample(TAGS, 3),
+            "imgs": {str(p["id"]): p["images"][0] for p in products[:3]},
+            "products": products,
+        })
+    return {"data": data, "lastUpdated": 1760000000, "imagePathPrefix": "/uploads/products/"}
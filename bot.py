@@ -8,35 +8,40 @@ import asyncio
 import copy
 import uuid
 import re
+import sys
+import signal
+import tempfile
 import hashlib
+import gzip
+import io
+import mimetypes
+import http
+import http.client
 import urllib.parse
 import threading
-import urllib.request
+import bisect
+import heapq
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from html import escape as html_escape
-from http.server import SimpleHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
-
-# Monkey patch Pyppeteer to allow running in threads (disables signal handlers)
-import pyppeteer.launcher
-original_launcher_init = pyppeteer.launcher.Launcher.__init__
-def patched_launcher_init(self, *args, **kwargs):
-    kwargs['handleSIGINT'] = False
-    kwargs['handleSIGTERM'] = False
-    kwargs['handleSIGHUP'] = False
-    original_launcher_init(self, *args, **kwargs)
-pyppeteer.launcher.Launcher.__init__ = patched_launcher_init
-
-from scraper import RogersRoofingScraper
+
+BOOT_STARTED = time.perf_counter()
+
+import image_cache
+import catalog
+import catalog_io
 try:
     from dotenv import load_dotenv
     load_dotenv()
 except ImportError:
     pass
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, BotCommand, BotCommandScopeAllPrivateChats, BotCommandScopeChat, BotCommandScopeChatAdministrators, WebAppInfo, __version__ as ptb_version
-from telegram.error import ChatMigrated
+from telegram.error import ChatMigrated, RetryAfter
 from telegram.ext import (
     ApplicationBuilder, CommandHandler, MessageHandler, filters,
     CallbackQueryHandler, ContextTypes
 )
+import httpx
 
 # ===== CONFIG =====
 TOKEN = os.getenv("BOT_TOKEN")
@@ -55,6 +60,8 @@ if not WEBAPP_URL and os.getenv("RAILWAY_PUBLIC_DOMAIN"):
 REVIEW_CHANNEL_ID = os.getenv("REVIEW_CHANNEL_ID")
 REVIEW_TOPIC_ID = int(os.getenv("REVIEW_TOPIC_ID") or 0)
 DB_FILE = os.getenv("DB_FILE", "bot_database.db")
+DB_BUSY_TIMEOUT = float(os.getenv("DB_BUSY_TIMEOUT") or 5)
+DB_STATEMENT_CACHE = 256
 TICKET_TIMEOUT = 24 * 60 * 60
 REFERRAL_CHAT_ID = -1003786439934
 REFERRAL_TOPIC_ID = 575
@@ -100,12 +107,33 @@ DEFAULT_CONFIG = {
 }
 
 global_config = copy.deepcopy(DEFAULT_CONFIG)
+_db_local = threading.local()
 
 # ===== PERSISTENCE HELPERS =====
-def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS tickets (
+def get_db():
+    """Returns this thread's long-lived SQLite connection, opening it on first use."""
+    conn = getattr(_db_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT, cached_statements=DB_STATEMENT_CACHE)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT * 1000)}")
+        _db_local.conn = conn
+    return conn
+
+
+# ===== SCHEMA MIGRATIONS =====
+# Each migration runs once, in order, inside its own transaction; the applied version is
+# recorded in SQLite's PRAGMA user_version. Append new steps, never edit shipped ones.
+def _add_column_if_missing(conn, table, column, decl):
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def _migration_base_schema(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS tickets (
         id TEXT PRIMARY KEY,
         user_id INTEGER,
         section TEXT,
@@ -114,40 +142,89 @@ def init_db():
         last_activity REAL,
         closed INTEGER DEFAULT 0
     )''')
-    c.execute('''CREATE TABLE IF NOT EXISTS users (
+    conn.execute('''CREATE TABLE IF NOT EXISTS users (
         user_id INTEGER PRIMARY KEY,
         banned INTEGER DEFAULT 0,
         started INTEGER DEFAULT 0
     )''')
-    c.execute('''CREATE TABLE IF NOT EXISTS referrals (
+    conn.execute('''CREATE TABLE IF NOT EXISTS referrals (
         code TEXT PRIMARY KEY,
         user_id INTEGER,
         created_at REAL
     )''')
-    c.execute('''CREATE TABLE IF NOT EXISTS config (
+    conn.execute('''CREATE TABLE IF NOT EXISTS config (
         key TEXT PRIMARY KEY,
         value TEXT
     )''')
-    conn.commit()
+    # Databases created before versioning may already have some of these columns
+    _add_column_if_missing(conn, "users", "points", "INTEGER DEFAULT 0")
+    _add_column_if_missing(conn, "tickets", "referral_code", "TEXT")
+    _add_column_if_missing(conn, "tickets", "last_prompt_at", "REAL")
+    _add_column_if_missing(conn, "tickets", "snooze_until", "REAL")
+
+
+def _migration_hot_path_indexes(conn):
+    # db_get_active_tickets: user_id = ? AND closed = 0 ORDER BY created_at DESC
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tickets_user_open ON tickets (user_id, closed, created_at)")
+    # check_timeouts / reply list (closed = 0) and cleanup_database (closed = 1 AND last_activity < ?)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tickets_closed_activity ON tickets (closed, last_activity)")
+    # myreferrals_command: referrals by owner
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_referrals_user ON referrals (user_id)")
+
+
+def _migration_timeout_deadlines(conn):
+    # next_check_at is the next moment check_timeouts has anything to do for a ticket
+    # (24h prompt, snooze expiry or 14-day auto-close), see _ticket_next_check_at
+    _add_column_if_missing(conn, "tickets", "next_check_at", "REAL")
+    conn.execute(
+        "UPDATE tickets SET next_check_at = CASE "
+        "WHEN snooze_until IS NOT NULL THEN MIN(snooze_until, last_activity + ?) "
+        "WHEN last_prompt_at IS NOT NULL THEN last_activity + ? "
+        "ELSE last_activity + ? END "
+        "WHERE closed = 0",
+        (DELETE_TIMEOUT, DELETE_TIMEOUT, TICKET_TIMEOUT)
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tickets_open_deadline ON tickets (closed, next_check_at)")
 
-    try:
-        c.execute("ALTER TABLE users ADD COLUMN points INTEGER DEFAULT 0")
-        conn.commit()
-    except sqlite3.OperationalError:
-        pass
 
-    try:
-        c.execute("ALTER TABLE tickets ADD COLUMN referral_code TEXT")
-        conn.commit()
-    except sqlite3.OperationalError:
-        pass
+def _migration_user_profiles(conn):
+    # Persisted bot.get_chat results, see get_user_profiles
+    conn.execute('''CREATE TABLE IF NOT EXISTS user_profiles (
+        user_id INTEGER PRIMARY KEY,
+        first_name TEXT,
+        username TEXT,
+        fetched_at REAL
+    )''')
+
+
+SCHEMA_MIGRATIONS = [
+    (1, _migration_base_schema),
+    (2, _migration_hot_path_indexes),
+    (3, _migration_timeout_deadlines),
+    (4, _migration_user_profiles),
+]
 
-    try:
-        c.execute("ALTER TABLE tickets ADD COLUMN last_prompt_at REAL")
-        c.execute("ALTER TABLE tickets ADD COLUMN snooze_until REAL")
-        conn.commit()
-    except sqlite3.OperationalError:
-        pass
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def init_db():
+    conn = get_db()
+    current = get_schema_version(conn)
+
+    for version, migrate in SCHEMA_MIGRATIONS:
+        if version <= current:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            migrate(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"🗄️ Applied schema migration {version} ({migrate.__name__})")
 
     return conn
 
@@ -183,8 +260,9 @@ def migrate_json_to_db(conn):
                     t_id = v.get('id', k)
                     u_id = v.get('user_id', 0)
 
-                c.execute("INSERT OR IGNORE INTO tickets (id, user_id, section, created_at, last_activity, closed) VALUES (?, ?, ?, ?, ?, ?)",
-                          (t_id, u_id, v.get('section', 'Support'), v.get('created_at', time.time()), v.get('last_activity', time.time()), 0))
+                last_activity = v.get('last_activity', time.time())
+                c.execute("INSERT OR IGNORE INTO tickets (id, user_id, section, created_at, last_activity, closed, next_check_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                          (t_id, u_id, v.get('section', 'Support'), v.get('created_at', time.time()), last_activity, 0, last_activity + TICKET_TIMEOUT))
 
             for uid in data.get("user_started", []):
                 c.execute("INSERT OR IGNORE INTO users (user_id, started) VALUES (?, 1)", (uid,))
@@ -200,16 +278,13 @@ def migrate_json_to_db(conn):
             print("✅ Migration complete. Renaming bot_data.json to bot_data.json.bak")
             os.rename(json_file, json_file + ".bak")
         except Exception as e:
+            conn.rollback()
             print(f"❌ Migration failed: {e}")
 
 
 def load_config():
     global global_config
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-
-    c.execute("SELECT value FROM config WHERE key = 'main_config'")
-    row = c.fetchone()
+    row = get_db().execute("SELECT value FROM config WHERE key = 'main_config'").fetchone()
     if row:
         loaded_conf = json.loads(row[0])
         global_config.update(loaded_conf)
@@ -251,15 +326,10 @@ def load_config():
         print(f"📦 Using DB settings ({len(db_settings.get('h', []))} hidden items)")
         _save_webapp_settings()
 
-    conn.close()
-
 
 def save_config():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)", ("main_config", json.dumps(global_config)))
-    conn.commit()
-    conn.close()
+    with get_db() as conn:
+        conn.execute("INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)", ("main_config", json.dumps(global_config)))
     _save_webapp_settings()
 
 
@@ -285,16 +355,14 @@ def _load_webapp_settings():
 
 
 def get_next_counter():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT value FROM config WHERE key = 'ticket_counter'")
-    row = c.fetchone()
-    count = int(row[0]) if row else 0
-    count += 1
-    c.execute("INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)", ("ticket_counter", str(count)))
-    conn.commit()
-    conn.close()
-    return count
+    # Single upsert so concurrent callers on different threads can never hand out the same number
+    with get_db() as conn:
+        conn.execute(
+            "INSERT INTO config (key, value) VALUES ('ticket_counter', '1') "
+            "ON CONFLICT(key) DO UPDATE SET value = CAST(CAST(value AS INTEGER) + 1 AS TEXT)"
+        )
+        row = conn.execute("SELECT value FROM config WHERE key = 'ticket_counter'").fetchone()
+    return int(row[0])
 
 
 def generate_ticket_id():
@@ -315,132 +383,300 @@ def generate_ticket_id():
     return f"{random_chars}-{suffix}"
 
 
+# ===== USER STATE CACHE =====
+# Mirror of the users table (presence == started) so the ban/started/points checks that run
+# on every update are dict lookups. Loaded once at startup; every write to users goes through
+# the db_* helpers below, which update the cache after their commit (write-through).
+USER_CACHE = {}
+USER_CACHE_STATS = {"hits": 0, "misses": 0, "loaded": False}
+
+
+def load_user_cache():
+    rows = get_db().execute("SELECT user_id, banned, points FROM users").fetchall()
+    USER_CACHE.clear()
+    for row in rows:
+        USER_CACHE[row['user_id']] = {"banned": row['banned'] == 1, "points": row['points'] or 0}
+    USER_CACHE_STATS["loaded"] = True
+    print(f"👥 Loaded {len(USER_CACHE)} users into the user state cache")
+
+
+def _get_cached_user(user_id):
+    entry = USER_CACHE.get(user_id)
+    if entry is not None:
+        USER_CACHE_STATS["hits"] += 1
+        return entry
+
+    USER_CACHE_STATS["misses"] += 1
+    if USER_CACHE_STATS["loaded"]:
+        # The cache holds every row, so a miss means the user has never started the bot
+        return None
+
+    row = get_db().execute("SELECT banned, points FROM users WHERE user_id = ?", (user_id,)).fetchone()
+    if not row:
+        return None
+    entry = {"banned": row['banned'] == 1, "points": row['points'] or 0}
+    USER_CACHE[user_id] = entry
+    return entry
+
+
 # ===== DB HELPERS =====
 def db_get_ticket(ticket_id):
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT * FROM tickets WHERE id = ?", (ticket_id,))
-    row = c.fetchone()
-    conn.close()
+    row = get_db().execute("SELECT * FROM tickets WHERE id = ?", (ticket_id,)).fetchone()
     return dict(row) if row else None
 
 
 def db_get_active_tickets(user_id):
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT * FROM tickets WHERE user_id = ? AND closed = 0 ORDER BY created_at DESC", (user_id,))
-    rows = c.fetchall()
-    conn.close()
+    rows = get_db().execute("SELECT * FROM tickets WHERE user_id = ? AND closed = 0 ORDER BY created_at DESC", (user_id,)).fetchall()
     return [dict(row) for row in rows]
 
 
+def _ticket_next_check_at(last_activity, last_prompt_at=None, snooze_until=None):
+    close_at = last_activity + DELETE_TIMEOUT
+    if snooze_until:
+        return min(snooze_until, close_at)
+    if last_prompt_at:
+        return close_at
+    return last_activity + TICKET_TIMEOUT
+
+
 def db_create_ticket(ticket_id, user_id, section, referral_code=None):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("INSERT INTO tickets (id, user_id, section, created_at, last_activity, referral_code) VALUES (?, ?, ?, ?, ?, ?)",
-              (ticket_id, user_id, section, time.time(), time.time(), referral_code))
-    conn.commit()
-    conn.close()
+    now = time.time()
+    with get_db() as conn:
+        conn.execute("INSERT INTO tickets (id, user_id, section, created_at, last_activity, referral_code, next_check_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     (ticket_id, user_id, section, now, now, referral_code, _ticket_next_check_at(now)))
 
 
 def db_update_ticket_activity(ticket_id):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("UPDATE tickets SET last_activity = ?, last_prompt_at = NULL, snooze_until = NULL WHERE id = ?", (time.time(), ticket_id))
-    conn.commit()
-    conn.close()
+    now = time.time()
+    with get_db() as conn:
+        conn.execute("UPDATE tickets SET last_activity = ?, last_prompt_at = NULL, snooze_until = NULL, next_check_at = ? WHERE id = ?",
+                     (now, _ticket_next_check_at(now), ticket_id))
 
 
 def db_update_ticket_status(ticket_id, status):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("UPDATE tickets SET status = ? WHERE id = ?", (status, ticket_id))
-    conn.commit()
-    conn.close()
+    with get_db() as conn:
+        conn.execute("UPDATE tickets SET status = ? WHERE id = ?", (status, ticket_id))
 
 
 def db_close_ticket(ticket_id):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("UPDATE tickets SET closed = 1 WHERE id = ?", (ticket_id,))
-    conn.commit()
-    conn.close()
+    with get_db() as conn:
+        conn.execute("UPDATE tickets SET closed = 1 WHERE id = ?", (ticket_id,))
 
 
 def db_is_user_banned(user_id):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT banned FROM users WHERE user_id = ?", (user_id,))
-    row = c.fetchone()
-    conn.close()
-    return row and row[0] == 1
+    entry = _get_cached_user(user_id)
+    return entry is not None and entry["banned"]
 
 
 def db_set_user_banned(user_id, banned):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("INSERT OR IGNORE INTO users (user_id, started) VALUES (?, 1)", (user_id,))
-    c.execute("UPDATE users SET banned = ? WHERE user_id = ?", (1 if banned else 0, user_id))
-    conn.commit()
-    conn.close()
+    with get_db() as conn:
+        conn.execute("INSERT OR IGNORE INTO users (user_id, started) VALUES (?, 1)", (user_id,))
+        conn.execute("UPDATE users SET banned = ? WHERE user_id = ?", (1 if banned else 0, user_id))
+    USER_CACHE.setdefault(user_id, {"banned": False, "points": 0})["banned"] = bool(banned)
 
 
 def db_register_user(user_id):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("INSERT OR IGNORE INTO users (user_id, started) VALUES (?, 1)", (user_id,))
-    conn.commit()
-    conn.close()
+    with get_db() as conn:
+        conn.execute("INSERT OR IGNORE INTO users (user_id, started) VALUES (?, 1)", (user_id,))
+    USER_CACHE.setdefault(user_id, {"banned": False, "points": 0})
 
 
 def db_get_referral(code):
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT * FROM referrals WHERE code = ?", (code,))
-    row = c.fetchone()
-    conn.close()
+    row = get_db().execute("SELECT * FROM referrals WHERE code = ?", (code,)).fetchone()
     return dict(row) if row else None
 
 
 def db_create_referral(code, user_id):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("INSERT INTO referrals (code, user_id, created_at) VALUES (?, ?, ?)", (code, user_id, time.time()))
-    conn.commit()
-    conn.close()
+    with get_db() as conn:
+        conn.execute("INSERT INTO referrals (code, user_id, created_at) VALUES (?, ?, ?)", (code, user_id, time.time()))
 
 
 def db_get_user_points(user_id):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT points FROM users WHERE user_id = ?", (user_id,))
-    row = c.fetchone()
-    conn.close()
-    return row[0] if row else 0
+    entry = _get_cached_user(user_id)
+    return entry["points"] if entry else 0
 
 
 def db_add_user_points(user_id, points):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("INSERT OR IGNORE INTO users (user_id, started) VALUES (?, 1)", (user_id,))
-    c.execute("UPDATE users SET points = points + ? WHERE user_id = ?", (points, user_id))
-    conn.commit()
-    conn.close()
+    with get_db() as conn:
+        conn.execute("INSERT OR IGNORE INTO users (user_id, started) VALUES (?, 1)", (user_id,))
+        conn.execute("UPDATE users SET points = points + ? WHERE user_id = ?", (points, user_id))
+    USER_CACHE.setdefault(user_id, {"banned": False, "points": 0})["points"] += points
 
 
 def db_check_user_started(user_id):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT started FROM users WHERE user_id = ?", (user_id,))
-    row = c.fetchone()
-    conn.close()
-    return row is not None
+    return _get_cached_user(user_id) is not None
+
+
+def db_get_user_referral_code(user_id):
+    row = get_db().execute("SELECT code FROM referrals WHERE user_id = ?", (user_id,)).fetchone()
+    return row[0] if row else None
+
 
+def db_list_referrals():
+    return get_db().execute("SELECT r.code, r.user_id, r.created_at, u.points FROM referrals r LEFT JOIN users u ON r.user_id = u.user_id ORDER BY r.created_at DESC").fetchall()
 
-def resolve_ticket_id(update: Update, context):
+
+def db_get_recent_open_tickets(limit=20):
+    return get_db().execute("SELECT * FROM tickets WHERE closed = 0 ORDER BY last_activity DESC LIMIT ?", (limit,)).fetchall()
+
+
+def db_snooze_ticket(ticket_id, snooze_until):
+    with get_db() as conn:
+        conn.execute("UPDATE tickets SET snooze_until = ?, next_check_at = MIN(?, last_activity + ?) WHERE id = ?",
+                     (snooze_until, snooze_until, DELETE_TIMEOUT, ticket_id))
+
+
+def db_get_due_tickets(now):
+    return get_db().execute(
+        "SELECT id, user_id, last_activity, last_prompt_at, snooze_until FROM tickets "
+        "WHERE closed = 0 AND next_check_at <= ? ORDER BY next_check_at",
+        (now,)
+    ).fetchall()
+
+
+def db_apply_timeout_updates(closed_ids, prompted_ids, rescheduled, now):
+    """Writes one check_timeouts pass in a single transaction.
+
+    rescheduled is a list of (next_check_at, ticket_id) pairs for tickets that were due
+    but needed no action.
+    """
+    with get_db() as conn:
+        conn.executemany("UPDATE tickets SET closed = 1 WHERE id = ?", [(tid,) for tid in closed_ids])
+        conn.executemany(
+            "UPDATE tickets SET last_prompt_at = ?, snooze_until = NULL, next_check_at = last_activity + ? WHERE id = ?",
+            [(now, DELETE_TIMEOUT, tid) for tid in prompted_ids]
+        )
+        conn.executemany("UPDATE tickets SET next_check_at = ? WHERE id = ?", rescheduled)
+
+
+def db_delete_closed_tickets(cutoff):
+    conn = get_db()
+    with conn:
+        deleted = conn.execute("DELETE FROM tickets WHERE closed = 1 AND last_activity < ?", (cutoff,)).rowcount
+    if deleted > 0:
+        try:
+            conn.execute("VACUUM")
+        except Exception as e:
+            print(f"VACUUM warning: {e}")
+    return deleted
+
+
+def db_get_user_profiles(user_ids, min_fetched_at):
+    profiles = {}
+    ids = list(user_ids)
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        placeholders = ",".join("?" * len(chunk))
+        rows = get_db().execute(
+            f"SELECT user_id, first_name, username, fetched_at FROM user_profiles WHERE user_id IN ({placeholders}) AND fetched_at >= ?",
+            (*chunk, min_fetched_at)
+        ).fetchall()
+        for row in rows:
+            profiles[row['user_id']] = {"first_name": row['first_name'], "username": row['username'], "fetched_at": row['fetched_at']}
+    return profiles
+
+
+def db_save_user_profiles(profiles):
+    with get_db() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO user_profiles (user_id, first_name, username, fetched_at) VALUES (?, ?, ?, ?)",
+            [(uid, p['first_name'], p['username'], p['fetched_at']) for uid, p in profiles.items()]
+        )
+
+
+# ===== ASYNC DB ACCESS =====
+# All handler-side database work runs on one dedicated thread so a slow commit or fsync
+# never blocks the event loop that is polling Telegram. A single worker also serialises
+# writes, which is what SQLite wants anyway.
+DB_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+
+
+async def run_db(func, *args):
+    """Awaitable wrapper that runs a blocking db_* helper on the database thread."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(DB_EXECUTOR, func, *args)
+
+
+# ===== USER PROFILE CACHE =====
+# Display names for tg://user links. bot.get_chat is one HTTP round trip per user, so results
+# are kept in an in-process LRU backed by the user_profiles table, both expiring after
+# PROFILE_CACHE_TTL. Misses are fetched concurrently, at most PROFILE_FETCH_CONCURRENCY at once.
+PROFILE_CACHE_TTL = 12 * 60 * 60
+PROFILE_CACHE_SIZE = 5000
+PROFILE_FETCH_CONCURRENCY = 8
+PROFILE_CACHE = OrderedDict()
+PROFILE_CACHE_STATS = {"memory": 0, "db": 0, "fetched": 0, "failed": 0}
+
+
+def _remember_profile(user_id, profile):
+    PROFILE_CACHE[user_id] = profile
+    PROFILE_CACHE.move_to_end(user_id)
+    while len(PROFILE_CACHE) > PROFILE_CACHE_SIZE:
+        PROFILE_CACHE.popitem(last=False)
+
+
+async def get_user_profiles(bot, user_ids):
+    """Returns {user_id: {"first_name", "username"} or None if the lookup failed}."""
+    now = time.time()
+    result = {}
+    missing = []
+    for uid in dict.fromkeys(user_ids):
+        profile = PROFILE_CACHE.get(uid)
+        if profile and now - profile['fetched_at'] < PROFILE_CACHE_TTL:
+            PROFILE_CACHE.move_to_end(uid)
+            PROFILE_CACHE_STATS["memory"] += 1
+            result[uid] = profile
+        else:
+            missing.append(uid)
+
+    if missing:
+        stored = await run_db(db_get_user_profiles, missing, now - PROFILE_CACHE_TTL)
+        PROFILE_CACHE_STATS["db"] += len(stored)
+        for uid, profile in stored.items():
+            _remember_profile(uid, profile)
+            result[uid] = profile
+        missing = [uid for uid in missing if uid not in stored]
+
+    if missing:
+        semaphore = asyncio.Semaphore(PROFILE_FETCH_CONCURRENCY)
+
+        async def fetch(uid):
+            async with semaphore:
+                try:
+                    chat = await bot.get_chat(uid)
+                except Exception as e:
+                    print(f"Could not fetch chat info for {uid}: {e}")
+                    return uid, None
+            return uid, {"first_name": chat.first_name, "username": chat.username, "fetched_at": time.time()}
+
+        fetched = {}
+        for uid, profile in await asyncio.gather(*(fetch(uid) for uid in missing)):
+            result[uid] = profile
+            if profile:
+                fetched[uid] = profile
+                _remember_profile(uid, profile)
+        PROFILE_CACHE_STATS["fetched"] += len(fetched)
+        PROFILE_CACHE_STATS["failed"] += len(missing) - len(fetched)
+        if fetched:
+            await run_db(db_save_user_profiles, fetched)
+
+    return result
+
+
+async def get_user_profile(bot, user_id):
+    return (await get_user_profiles(bot, [user_id]))[user_id]
+
+
+def profile_link(user_id, profile):
+    if not profile:
+        return f"ID {user_id}"
+    display = f'<a href="tg://user?id={user_id}">{html_escape(profile["first_name"] or "")}</a>'
+    if profile["username"]:
+        display += f" (@{profile['username']})"
+    return display
+
+
+async def resolve_ticket_id(update: Update, context):
     import re
     ticket_pattern = re.compile(r'^[A-Z0-9]+-\d+$')
 
@@ -452,7 +688,7 @@ def resolve_ticket_id(update: Update, context):
         for arg in context.args:
             candidate = arg.strip().upper()
             if ticket_pattern.match(candidate):
-                t = db_get_ticket(candidate)
+                t = await run_db(db_get_ticket, candidate)
                 if t:
                     context.user_data['reply_ticket_id'] = candidate
                     return candidate
@@ -462,7 +698,7 @@ def resolve_ticket_id(update: Update, context):
         m = re.search(r'Ticket[:\s]+([A-Z0-9]+-\d+)', text)
         if m:
             candidate = m.group(1)
-            t = db_get_ticket(candidate)
+            t = await run_db(db_get_ticket, candidate)
             if t:
                 context.user_data['reply_ticket_id'] = candidate
                 return candidate
@@ -470,23 +706,311 @@ def resolve_ticket_id(update: Update, context):
     return None
 
 
-async def send_to_support_group(bot, text, photo=None, **kwargs):
-    global SUPPORT_GROUP_ID
-    if not SUPPORT_GROUP_ID:
-        print(f"⚠️ Cannot send message to support group: ID is 0. Message: {text}")
-        return
-    try:
-        if photo:
-            await bot.send_photo(chat_id=SUPPORT_GROUP_ID, photo=photo, caption=text, **kwargs)
+# ===== OUTBOUND MESSAGE QUEUE =====
+# Bot-initiated sends (support group traffic, customer notifications, referral logs, inactivity
+# alerts) go through one dispatcher instead of awaiting bot.send_message inline. It keeps under
+# Telegram's flood limits with a global and a per-chat token bucket, serves customer traffic
+# ahead of background alerts, honours RetryAfter, and can merge alerts into one group message.
+PRIORITY_CUSTOMER = 0
+PRIORITY_NORMAL = 1
+PRIORITY_ALERT = 2
+
+OUTBOUND_GLOBAL_RATE = 25          # messages/second across all chats (Telegram allows ~30)
+OUTBOUND_PRIVATE_RATE = 1.0        # messages/second into one private chat
+OUTBOUND_GROUP_RATE = 20 / 60      # messages/second into one group (20 per minute)
+OUTBOUND_COALESCE_WINDOW = 3.0     # seconds a coalescable message waits for siblings
+OUTBOUND_MAX_RETRIES = 5
+COALESCE_MAX_TEXT = 3500
+COALESCE_MAX_ROWS = 40
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self):
+        """Seconds until a token is available (0 if one is available now)."""
+        self._refill()
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+    def pause(self, seconds):
+        """Holds the bucket empty for the given number of seconds (used for RetryAfter)."""
+        self._refill()
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+    def is_full(self):
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class OutboundMessage:
+    def __init__(self, bot, method, chat_id, priority, coalesce_key, kwargs, future):
+        self.bot = bot
+        self.method = method
+        self.chat_id = chat_id
+        self.priority = priority
+        self.coalesce_key = coalesce_key
+        self.kwargs = kwargs
+        self.future = future
+        self.attempts = 0
+        self.released = False
+
+    def can_absorb(self, kwargs):
+        text = self.kwargs.get("text", "")
+        rows = self.kwargs.get("reply_markup").inline_keyboard if self.kwargs.get("reply_markup") else ()
+        extra_rows = kwargs.get("reply_markup").inline_keyboard if kwargs.get("reply_markup") else ()
+        return (len(text) + len(kwargs.get("text", "")) + 2 <= COALESCE_MAX_TEXT
+                and len(rows) + len(extra_rows) <= COALESCE_MAX_ROWS)
+
+    def absorb(self, kwargs):
+        self.kwargs["text"] = self.kwargs.get("text", "") + "\n\n" + kwargs.get("text", "")
+        if kwargs.get("reply_markup"):
+            rows = list(self.kwargs["reply_markup"].inline_keyboard) if self.kwargs.get("reply_markup") else []
+            rows.extend(kwargs["reply_markup"].inline_keyboard)
+            self.kwargs["reply_markup"] = InlineKeyboardMarkup(rows)
+
+
+class OutboundDispatcher:
+    """Single worker that drains a priority queue of bot sends.
+
+    submit() returns an asyncio.Future resolved with the sent Message (or the final error),
+    so callers that need delivery confirmation can await it and everyone else can move on.
+    Anything exposing send_message/send_photo coroutines works as the bot, which keeps the
+    dispatcher easy to drive with a fake bot that records calls or raises RetryAfter.
+    """
+
+    def __init__(self, global_rate=OUTBOUND_GLOBAL_RATE, private_rate=OUTBOUND_PRIVATE_RATE,
+                 group_rate=OUTBOUND_GROUP_RATE, coalesce_window=OUTBOUND_COALESCE_WINDOW):
+        self.private_rate = private_rate
+        self.group_rate = group_rate
+        self.coalesce_window = coalesce_window
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_buckets = {}
+        # Chats out of tokens keep their messages here in arrival order; one timer per chat releases
+        # the head when its bucket refills, and the next waits until that one is handled
+        self.parked = {}
+        self.wake_handles = {}
+        self.releasing = set()
+        self.pending_coalesce = {}
+        self.stats = {"queued": 0, "sent": 0, "coalesced": 0, "retried": 0, "failed": 0, "deferred": 0}
+        self._queue = None
+        self._seq = 0
+        self._worker = None
+
+    def submit(self, bot, method, chat_id, priority=PRIORITY_NORMAL, coalesce_key=None, **kwargs):
+        loop = asyncio.get_running_loop()
+        self._ensure_worker()
+
+        if coalesce_key is not None:
+            key = (chat_id, coalesce_key)
+            pending = self.pending_coalesce.get(key)
+            if pending is not None and pending.can_absorb(kwargs):
+                pending.absorb(kwargs)
+                self.stats["coalesced"] += 1
+                return pending.future
+
+        future = loop.create_future()
+        future.add_done_callback(_consume_future_error)
+        item = OutboundMessage(bot, method, chat_id, priority, coalesce_key, kwargs, future)
+        self.stats["queued"] += 1
+
+        if coalesce_key is not None:
+            key = (chat_id, coalesce_key)
+            self.pending_coalesce[key] = item
+            loop.call_later(self.coalesce_window, self._release_coalesced, key, item)
         else:
-            await bot.send_message(chat_id=SUPPORT_GROUP_ID, text=text, **kwargs)
-    except ChatMigrated as e:
-        print(f"⚠️ Group upgraded to Supergroup. Updating SUPPORT_GROUP_ID to {e.new_chat_id}")
-        SUPPORT_GROUP_ID = e.new_chat_id
-        if photo:
-            await bot.send_photo(chat_id=SUPPORT_GROUP_ID, photo=photo, caption=text, **kwargs)
+            self._put(item)
+        return future
+
+    def queue_depth(self):
+        queued = self._queue.qsize() if self._queue else 0
+        return queued + sum(len(parked) for parked in self.parked.values())
+
+    async def stop(self):
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        for handle in self.wake_handles.values():
+            handle.cancel()
+        self.wake_handles.clear()
+
+    def _ensure_worker(self):
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    def _put(self, item):
+        self._seq += 1
+        self._queue.put_nowait((item.priority, self._seq, item))
+
+    def _park(self, item, front=False):
+        """Holds item in its chat's FIFO until the chat's bucket has a token (front for retries of the head)."""
+        self.stats["deferred"] += 1
+        parked = self.parked.setdefault(item.chat_id, deque())
+        if front:
+            parked.appendleft(item)
         else:
-            await bot.send_message(chat_id=SUPPORT_GROUP_ID, text=text, **kwargs)
+            parked.append(item)
+        self._schedule_wake(item.chat_id)
+
+    def _schedule_wake(self, chat_id):
+        if chat_id in self.wake_handles or chat_id in self.releasing:
+            return
+        delay = self._chat_bucket(chat_id).delay()
+        self.wake_handles[chat_id] = asyncio.get_running_loop().call_later(delay, self._wake, chat_id)
+
+    def _wake(self, chat_id):
+        self.wake_handles.pop(chat_id, None)
+        parked = self.parked.get(chat_id)
+        if not parked:
+            self.parked.pop(chat_id, None)
+            return
+        item = parked.popleft()
+        item.released = True
+        self.releasing.add(chat_id)
+        self._put(item)
+
+    def _settle(self, chat_id):
+        """After a released head was handled: release the next one, or forget the chat once drained."""
+        self.releasing.discard(chat_id)
+        parked = self.parked.get(chat_id)
+        if parked:
+            self._schedule_wake(chat_id)
+        elif parked is not None:
+            del self.parked[chat_id]
+
+    def _release_coalesced(self, key, item):
+        if self.pending_coalesce.get(key) is item:
+            del self.pending_coalesce[key]
+        self._put(item)
+
+    def _chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) > 1000:
+                self.chat_buckets = {cid: b for cid, b in self.chat_buckets.items() if not b.is_full()}
+            rate = self.group_rate if isinstance(chat_id, int) and chat_id < 0 else self.private_rate
+            bucket = TokenBucket(rate, 1)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def _run(self):
+        while True:
+            _, _, item = await self._queue.get()
+            chat_id = item.chat_id
+
+            # Messages behind a parked one wait their turn so a chat's messages keep their order
+            if chat_id in self.parked and not item.released:
+                self._park(item)
+                continue
+            item.released = False
+
+            # A busy chat must not hold up everyone else, so park it instead of sleeping
+            chat_bucket = self._chat_bucket(chat_id)
+            if chat_bucket.delay() > 0:
+                self.releasing.discard(chat_id)
+                self._park(item, front=True)
+                continue
+
+            global_wait = self.global_bucket.delay()
+            if global_wait > 0:
+                await asyncio.sleep(global_wait)
+            chat_bucket.take()
+            self.global_bucket.take()
+
+            await self._deliver(item, chat_bucket)
+            self._settle(chat_id)
+
+    async def _deliver(self, item, chat_bucket):
+        global SUPPORT_GROUP_ID
+        item.attempts += 1
+        try:
+            result = await getattr(item.bot, item.method)(chat_id=item.chat_id, **item.kwargs)
+        except RetryAfter as e:
+            retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else float(e.retry_after)
+            chat_bucket.pause(retry_after)
+            if item.attempts < OUTBOUND_MAX_RETRIES:
+                print(f"⏳ Flood control for chat {item.chat_id}: retrying in {retry_after:.0f}s")
+                self.stats["retried"] += 1
+                self.releasing.discard(item.chat_id)
+                self._park(item, front=True)
+            else:
+                self._fail(item, e)
+        except ChatMigrated as e:
+            if item.chat_id == SUPPORT_GROUP_ID:
+                print(f"⚠️ Group upgraded to Supergroup. Updating SUPPORT_GROUP_ID to {e.new_chat_id}")
+                SUPPORT_GROUP_ID = e.new_chat_id
+            item.chat_id = e.new_chat_id
+            if item.attempts < OUTBOUND_MAX_RETRIES:
+                self._put(item)
+            else:
+                self._fail(item, e)
+        except Exception as e:
+            self._fail(item, e)
+        else:
+            self.stats["sent"] += 1
+            if not item.future.done():
+                item.future.set_result(result)
+
+    def _fail(self, item, error):
+        self.stats["failed"] += 1
+        print(f"❌ Failed to {item.method} to {item.chat_id}: {error}")
+        if not item.future.done():
+            item.future.set_exception(error)
+
+
+def _consume_future_error(future):
+    # Fire-and-forget sends are logged by the dispatcher; mark the error as retrieved
+    if not future.cancelled():
+        future.exception()
+
+
+OUTBOUND = OutboundDispatcher()
+
+
+def queue_message(bot, chat_id, text, priority=PRIORITY_NORMAL, coalesce_key=None, **kwargs):
+    """Queues a send_message; await the returned future to wait for delivery."""
+    return OUTBOUND.submit(bot, "send_message", chat_id, priority, coalesce_key, text=text, **kwargs)
+
+
+def queue_photo(bot, chat_id, photo, caption=None, priority=PRIORITY_NORMAL, **kwargs):
+    return OUTBOUND.submit(bot, "send_photo", chat_id, priority, photo=photo, caption=caption, **kwargs)
+
+
+def report_failure(future, bot, chat_id, what="message"):
+    """For sends a handler does not wait on: tells chat_id (the staff chat that asked) if delivery finally fails.
+    Awaiting the future instead would hold up update processing for as long as the dispatcher retries."""
+    def done(f):
+        if not f.cancelled() and f.exception() is not None:
+            queue_message(bot, chat_id, f"❌ Failed to send {what}: {f.exception()}", priority=PRIORITY_CUSTOMER)
+    future.add_done_callback(done)
+    return future
+
+
+async def send_to_support_group(bot, text, photo=None, priority=PRIORITY_NORMAL, coalesce_key=None, **kwargs):
+    if not SUPPORT_GROUP_ID:
+        print(f"⚠️ Cannot send message to support group: ID is 0. Message: {text}")
+        return None
+    if photo:
+        return queue_photo(bot, SUPPORT_GROUP_ID, photo, caption=text, priority=priority, **kwargs)
+    return queue_message(bot, SUPPORT_GROUP_ID, text, priority=priority, coalesce_key=coalesce_key, **kwargs)
 
 
 async def handle_chat_migration(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -533,6 +1057,7 @@ def get_admin_help_text(context: ContextTypes.DEFAULT_TYPE):
             "/unblock &lt;user_id&gt; — Unblock a user\n"
             "/listreferrals — List all referral codes\n"
             "/myreferrals &lt;id&gt; addpoint/removepoint &lt;n&gt; — Manage points\n"
+            "/stats — Cache and queue statistics\n"
             "/help — Show this help"
         )
 
@@ -588,7 +1113,7 @@ async def handle_menu_callback(update: Update, context: ContextTypes.DEFAULT_TYP
         return
 
     await query.answer()
-    db_register_user(user.id)
+    await run_db(db_register_user, user.id)
 
     if item["type"] == "category":
         keyboard = []
@@ -644,25 +1169,21 @@ async def create_new_ticket(update: Update, context: ContextTypes.DEFAULT_TYPE,
             await update.message.reply_text("⛔ You are blocked from creating tickets.")
         return
 
-    ticket_id = generate_ticket_id()
-    db_create_ticket(ticket_id, user.id, section_name, referral_code)
+    ticket_id = await run_db(generate_ticket_id)
+    await run_db(db_create_ticket, ticket_id, user.id, section_name, referral_code)
 
     # Handle Referral Logic
     referral_note = ""
     if referral_code:
-        ref_data = db_get_referral(referral_code)
+        ref_data = await run_db(db_get_referral, referral_code)
         if ref_data:
             creator_id = ref_data['user_id']
             creator_display = f"ID {creator_id}"
-            try:
-                creator_info = await context.bot.get_chat(creator_id)
-                creator_link = f'<a href="tg://user?id={creator_id}">{html_escape(creator_info.first_name)}</a>'
-                if creator_info.username:
-                    creator_display = f"{creator_link} (@{creator_info.username})"
+            creator_info = await get_user_profile(context.bot, creator_id)
+            if creator_info:
+                if creator_info['username']:
+                    creator_display = profile_link(creator_id, creator_info)
                 creator_display += f' (<a href="tg://user?id={creator_id}">DM Link</a>)'
-            except Exception as e:
-                print(f"Could not fetch creator info for {creator_id}: {e}")
-                creator_display = f"ID {creator_id}"
 
             referral_note = f"\n🔗 <b>Referral Used:</b> {referral_code} (By {creator_display})"
 
@@ -677,10 +1198,7 @@ async def create_new_ticket(update: Update, context: ContextTypes.DEFAULT_TYPE,
                 f"Created by: {creator_display}\n"
                 f"Used by: {user_display}"
             )
-            try:
-                await context.bot.send_message(chat_id=REFERRAL_CHAT_ID, message_thread_id=REFERRAL_TOPIC_ID, text=log_msg, parse_mode='HTML')
-            except Exception as e:
-                print(f"Failed to log referral usage: {e}")
+            queue_message(context.bot, REFERRAL_CHAT_ID, log_msg, priority=PRIORITY_ALERT, message_thread_id=REFERRAL_TOPIC_ID, parse_mode='HTML')
 
     if custom_msg:
         msg_text = custom_msg
@@ -727,7 +1245,7 @@ async def handle_webapp_data(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
         new_settings = data.get("settings", {})
         global_config["webapp_settings"] = new_settings
-        save_config()
+        await run_db(save_config)
         await update.message.reply_text("✅ <b>Shop Settings Saved!</b>\nChanges (hidden items, renames) are now live.", parse_mode='HTML')
         return
 
@@ -745,8 +1263,8 @@ async def handle_webapp_data(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
         summary += f"\n<b>Total: ${total:.2f}</b>"
 
-        ticket_id = generate_ticket_id()
-        db_create_ticket(ticket_id, user.id, "Web App Order")
+        ticket_id = await run_db(generate_ticket_id)
+        await run_db(db_create_ticket, ticket_id, user.id, "Web App Order")
 
         await update.message.reply_text(f"✅ Order received!\nTicket ID: {ticket_id}\n\n{summary}", parse_mode='HTML')
 
@@ -768,7 +1286,7 @@ async def handle_dm(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     if not db_check_user_started(user.id):
-        db_register_user(user.id)
+        await run_db(db_register_user, user.id)
         await start(update, context)
         return
 
@@ -784,7 +1302,7 @@ async def handle_dm(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await handle_ticket_creation_step(update, context)
         return
 
-    active_tickets = db_get_active_tickets(user.id)
+    active_tickets = await run_db(db_get_active_tickets, user.id)
 
     if active_tickets:
         selected_ticket_id = context.user_data.get('current_ticket_id')
@@ -797,7 +1315,7 @@ async def handle_dm(update: Update, context: ContextTypes.DEFAULT_TYPE):
             ticket = active_tickets[0]
             context.user_data['current_ticket_id'] = ticket['id']
 
-        db_update_ticket_activity(ticket['id'])
+        await run_db(db_update_ticket_activity, ticket['id'])
 
         msg_content = f"📨 Message from ({user.id}) Ticket {ticket['id']}"
         if text:
@@ -806,7 +1324,8 @@ async def handle_dm(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await send_to_support_group(
             context.bot,
             text=msg_content,
-            photo=photo
+            photo=photo,
+            priority=PRIORITY_CUSTOMER
         )
     else:
         await update.message.reply_text("❗ Please select an option from the menu to proceed! 📋")
@@ -819,7 +1338,7 @@ async def handle_ticket_creation_step(update: Update, context: ContextTypes.DEFA
     referral_code = None
 
     if text.lower() != 'skip':
-        ref = db_get_referral(text)
+        ref = await run_db(db_get_referral, text)
         if ref:
             if ref['user_id'] == update.effective_user.id:
                 await update.message.reply_text("❌ You cannot use your own referral code. Type a different code or 'skip'.")
@@ -848,14 +1367,14 @@ async def myreferrals_command(update: Update, context: ContextTypes.DEFAULT_TYPE
                 amount = int(context.args[2])
 
                 if action == "addpoint":
-                    db_add_user_points(target_id, amount)
+                    await run_db(db_add_user_points, target_id, amount)
                     await update.message.reply_text(f"✅ Added {amount} points to User {target_id}.")
                     try:
                         await context.bot.send_message(target_id, f"🎉 You have received {amount} referral points from an admin!")
                     except:
                         pass
                 elif action == "removepoint":
-                    db_add_user_points(target_id, -amount)
+                    await run_db(db_add_user_points, target_id, -amount)
                     await update.message.reply_text(f"✅ Removed {amount} points from User {target_id}.")
                 else:
                     await update.message.reply_text("Usage: /myreferrals <userid> addpoint/removepoint <amount>")
@@ -866,13 +1385,9 @@ async def myreferrals_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
 
     points = db_get_user_points(user.id)
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT code FROM referrals WHERE user_id = ?", (user.id,))
-    row = c.fetchone()
-    conn.close()
+    code = await run_db(db_get_user_referral_code, user.id)
 
-    code_msg = f"Your Referral Code: <code>{row[0]}</code>" if row else "You don't have a referral code yet. Use /refer to generate one!"
+    code_msg = f"Your Referral Code: <code>{code}</code>" if code else "You don't have a referral code yet. Use /refer to generate one!"
 
     msg = (
         f"🏆 <b>My Referrals</b>\n\n"
@@ -889,27 +1404,24 @@ async def listreferrals_command(update: Update, context: ContextTypes.DEFAULT_TY
     if user.id not in ADMIN_IDS:
         return
 
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT r.code, r.user_id, r.created_at, u.points FROM referrals r LEFT JOIN users u ON r.user_id = u.user_id ORDER BY r.created_at DESC")
-    rows = c.fetchall()
-    conn.close()
+    rows = await run_db(db_list_referrals)
 
     if not rows:
         await update.message.reply_text("📭 No referral codes have been generated yet.")
         return
 
+    profiles = await get_user_profiles(context.bot, [row['user_id'] for row in rows])
+
     lines = ["📋 <b>All Referral Codes</b>\n"]
     for row in rows:
         created_str = time.strftime('%Y-%m-%d', time.localtime(row['created_at']))
         points = row['points'] if row['points'] is not None else 0
-        try:
-            chat = await context.bot.get_chat(row['user_id'])
-            name = html_escape(chat.first_name)
-            if chat.username:
-                name += f" (@{chat.username})"
-        except Exception:
+        profile = profiles.get(row['user_id'])
+        if profile:
+            name = html_escape(profile['first_name'] or "")
+            if profile['username']:
+                name += f" (@{profile['username']})"
+        else:
             name = f"ID {row['user_id']}"
 
         lines.append(f"• <code>{row['code']}</code> — {name} — {points} pts — {created_str}")
@@ -937,7 +1449,7 @@ async def mytickets_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     if db_is_user_banned(user.id):
         return
-    tickets = db_get_active_tickets(user.id)
+    tickets = await run_db(db_get_active_tickets, user.id)
 
     if not tickets:
         await update.message.reply_text("📭 You have no active tickets.")
@@ -957,7 +1469,7 @@ async def handle_myticket_selection(update: Update, context: ContextTypes.DEFAUL
     await query.answer()
     ticket_id = query.data.replace("sel_ticket_", "")
 
-    ticket = db_get_ticket(ticket_id)
+    ticket = await run_db(db_get_ticket, ticket_id)
     if not ticket or ticket['closed']:
         await query.message.edit_text("❌ This ticket is closed or invalid.")
         return
@@ -983,11 +1495,11 @@ async def block_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     try:
         uid = int(context.args[0])
-        db_set_user_banned(uid, True)
+        await run_db(db_set_user_banned, uid, True)
 
-        active_tickets = db_get_active_tickets(uid)
+        active_tickets = await run_db(db_get_active_tickets, uid)
         for t in active_tickets:
-            db_close_ticket(t['id'])
+            await run_db(db_close_ticket, t['id'])
 
         await update.message.reply_text(f"⛔ User {uid} has been blocked and active tickets closed.")
     except ValueError:
@@ -1001,7 +1513,7 @@ async def unblock_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     try:
         uid = int(context.args[0])
-        db_set_user_banned(uid, False)
+        await run_db(db_set_user_banned, uid, False)
         await update.message.reply_text(f"✅ User {uid} has been unblocked.")
     except ValueError:
         await update.message.reply_text("Invalid ID.")
@@ -1011,12 +1523,12 @@ async def unblock_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def ping_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id not in ADMIN_IDS: return
 
-    ticket_id = resolve_ticket_id(update, context)
+    ticket_id = await resolve_ticket_id(update, context)
     if not ticket_id:
         await update.message.reply_text("❗ No ticket found. Use /reply first, reply to a ticket message, or specify: /ping <ticket_id>")
         return
 
-    ticket = db_get_ticket(ticket_id)
+    ticket = await run_db(db_get_ticket, ticket_id)
     if not ticket:
         await update.message.reply_text("❌ Ticket not found.")
         return
@@ -1028,6 +1540,37 @@ async def ping_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(f"❌ Failed to ping: {e}")
 
 
+# ===== STATS COMMAND (ADMIN ONLY) =====
+def get_stats_text():
+    hits = USER_CACHE_STATS["hits"]
+    misses = USER_CACHE_STATS["misses"]
+    lookups = hits + misses
+    hit_rate = f"{hits / lookups * 100:.1f}%" if lookups else "n/a"
+    out = OUTBOUND.stats
+    prof = PROFILE_CACHE_STATS
+    img = image_cache.get_stats()
+    mb = 1024 * 1024
+
+    lines = [
+        "📈 <b>Bot Stats</b>",
+        "-----------------------------",
+        f"👥 <b>User cache:</b> {len(USER_CACHE)} users, {hits} hits / {misses} misses ({hit_rate} hit rate)",
+        f"📤 <b>Outbound queue:</b> {OUTBOUND.queue_depth()} waiting, {out['sent']} sent, {out['coalesced']} coalesced, "
+        f"{out['retried']} flood retries, {out['failed']} failed",
+        f"🪪 <b>Profile cache:</b> {len(PROFILE_CACHE)} in memory, {prof['memory']} memory hits, {prof['db']} DB hits, "
+        f"{prof['fetched']} fetched, {prof['failed']} failed",
+        f"🖼️ <b>Image cache:</b> {img['hit_ratio'] * 100:.1f}% hit ratio, {img['memory_items']} in memory ({img['memory_used'] / mb:.1f}MB)",
+        f"   served {img['memory_bytes'] / mb:.1f}MB memory / {img['disk_bytes'] / mb:.1f}MB disk / {img['upstream_bytes'] / mb:.1f}MB upstream",
+        f"   upstream: {img['upstream']} fetches, {img['coalesced']} coalesced, {img['upstream_avg'] * 1000:.0f}ms avg, {img['upstream_max'] * 1000:.0f}ms max, {img['errors']} errors",
+    ]
+    return "\n".join(lines)
+
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS: return
+    await update.message.reply_text(get_stats_text(), parse_mode='HTML')
+
+
 # ===== HELP COMMAND =====
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id in ADMIN_IDS:
@@ -1069,12 +1612,7 @@ async def handle_reply_command(update: Update, context: ContextTypes.DEFAULT_TYP
             await update.message.reply_text("❗ Invalid User ID.")
             return
 
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT * FROM tickets WHERE closed = 0 ORDER BY last_activity DESC LIMIT 20")
-    tickets = c.fetchall()
-    conn.close()
+    tickets = await run_db(db_get_recent_open_tickets)
 
     if not tickets:
         await update.message.reply_text("📭 No open tickets right now.")
@@ -1104,7 +1642,7 @@ async def handle_reply_selection(update: Update, context: ContextTypes.DEFAULT_T
     ticket_id = query.data.split("_")[1]
     context.user_data['reply_ticket_id'] = ticket_id
 
-    ticket = db_get_ticket(ticket_id)
+    ticket = await run_db(db_get_ticket, ticket_id)
     ticket_display = ticket['id'] if ticket else ticket_id
     target_user_id = ticket['user_id'] if ticket else "Unknown"
 
@@ -1125,7 +1663,7 @@ async def handle_ping_selection(update: Update, context: ContextTypes.DEFAULT_TY
         return
 
     ticket_id = query.data.split("_")[1]
-    ticket = db_get_ticket(ticket_id)
+    ticket = await run_db(db_get_ticket, ticket_id)
 
     if ticket:
         target_id = ticket['user_id']
@@ -1159,15 +1697,15 @@ async def close_ticket_command(update: Update, context: ContextTypes.DEFAULT_TYP
         return
 
     if user.id in ADMIN_IDS:
-        ticket_id = resolve_ticket_id(update, context)
+        ticket_id = await resolve_ticket_id(update, context)
         if not ticket_id:
             await update.message.reply_text("❗ No ticket found. Use /reply first, reply to a ticket message, or specify: /close <ticket_id>")
             return
 
-        ticket = db_get_ticket(ticket_id)
+        ticket = await run_db(db_get_ticket, ticket_id)
         if ticket and not ticket['closed']:
             target_user_id = ticket['user_id']
-            db_close_ticket(ticket_id)
+            await run_db(db_close_ticket, ticket_id)
 
             try:
                 await context.bot.send_message(chat_id=target_user_id, text=f"🔒 Ticket {ticket_id} has been closed.")
@@ -1183,11 +1721,11 @@ async def close_ticket_command(update: Update, context: ContextTypes.DEFAULT_TYP
             await update.message.reply_text("❗ Ticket already closed or not found.")
 
     else:
-        user_tickets = db_get_active_tickets(user.id)
+        user_tickets = await run_db(db_get_active_tickets, user.id)
         if user_tickets:
             ticket = user_tickets[0]
             ticket_id = ticket['id']
-            db_close_ticket(ticket_id)
+            await run_db(db_close_ticket, ticket_id)
             await update.message.reply_text(f"🔒 Ticket {ticket_id} has been closed.")
             await send_to_support_group(
                 context.bot,
@@ -1221,12 +1759,12 @@ async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def ticketinfo_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id not in ADMIN_IDS: return
 
-    ticket_id = resolve_ticket_id(update, context)
+    ticket_id = await resolve_ticket_id(update, context)
     if not ticket_id:
         await update.message.reply_text("❗ No ticket found. Use: /ticketinfo <ticket_id>, or reply to a ticket message, or use /reply first.")
         return
 
-    ticket = db_get_ticket(ticket_id)
+    ticket = await run_db(db_get_ticket, ticket_id)
     if not ticket:
         await update.message.reply_text("❌ Ticket not found.")
         return
@@ -1237,13 +1775,11 @@ async def ticketinfo_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     user_id = ticket['user_id']
     user_name = f"Unknown (ID: {user_id})"
     username_str = ""
-    try:
-        chat_member = await context.bot.get_chat(user_id)
-        user_name = html_escape(chat_member.first_name)
-        if chat_member.username:
-            username_str = f" (@{html_escape(chat_member.username)})"
-    except Exception:
-        pass
+    profile = await get_user_profile(context.bot, user_id)
+    if profile:
+        user_name = html_escape(profile['first_name'] or "")
+        if profile['username']:
+            username_str = f" (@{html_escape(profile['username'])})"
 
     points = db_get_user_points(user_id)
     referral = ticket.get('referral_code') or "None"
@@ -1277,7 +1813,7 @@ async def ticketinfo_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def ticket_status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id not in ADMIN_IDS: return
 
-    ticket_id = resolve_ticket_id(update, context)
+    ticket_id = await resolve_ticket_id(update, context)
     if not ticket_id:
         await update.message.reply_text("❗ No ticket found. Use /reply first, reply to a ticket message, or specify a ticket ID.")
         return
@@ -1290,7 +1826,7 @@ async def ticket_status_command(update: Update, context: ContextTypes.DEFAULT_TY
         return
 
     status_key = context.args[0].lower()
-    ticket = db_get_ticket(ticket_id)
+    ticket = await run_db(db_get_ticket, ticket_id)
     if not ticket:
         await update.message.reply_text("❌ Ticket not found.")
         return
@@ -1316,30 +1852,15 @@ async def ticket_status_command(update: Update, context: ContextTypes.DEFAULT_TY
 
         if ticket.get('referral_code'):
             ref_code = ticket['referral_code']
-            ref_data = db_get_referral(ref_code)
+            ref_data = await run_db(db_get_referral, ref_code)
             if ref_data:
                 referrer_id = ref_data['user_id']
-                db_add_user_points(referrer_id, 1)
-                try:
-                    await context.bot.send_message(chat_id=referrer_id, text=f"🎉 <b>Referral Bonus!</b>\n\nA user you referred has completed an order! You have received 1 referral point.\nUse /myreferrals to check your balance.", parse_mode='HTML')
-                except Exception as e:
-                    print(f"Failed to notify referrer {referrer_id}: {e}")
-
-                try:
-                    referrer_info = await context.bot.get_chat(referrer_id)
-                    referrer_display = f'<a href="tg://user?id={referrer_id}">{html_escape(referrer_info.first_name)}</a>'
-                    if referrer_info.username:
-                        referrer_display += f" (@{referrer_info.username})"
-                except Exception:
-                    referrer_display = f"ID {referrer_id}"
+                await run_db(db_add_user_points, referrer_id, 1)
+                queue_message(context.bot, referrer_id, f"🎉 <b>Referral Bonus!</b>\n\nA user you referred has completed an order! You have received 1 referral point.\nUse /myreferrals to check your balance.", parse_mode='HTML')
 
-                try:
-                    buyer_info = await context.bot.get_chat(ticket['user_id'])
-                    buyer_display = f'<a href="tg://user?id={ticket["user_id"]}">{html_escape(buyer_info.first_name)}</a>'
-                    if buyer_info.username:
-                        buyer_display += f" (@{buyer_info.username})"
-                except Exception:
-                    buyer_display = f"ID {ticket['user_id']}"
+                profiles = await get_user_profiles(context.bot, [referrer_id, ticket['user_id']])
+                referrer_display = profile_link(referrer_id, profiles[referrer_id])
+                buyer_display = profile_link(ticket['user_id'], profiles[ticket['user_id']])
 
                 completion_log = (
                     f"✅ Referral Point Earned! (Order Delivered)\n"
@@ -1348,14 +1869,11 @@ async def ticket_status_command(update: Update, context: ContextTypes.DEFAULT_TY
                     f"Buyer: {buyer_display}\n"
                     f"Ticket: {ticket_id}"
                 )
-                try:
-                    await context.bot.send_message(chat_id=REFERRAL_CHAT_ID, message_thread_id=REFERRAL_TOPIC_ID, text=completion_log, parse_mode='HTML')
-                except Exception as e:
-                    print(f"Failed to log referral completion: {e}")
+                queue_message(context.bot, REFERRAL_CHAT_ID, completion_log, priority=PRIORITY_ALERT, message_thread_id=REFERRAL_TOPIC_ID, parse_mode='HTML')
 
         new_status = "Order Delivered"
-        db_update_ticket_status(ticket_id, new_status)
-        db_close_ticket(ticket_id)
+        await run_db(db_update_ticket_status, ticket_id, new_status)
+        await run_db(db_close_ticket, ticket_id)
 
         # Prompt admin about points discount
         points = db_get_user_points(user_id)
@@ -1374,7 +1892,8 @@ async def ticket_status_command(update: Update, context: ContextTypes.DEFAULT_TY
             await update.message.reply_text(f"✅ Status updated to Delivered. Ticket closed.")
 
         final_msg = "🎉 <b>Order Delivered!</b>\n\nThank you for shopping with GeekdHouse! We hope you had a great experience and we hope to see you back soon! Use /review to leave a review! Any feedback is appreciated!\n\nAdditionally, use /refer to generate a referral code that gets you future discounts on your orders!"
-        await context.bot.send_message(chat_id=user_id, text=final_msg, parse_mode='HTML')
+        report_failure(queue_message(context.bot, user_id, final_msg, priority=PRIORITY_CUSTOMER, parse_mode='HTML'),
+                       context.bot, update.effective_chat.id, f"the closing message to user {user_id}")
         return
 
     elif status_key == "complete":
@@ -1383,31 +1902,16 @@ async def ticket_status_command(update: Update, context: ContextTypes.DEFAULT_TY
 
         if ticket.get('referral_code'):
             ref_code = ticket['referral_code']
-            ref_data = db_get_referral(ref_code)
+            ref_data = await run_db(db_get_referral, ref_code)
             if ref_data:
                 referrer_id = ref_data['user_id']
-                db_add_user_points(referrer_id, 1)
-                try:
-                    await context.bot.send_message(chat_id=referrer_id, text=f"🎉 <b>Referral Bonus!</b>\n\nA user you referred has completed an order! You have received 1 referral point.\nUse /myreferrals to check your balance.", parse_mode='HTML')
-                except Exception as e:
-                    print(f"Failed to notify referrer {referrer_id}: {e}")
+                await run_db(db_add_user_points, referrer_id, 1)
+                queue_message(context.bot, referrer_id, f"🎉 <b>Referral Bonus!</b>\n\nA user you referred has completed an order! You have received 1 referral point.\nUse /myreferrals to check your balance.", parse_mode='HTML')
 
                 # Completion log for singles (mirrors delivered)
-                try:
-                    referrer_info = await context.bot.get_chat(referrer_id)
-                    referrer_display = f'<a href="tg://user?id={referrer_id}">{html_escape(referrer_info.first_name)}</a>'
-                    if referrer_info.username:
-                        referrer_display += f" (@{referrer_info.username})"
-                except Exception:
-                    referrer_display = f"ID {referrer_id}"
-
-                try:
-                    buyer_info = await context.bot.get_chat(ticket['user_id'])
-                    buyer_display = f'<a href="tg://user?id={ticket["user_id"]}">{html_escape(buyer_info.first_name)}</a>'
-                    if buyer_info.username:
-                        buyer_display += f" (@{buyer_info.username})"
-                except Exception:
-                    buyer_display = f"ID {ticket['user_id']}"
+                profiles = await get_user_profiles(context.bot, [referrer_id, ticket['user_id']])
+                referrer_display = profile_link(referrer_id, profiles[referrer_id])
+                buyer_display = profile_link(ticket['user_id'], profiles[ticket['user_id']])
 
                 completion_log = (
                     f"✅ Referral Point Earned! (Order Complete)\n"
@@ -1416,14 +1920,11 @@ async def ticket_status_command(update: Update, context: ContextTypes.DEFAULT_TY
                     f"Buyer: {buyer_display}\n"
                     f"Ticket: {ticket_id}"
                 )
-                try:
-                    await context.bot.send_message(chat_id=REFERRAL_CHAT_ID, message_thread_id=REFERRAL_TOPIC_ID, text=completion_log, parse_mode='HTML')
-                except Exception as e:
-                    print(f"Failed to log referral completion: {e}")
+                queue_message(context.bot, REFERRAL_CHAT_ID, completion_log, priority=PRIORITY_ALERT, message_thread_id=REFERRAL_TOPIC_ID, parse_mode='HTML')
 
         new_status = "Order Complete"
-        db_update_ticket_status(ticket_id, new_status)
-        db_close_ticket(ticket_id)
+        await run_db(db_update_ticket_status, ticket_id, new_status)
+        await run_db(db_close_ticket, ticket_id)
 
         # Prompt admin about points discount
         points = db_get_user_points(user_id)
@@ -1442,7 +1943,8 @@ async def ticket_status_command(update: Update, context: ContextTypes.DEFAULT_TY
             await update.message.reply_text(f"✅ Status updated to Complete. Ticket closed.")
 
         final_msg = "🎉 <b>Order Complete!</b>\n\nThank you for shopping with GeekdHouse! We hope you had a great experience and we hope to see you back soon! Use /review to leave a review! Any feedback is appreciated!\n\nAdditionally, use /refer to generate a referral code that gets you future discounts on your orders!"
-        await context.bot.send_message(chat_id=user_id, text=final_msg, parse_mode='HTML')
+        report_failure(queue_message(context.bot, user_id, final_msg, priority=PRIORITY_CUSTOMER, parse_mode='HTML'),
+                       context.bot, update.effective_chat.id, f"the closing message to user {user_id}")
         return
 
     elif status_key == "shipdetails":
@@ -1463,8 +1965,9 @@ async def ticket_status_command(update: Update, context: ContextTypes.DEFAULT_TY
         await update.message.reply_text("❌ Unknown status.")
         return
 
-    db_update_ticket_status(ticket_id, new_status)
-    await context.bot.send_message(chat_id=user_id, text=f"ℹ️ Status Update: <b>{new_status}</b>\n{msg}", parse_mode='HTML')
+    await run_db(db_update_ticket_status, ticket_id, new_status)
+    report_failure(queue_message(context.bot, user_id, f"ℹ️ Status Update: <b>{new_status}</b>\n{msg}", priority=PRIORITY_CUSTOMER, parse_mode='HTML'),
+                   context.bot, update.effective_chat.id, f"the status update to user {user_id}")
     await update.message.reply_text(f"✅ Status updated to: {new_status}")
 
 
@@ -1485,7 +1988,7 @@ async def handle_points_discount_callback(update: Update, context: ContextTypes.
     if action == "yes":
         current_points = db_get_user_points(user_id)
         if current_points > 0:
-            db_add_user_points(user_id, -1)
+            await run_db(db_add_user_points, user_id, -1)
             new_points = current_points - 1
             await query.message.edit_text(
                 f"✅ 1 point deducted from User {user_id}. They now have {new_points} point(s)."
@@ -1520,7 +2023,7 @@ async def redeempoints_command(update: Update, context: ContextTypes.DEFAULT_TYP
         )
         return
 
-    active_tickets = db_get_active_tickets(user.id)
+    active_tickets = await run_db(db_get_active_tickets, user.id)
     if not active_tickets:
         await update.message.reply_text(
             "❗ <b>No Active Ticket</b>\n\n"
@@ -1784,10 +2287,10 @@ async def handle_referral_callback(update: Update, context: ContextTypes.DEFAULT
     if data == "refer_yes":
         code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
 
-        while db_get_referral(code):
+        while await run_db(db_get_referral, code):
             code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
 
-        db_create_referral(code, user.id)
+        await run_db(db_create_referral, code, user.id)
 
         user_display = user.mention_html()
         if user.username:
@@ -1798,10 +2301,7 @@ async def handle_referral_callback(update: Update, context: ContextTypes.DEFAULT
             f"Code: {code}\n"
             f"User info: {user_display} ID: {user.id}"
         )
-        try:
-            await context.bot.send_message(chat_id=REFERRAL_CHAT_ID, message_thread_id=REFERRAL_TOPIC_ID, text=log_msg, parse_mode='HTML')
-        except Exception as e:
-            print(f"Failed to log referral creation: {e}")
+        queue_message(context.bot, REFERRAL_CHAT_ID, log_msg, priority=PRIORITY_ALERT, message_thread_id=REFERRAL_TOPIC_ID, parse_mode='HTML')
 
         response = (
             f"Thank you for using the GeekdHouse Referral Program! Here is your unique code:\n\n"
@@ -1822,10 +2322,10 @@ async def handle_admin_dm(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if state['action'] == 'waiting_tracking':
             tracking_code = update.message.text
             ticket_id = state['ticket_id']
-            ticket = db_get_ticket(ticket_id)
+            ticket = await run_db(db_get_ticket, ticket_id)
 
             if ticket:
-                db_update_ticket_status(ticket_id, "Order Shipped")
+                await run_db(db_update_ticket_status, ticket_id, "Order Shipped")
 
                 msg = (
                     f"🚚 <b>Your order has been shipped!</b>\n\n"
@@ -1834,11 +2334,9 @@ async def handle_admin_dm(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     f"We recommend you to scroll down on the tracking site and sign your phone number up for text updates rather than checking the site over and over.\n\n"
                     f"Additionally, you can download 17track and input the tracking code there to have the app send you notification updates."
                 )
-                try:
-                    await context.bot.send_message(chat_id=ticket['user_id'], text=msg, parse_mode='HTML')
-                    await update.message.reply_text("✅ Tracking sent and status updated to Shipped!")
-                except Exception as e:
-                    await update.message.reply_text(f"❌ Failed to send to user: {e}")
+                report_failure(queue_message(context.bot, ticket['user_id'], msg, priority=PRIORITY_CUSTOMER, parse_mode='HTML'),
+                               context.bot, update.effective_chat.id, f"the tracking code to user {ticket['user_id']}")
+                await update.message.reply_text("✅ Tracking sent and status updated to Shipped!")
             else:
                 await update.message.reply_text("❌ Ticket not found.")
 
@@ -1854,7 +2352,7 @@ async def handle_admin_dm(update: Update, context: ContextTypes.DEFAULT_TYPE):
             if item:
                 target_field = "response_message" if item["type"] in ["service", "auto_response"] else "message"
                 item[target_field] = update.message.text
-                save_config()
+                await run_db(save_config)
                 await update.message.reply_text(f"✅ Message for '{item['name']}' updated!")
             del context.user_data['editing_text']
             return
@@ -1862,7 +2360,7 @@ async def handle_admin_dm(update: Update, context: ContextTypes.DEFAULT_TYPE):
         new_text = update.message.text
         if new_text:
             global_config['texts'][key] = new_text
-            save_config()
+            await run_db(save_config)
             del context.user_data['editing_text']
             await update.message.reply_text(f"✅ Text for '{key}' has been updated!")
             return
@@ -1907,16 +2405,17 @@ async def handle_admin_dm(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text or update.message.caption
     photo = update.message.photo[-1].file_id if update.message.photo else None
 
-    ticket = db_get_ticket(ticket_id)
+    ticket = await run_db(db_get_ticket, ticket_id)
     if ticket and not ticket['closed']:
-        db_update_ticket_activity(ticket_id)
+        await run_db(db_update_ticket_activity, ticket_id)
         target_user_id = ticket['user_id']
 
         if photo:
             caption = f"💬 Staff: {text}" if text else "💬 Staff"
-            await context.bot.send_photo(chat_id=target_user_id, photo=photo, caption=caption)
+            sent = queue_photo(context.bot, target_user_id, photo, caption=caption, priority=PRIORITY_CUSTOMER)
         else:
-            await context.bot.send_message(chat_id=target_user_id, text=f"💬 Staff: {text}")
+            sent = queue_message(context.bot, target_user_id, f"💬 Staff: {text}", priority=PRIORITY_CUSTOMER)
+        report_failure(sent, context.bot, update.effective_chat.id, f"the reply to user {target_user_id}")
 
         await update.message.reply_text("✅ Message sent to user!")
     else:
@@ -2056,7 +2555,7 @@ async def handle_settings_callback(update: Update, context: ContextTypes.DEFAULT
                 if "items" not in parent: parent["items"] = []
                 parent["items"].append(new_item)
 
-        save_config()
+        await run_db(save_config)
         del context.user_data['admin_state']
         await query.message.edit_text(f"✅ Added '{state['name']}'!")
         return
@@ -2087,7 +2586,7 @@ async def handle_settings_callback(update: Update, context: ContextTypes.DEFAULT
         item, _, _ = find_menu_item(global_config["menu"], svc_id)
         if item:
             item["visible"] = not item.get("visible", True)
-            save_config()
+            await run_db(save_config)
             update.callback_query.data = f"svc_edit_{svc_id}"
             await handle_settings_callback(update, context)
         return
@@ -2097,7 +2596,7 @@ async def handle_settings_callback(update: Update, context: ContextTypes.DEFAULT
         item, _, _ = find_menu_item(global_config["menu"], svc_id)
         if item:
             item["status"] = not item.get("status", True)
-            save_config()
+            await run_db(save_config)
             update.callback_query.data = f"svc_edit_{svc_id}"
             await handle_settings_callback(update, context)
         return
@@ -2107,7 +2606,7 @@ async def handle_settings_callback(update: Update, context: ContextTypes.DEFAULT
         item, parent_list, idx = find_menu_item(global_config["menu"], svc_id)
         if parent_list is not None:
             del parent_list[idx]
-            save_config()
+            await run_db(save_config)
             await query.message.edit_text("🗑️ Item deleted.")
         return
 
@@ -2177,7 +2676,7 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(f"❗ Service '{target}' not found.")
         return
 
-    save_config()
+    await run_db(save_config)
     await update.message.reply_text(f"✅ Service <b>{found_item['name']}</b> is now <b>{state.upper()}</b>.", parse_mode='HTML')
 
 
@@ -2196,45 +2695,211 @@ async def menu_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("👇 <b>Tap below to open the shop:</b>", reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
 
 
+# ===== SCRAPER SUBPROCESS =====
+# Scrapes run scraper.py in a child process with its own process group, so Chromium and the
+# raw upstream payload never live in the bot process. The child writes its result as a catalog
+# snapshot (catalog_io.write_snapshot), which becomes products.snapshot once it is accepted.
+SCRAPER_TIMEOUT = int(os.getenv("SCRAPER_TIMEOUT") or 900)
+SCRAPER_MAX_RSS_MB = int(os.getenv("SCRAPER_MAX_RSS_MB") or 1536)
+SCRAPER_POLL_INTERVAL = 2
+SCRAPER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scraper.py")
+PRODUCT_SNAPSHOT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "products.snapshot")
+# JSON copy of the catalog, only written when PRODUCTS_JSON_EXPORT is set (debugging); read once to migrate
+SCRAPED_PRODUCTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scraped_products.json")
+PRODUCTS_JSON_EXPORT = os.getenv("PRODUCTS_JSON_EXPORT", "").lower() in ("1", "true", "yes")
+
+
+def _process_group_rss(pgid):
+    """Resident memory in bytes of every process in the group (scraper + Chromium), or None without /proc."""
+    try:
+        pids = [pid for pid in os.listdir('/proc') if pid.isdigit()]
+    except OSError:
+        return None
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    total = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/stat', 'r') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(fields[2]) == pgid:
+            total += int(fields[21]) * page_size
+    return total
+
+
+def _signal_process_group(pgid, sig):
+    try:
+        os.killpg(pgid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def export_products_json(result):
+    """Blocking: writes the opt-in scraped_products.json debugging copy."""
+    tmp_path = f"{SCRAPED_PRODUCTS_FILE}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        os.replace(tmp_path, SCRAPED_PRODUCTS_FILE)
+    except OSError as e:
+        print(f"⚠️ Could not save scraped_products.json: {e}")
+
+
+def _read_scrape_output(path):
+    """Blocking: loads the child's snapshot. A result with products is moved into place as
+    products.snapshot (it is not serialized a second time); anything else is deleted."""
+    try:
+        result = catalog_io.load_snapshot(path)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Could not read scraper output: {e}")
+        result = None
+    try:
+        if isinstance(result, dict) and not result.get('unchanged') and result.get('data'):
+            os.replace(path, PRODUCT_SNAPSHOT_FILE)
+            if PRODUCTS_JSON_EXPORT:
+                export_products_json(result)
+        else:
+            os.remove(path)
+    except OSError as e:
+        print(f"⚠️ Could not save products.snapshot: {e}")
+    return result
+
+
+async def run_scraper_process(known_last_updated=None, known_catalog_hash=None):
+    """Runs one scrape in a supervised subprocess and returns the same dict as scraper.get_products().
+    The child is killed after SCRAPER_TIMEOUT seconds or once its process group exceeds SCRAPER_MAX_RSS_MB,
+    and the whole group is killed when it ends so no Chromium is left behind."""
+    # Created next to products.snapshot so accepting the result is a same-filesystem rename
+    fd, output_path = tempfile.mkstemp(prefix="scrape_", suffix=".tmp", dir=os.path.dirname(PRODUCT_SNAPSHOT_FILE))
+    os.close(fd)
+    args = [sys.executable, "-u", SCRAPER_SCRIPT, "--output", output_path]
+    if known_last_updated:
+        args += ["--known-last-updated", str(known_last_updated)]
+    if known_catalog_hash:
+        args += ["--known-catalog-hash", str(known_catalog_hash)]
+    env = dict(os.environ, CHADS_API_KEY=CHADS_API_KEY)
+
+    started = time.time()
+    proc = await asyncio.create_subprocess_exec(*args, env=env, start_new_session=True)
+    killed_reason = None
+    peak_rss = 0
+    try:
+        while True:
+            try:
+                await asyncio.wait_for(proc.wait(), timeout=SCRAPER_POLL_INTERVAL)
+                break
+            except asyncio.TimeoutError:
+                pass
+            rss = _process_group_rss(proc.pid) or 0
+            peak_rss = max(peak_rss, rss)
+            if time.time() - started > SCRAPER_TIMEOUT:
+                killed_reason = f"timed out after {SCRAPER_TIMEOUT}s"
+            elif rss > SCRAPER_MAX_RSS_MB * 1024 * 1024:
+                killed_reason = f"used {rss // (1024 * 1024)} MB (limit {SCRAPER_MAX_RSS_MB} MB)"
+            if killed_reason:
+                print(f"❌ Scraper {killed_reason} - killing it")
+                _signal_process_group(proc.pid, signal.SIGTERM)
+                try:
+                    await asyncio.wait_for(proc.wait(), timeout=10)
+                except asyncio.TimeoutError:
+                    pass
+                break
+    finally:
+        _signal_process_group(proc.pid, signal.SIGKILL)
+        if proc.returncode is None:
+            await proc.wait()
+
+    print(f"🕷️ Scraper process exited with {proc.returncode} after {time.time() - started:.0f}s "
+          f"(peak {peak_rss // (1024 * 1024)} MB)")
+    if killed_reason or proc.returncode != 0:
+        try:
+            os.remove(output_path)
+        except OSError:
+            pass
+        result = None
+    else:
+        result = await asyncio.get_running_loop().run_in_executor(None, _read_scrape_output, output_path)
+    if not isinstance(result, dict):
+        result = {"data": [], "error": True}
+    if not result.get('unchanged'):
+        # The child syncs cached_images/ (replaced masters, dropped renditions, garbage collection) but can
+        # only invalidate its own memory tier; drop ours so /api/img goes back to the disk
+        image_cache.MEMORY.clear()
+    return result
+
+
 # ===== AUTO REFRESH JOB =====
+# The refresher reschedules itself from the upstream nextUpdate timestamp (plus a grace period),
+# clamped to [REFRESH_MIN_INTERVAL, REFRESH_MAX_INTERVAL].
+REFRESH_MIN_INTERVAL = int(os.getenv("REFRESH_MIN_INTERVAL") or 300)
+REFRESH_MAX_INTERVAL = 21600
+REFRESH_GRACE = 60
+
+
+def _parse_upstream_time(value):
+    """Epoch seconds from a nextUpdate/lastUpdated value (epoch s/ms or ISO 8601), or None."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)) or (isinstance(value, str) and value.replace('.', '', 1).isdigit()):
+        ts = float(value)
+        return ts / 1000 if ts > 1e12 else ts
+    try:
+        from datetime import datetime, timezone
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    except ValueError:
+        return None
+
+
+def schedule_next_refresh(job_queue, next_update=None, fallback=REFRESH_MAX_INTERVAL):
+    delay = fallback
+    when = _parse_upstream_time(next_update)
+    if when:
+        delay = when - time.time() + REFRESH_GRACE
+    delay = min(max(delay, REFRESH_MIN_INTERVAL), REFRESH_MAX_INTERVAL)
+    for job in job_queue.get_jobs_by_name("auto_refresh"):
+        job.schedule_removal()
+    job_queue.run_once(auto_refresh_job, when=delay, name="auto_refresh")
+    print(f"⏰ Next product refresh in {delay / 60:.0f} min")
+
+
 async def auto_refresh_job(context: ContextTypes.DEFAULT_TYPE):
     global PRODUCT_CACHE, SCRAPE_IN_PROGRESS
 
     with SCRAPE_LOCK:
         if SCRAPE_IN_PROGRESS:
             print("⏭️ Skipping auto-refresh: scrape already in progress")
+            schedule_next_refresh(context.job_queue, fallback=REFRESH_MIN_INTERVAL)
             return
         SCRAPE_IN_PROGRESS = True
 
     print("🔄 Auto-refreshing product cache...")
+    next_update = None
 
     try:
-        def run_scrape():
-            scraper = RogersRoofingScraper(
-                username=CHADS_USERNAME,
-                password=CHADS_PASSWORD,
-                api_key=CHADS_API_KEY
-            )
-            return scraper.get_products()
-
+        await wait_for_catalog()
+        known = PRODUCT_CACHE["data"] or {}
         loop = asyncio.get_running_loop()
-        fresh_result = await loop.run_in_executor(None, run_scrape)
+        fresh_result = await run_scraper_process(
+            known_last_updated=known.get('lastUpdated'),
+            known_catalog_hash=known.get('catalogHash'),
+        )
+        next_update = (fresh_result or {}).get('nextUpdate')
 
-        if fresh_result and isinstance(fresh_result.get('data'), list) and len(fresh_result['data']) > 0:
+        if fresh_result and fresh_result.get('unchanged'):
+            print(f"✅ Upstream catalog unchanged (lastUpdated {fresh_result.get('lastUpdated')}). Keeping cache.")
+            PRODUCT_CACHE["last_attempt"] = time.time()
+        elif fresh_result and isinstance(fresh_result.get('data'), list) and len(fresh_result['data']) > 0:
             new_count = len(fresh_result['data'])
             print(f"📊 Scrape found: {new_count} groups")
 
             if not fresh_result.get('imagePathPrefix'):
                 fresh_result['imagePathPrefix'] = "/uploads/products/"
 
-            try:
-                with open("scraped_products.json", "w", encoding="utf-8") as f:
-                    json.dump(fresh_result, f, indent=2)
-            except Exception as e:
-                print(f"⚠️ Could not save scraped_products.json: {e}")
-
-            PRODUCT_CACHE["data"] = fresh_result
-            PRODUCT_CACHE["timestamp"] = time.time()
+            await loop.run_in_executor(None, _set_product_cache, fresh_result)
             PRODUCT_CACHE["last_attempt"] = time.time()
             print(f"✅ Cache Refreshed! {new_count} groups.")
         else:
@@ -2245,60 +2910,60 @@ async def auto_refresh_job(context: ContextTypes.DEFAULT_TYPE):
     finally:
         with SCRAPE_LOCK:
             SCRAPE_IN_PROGRESS = False
+        schedule_next_refresh(context.job_queue, next_update)
 
 
 # ===== BACKGROUND JOBS =====
 async def check_timeouts(context: ContextTypes.DEFAULT_TYPE):
     now = time.time()
+    due = await run_db(db_get_due_tickets, now)
+    if not due:
+        return
 
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT * FROM tickets WHERE closed = 0")
-    tickets = c.fetchall()
-
-    for t in tickets:
-        ticket_id = t['id']
-        last_activity = t['last_activity']
-        last_prompt_at = t['last_prompt_at']
+    to_close = []
+    to_prompt = []
+    rescheduled = []
+    for t in due:
+        inactivity = now - t['last_activity']
         snooze_until = t['snooze_until']
 
-        inactivity = now - last_activity
-
         if inactivity > DELETE_TIMEOUT:
-            db_close_ticket(ticket_id)
-            await send_to_support_group(context.bot, text=f"⏳ Ticket {ticket_id} closed automatically (2 weeks inactivity).")
-            try:
-                await context.bot.send_message(chat_id=t['user_id'], text=f"⏳ Ticket {ticket_id} has been closed due to extended inactivity.")
-            except:
-                pass
-            continue
+            to_close.append(t)
+        elif inactivity > TICKET_TIMEOUT and (not t['last_prompt_at'] or (snooze_until and now >= snooze_until)):
+            to_prompt.append(t)
+        elif snooze_until and now >= snooze_until:
+            # The snooze ran out before the ticket had been quiet for TICKET_TIMEOUT (e.g. "Keep Open"
+            # on an old alert after the customer wrote again): the next prompt is due once it has,
+            # not on every pass until then
+            rescheduled.append((t['last_activity'] + TICKET_TIMEOUT, t['id']))
+        else:
+            next_check = _ticket_next_check_at(t['last_activity'], t['last_prompt_at'], snooze_until)
+            rescheduled.append((next_check, t['id']))
 
-        if inactivity > TICKET_TIMEOUT:
-            if snooze_until and now < snooze_until:
-                continue
+    await run_db(db_apply_timeout_updates, [t['id'] for t in to_close], [t['id'] for t in to_prompt], rescheduled, now)
 
-            should_prompt = False
-            if not last_prompt_at:
-                should_prompt = True
-            elif snooze_until and now >= snooze_until:
-                should_prompt = True
-
-            if should_prompt:
-                keyboard = [
-                    [InlineKeyboardButton("Yes (Close)", callback_data=f"inact_yes_{ticket_id}")],
-                    [InlineKeyboardButton("No (Keep Open)", callback_data=f"inact_no_{ticket_id}")]
-                ]
-                await send_to_support_group(
-                    context.bot,
-                    text=f"⏳ <b>Inactivity Alert</b>\nTicket {ticket_id} has been inactive for over 24 hours.\nClose it?",
-                    reply_markup=InlineKeyboardMarkup(keyboard),
-                    parse_mode='HTML'
-                )
-                c.execute("UPDATE tickets SET last_prompt_at = ?, snooze_until = NULL WHERE id = ?", (now, ticket_id))
-                conn.commit()
+    # Alerts from one pass are coalesced by the outbound queue into as few group messages as possible
+    for t in to_close:
+        ticket_id = t['id']
+        await send_to_support_group(context.bot, text=f"⏳ Ticket {ticket_id} closed automatically (2 weeks inactivity).",
+                                    priority=PRIORITY_ALERT, coalesce_key="inactivity_close")
+        queue_message(context.bot, t['user_id'], f"⏳ Ticket {ticket_id} has been closed due to extended inactivity.", priority=PRIORITY_ALERT)
 
-    conn.close()
+    for t in to_prompt:
+        ticket_id = t['id']
+        # One row per ticket so a coalesced alert can carry several tickets' buttons
+        keyboard = [[
+            InlineKeyboardButton(f"Yes (Close) {ticket_id}", callback_data=f"inact_yes_{ticket_id}"),
+            InlineKeyboardButton("No (Keep Open)", callback_data=f"inact_no_{ticket_id}")
+        ]]
+        await send_to_support_group(
+            context.bot,
+            text=f"⏳ <b>Inactivity Alert</b>\nTicket {ticket_id} has been inactive for over 24 hours.\nClose it?",
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode='HTML',
+            priority=PRIORITY_ALERT,
+            coalesce_key="inactivity_prompt"
+        )
 
 
 async def handle_inactivity_response(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -2311,40 +2976,64 @@ async def handle_inactivity_response(update: Update, context: ContextTypes.DEFAU
     ticket_id = parts[2]
 
     if action == "yes":
-        db_close_ticket(ticket_id)
-        await query.message.edit_text(f"✅ Ticket {ticket_id} closed by admin.")
-        ticket = db_get_ticket(ticket_id)
+        await run_db(db_close_ticket, ticket_id)
+        await _answer_inactivity_alert(query, ticket_id, f"✅ Ticket {ticket_id} closed by admin.")
+        ticket = await run_db(db_get_ticket, ticket_id)
         if ticket:
-            try:
-                await context.bot.send_message(chat_id=ticket['user_id'], text=f"🔒 Ticket {ticket_id} has been closed.")
-            except:
-                pass
+            queue_message(context.bot, ticket['user_id'], f"🔒 Ticket {ticket_id} has been closed.")
     elif action == "no":
         snooze_time = time.time() + (4 * 60 * 60)
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute("UPDATE tickets SET snooze_until = ? WHERE id = ?", (snooze_time, ticket_id))
-        conn.commit()
-        conn.close()
-        await query.message.edit_text(f"✅ Ticket {ticket_id} kept open. Will ask again in 4 hours.")
+        await run_db(db_snooze_ticket, ticket_id, snooze_time)
+        await _answer_inactivity_alert(query, ticket_id, f"✅ Ticket {ticket_id} kept open. Will ask again in 4 hours.")
+
+
+async def _answer_inactivity_alert(query, ticket_id, result_text):
+    # A coalesced alert lists several tickets: only drop this ticket's buttons and reply,
+    # instead of overwriting the prompts for the others
+    markup = query.message.reply_markup
+    own_buttons = {f"inact_yes_{ticket_id}", f"inact_no_{ticket_id}"}
+    remaining = [row for row in (markup.inline_keyboard if markup else ())
+                 if not any(btn.callback_data in own_buttons for btn in row)]
+    if remaining:
+        await query.message.edit_reply_markup(reply_markup=InlineKeyboardMarkup(remaining))
+        await query.message.reply_text(result_text)
+    else:
+        await query.message.edit_text(result_text)
 
 
 async def cleanup_database(context: ContextTypes.DEFAULT_TYPE):
     """Deletes closed tickets older than RETENTION_DAYS and reclaims disk space."""
     cutoff = time.time() - (RETENTION_DAYS * 24 * 60 * 60)
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-
-    c.execute("DELETE FROM tickets WHERE closed = 1 AND last_activity < ?", (cutoff,))
-    deleted = c.rowcount
-    conn.commit()
+    deleted = await run_db(db_delete_closed_tickets, cutoff)
     if deleted > 0:
-        try:
-            conn.execute("VACUUM")
-        except Exception as e:
-            print(f"VACUUM warning: {e}")
         print(f"Database cleanup: Removed {deleted} old tickets and reclaimed space.")
-    conn.close()
+
+
+async def stop_outbound(app):
+    await OUTBOUND.stop()
+
+
+# ===== STARTUP TIMING =====
+# Boot is split into sequential phases; each mark records the time since the previous one.
+STARTUP = {"last": BOOT_STARTED, "phases": []}
+
+
+def mark_startup(name):
+    now = time.perf_counter()
+    STARTUP["phases"].append((name, (now - STARTUP["last"]) * 1000))
+    STARTUP["last"] = now
+
+
+def print_startup_report():
+    phases = ", ".join(f"{name} {ms:.0f}ms" for name, ms in STARTUP["phases"])
+    total = (STARTUP["last"] - BOOT_STARTED) * 1000
+    print(f"⏱️ Startup: {phases} (total {total:.0f}ms, catalog {'ready' if CATALOG_LOADED.is_set() else 'still loading'})")
+
+
+async def on_startup(app):
+    await set_commands(app)
+    mark_startup("telegram init")
+    print_startup_report()
 
 
 # ===== SET BOT COMMANDS =====
@@ -2380,6 +3069,7 @@ async def set_commands(app):
             BotCommand("block", "Block a user"),
             BotCommand("unblock", "Unblock a user"),
             BotCommand("listreferrals", "List all referral codes"),
+            BotCommand("stats", "Cache and queue statistics"),
             BotCommand("help", "Admin Help")
         ], scope=BotCommandScopeChatAdministrators(chat_id=SUPPORT_GROUP_ID))
     except ChatMigrated as e:
@@ -2394,42 +3084,663 @@ async def set_commands(app):
             BotCommand("block", "Block a user"),
             BotCommand("unblock", "Unblock a user"),
             BotCommand("listreferrals", "List all referral codes"),
+            BotCommand("stats", "Cache and queue statistics"),
             BotCommand("help", "Admin Help")
         ], scope=BotCommandScopeChatAdministrators(chat_id=SUPPORT_GROUP_ID))
 
 
+# ===== PRODUCT PAYLOAD =====
+# /api/products is served from bytes built once per refresh: the JSON body plus gzip (and
+# brotli when the module is installed) encodings, each with its own strong ETag.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def build_product_payload(data):
+    body = json.dumps(data, separators=(',', ':'), default=catalog.to_json).encode('utf-8')
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    payload = {"identity": (body, f'"{digest}"'), "gzip": (gzip.compress(body, compresslevel=9, mtime=0), f'"{digest}-gz"')}
+    if brotli:
+        try:
+            payload["br"] = (brotli.compress(body, quality=9), f'"{digest}-br"')
+        except Exception as e:
+            print(f"⚠️ Brotli compression failed: {e}")
+    return payload
+
+
+def _pick_encoding(accept_encoding, payload):
+    accepted = {}
+    for part in (accept_encoding or "").split(','):
+        pieces = part.strip().split(';')
+        name = pieces[0].strip().lower()
+        q = 1.0
+        for param in pieces[1:]:
+            key, _, value = param.strip().partition('=')
+            if key.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            accepted[name] = q
+    for encoding in ("br", "gzip"):
+        if encoding in payload and accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return "identity"
+
+
+def _matching_etag(if_none_match, payload, encoding):
+    """The payload ETag named by If-None-Match (the chosen encoding's first, then any other
+    encoding's, since a client may have cached a different one), or None."""
+    if not if_none_match:
+        return None
+    tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    preferred = payload[encoding][1]
+    if '*' in tags or preferred in tags:
+        return preferred
+    return next((etag for _, etag in payload.values() if etag in tags), None)
+
+
+# ===== CATALOG REVISIONS =====
+# Every refresh that changes the catalog gets a new revision (millisecond timestamp, so it keeps
+# increasing across restarts). The touched group keys of the last CATALOG_HISTORY_SIZE
+# revisions are kept so /api/products/changes?since=<rev> can return only what changed.
+CATALOG_HISTORY_SIZE = 24
+CATALOG_LOCK = threading.Lock()
+CATALOG_STATE = {
+    "revision": 0,
+    "keys": [],
+    "groups": {},
+    "hashes": {},
+    "meta": {},
+    "history": deque(maxlen=CATALOG_HISTORY_SIZE),
+    "changes": {},
+}
+
+
+def _group_keys(groups):
+    keys = []
+    seen = {}
+    for g in groups:
+        if g.get('id') is not None:
+            base = str(g['id'])
+        else:
+            ident = json.dumps([g.get('cat'), g.get('brand'), g.get('name')], sort_keys=True)
+            base = hashlib.md5(ident.encode()).hexdigest()[:12]
+        n = seen.get(base, 0)
+        seen[base] = n + 1
+        keys.append(base if n == 0 else f"{base}~{n}")
+    return keys
+
+
+def stamp_catalog_revision(result):
+    groups = result.get('data') or []
+    keys = _group_keys(groups)
+    hashes = {
+        k: hashlib.md5(json.dumps(g, sort_keys=True, separators=(',', ':'), default=catalog.to_json).encode()).hexdigest()
+        for k, g in zip(keys, groups)
+    }
+    meta = {k: v for k, v in result.items() if k != 'data'}
+
+    with CATALOG_LOCK:
+        old_hashes = CATALOG_STATE["hashes"]
+        touched = {k for k, h in hashes.items() if old_hashes.get(k) != h} | (old_hashes.keys() - hashes.keys())
+        order_changed = keys != CATALOG_STATE["keys"]
+        prev = CATALOG_STATE["revision"]
+        if prev and not touched and not order_changed and meta == CATALOG_STATE["meta"]:
+            return prev
+
+        revision = max(prev + 1, int(time.time() * 1000))
+        if prev:
+            CATALOG_STATE["history"].append((prev, revision, touched, order_changed))
+        CATALOG_STATE.update(
+            revision=revision, keys=keys, groups=dict(zip(keys, groups)),
+            hashes=hashes, meta=meta, changes={},
+        )
+    print(f"🔖 Catalog revision {revision}: {len(touched)} groups changed")
+    return revision
+
+
+def get_catalog_changes(since):
+    """Returns the encoded delta payload from revision `since`, or None if it is too old to patch."""
+    with CATALOG_LOCK:
+        cached = CATALOG_STATE["changes"].get(since)
+        if cached:
+            return cached
+
+        revision = CATALOG_STATE["revision"]
+        touched = set()
+        order_changed = False
+        if since != revision:
+            entries = list(CATALOG_STATE["history"])
+            start = next((i for i, e in enumerate(entries) if e[0] == since), None)
+            if start is None:
+                return None
+            for _, _, keys, reordered in entries[start:]:
+                touched |= keys
+                order_changed = order_changed or reordered
+
+        groups = CATALOG_STATE["groups"]
+        body = dict(CATALOG_STATE["meta"], revision=revision, since=since)
+        body["upserts"] = [[k, groups[k]] for k in CATALOG_STATE["keys"] if k in touched]
+        body["removed"] = sorted(k for k in touched if k not in groups)
+        if order_changed:
+            body["order"] = CATALOG_STATE["keys"]
+        payload = build_product_payload(body)
+        CATALOG_STATE["changes"][since] = payload
+        return payload
+
+
+# ===== CATALOG QUERY =====
+# /api/products?cat=&brand=&q=&instock=1&page=&limit= answers one page of groups from an index
+# built once per refresh. Brands, categories, stock and hidden items follow the WebApp's own rules
+# (preprocessData / render in webapp.html), so a page holds exactly the cards the WebApp would show.
+QUERY_PARAMS = {'cat', 'brand', 'q', 'instock', 'hidden', 'page', 'limit'}
+QUERY_DEFAULT_LIMIT = 40
+QUERY_MAX_LIMIT = 200
+QUERY_CACHE_SIZE = 256
+QUERY_BANNED_CATEGORIES = {"Merch", "Munchies"}
+QUERY_CATEGORY_ORDER = ["Accessories", "In-House", "Carts", "Concentrates", "Disposables", "Edibles", "Flower", "Pre-rolls"]
+CATALOG_INDEX = {"revision": 0, "entries": [], "by_cat": {}, "by_brand": {}, "categories": ["Explore"], "search": None}
+QUERY_CACHE = OrderedDict()
+QUERY_CACHE_LOCK = threading.Lock()
+
+
+def _safe_qty(qty):
+    """Same as safeQty() in the WebApp: numbers as is, digits of strings ("500+" -> 500), else 0."""
+    if isinstance(qty, bool):
+        return 0
+    if isinstance(qty, (int, float)):
+        return qty
+    if isinstance(qty, str):
+        digits = re.sub(r'[^0-9]', '', qty)
+        return int(digits) if digits else 0
+    return 0
+
+
+def _display_brand(brand):
+    if not brand:
+        return ''
+    if isinstance(brand, dict) and brand.get('name'):
+        return brand['name']
+    return brand if isinstance(brand, str) else str(brand)
+
+
+def build_catalog_index(revision, keys, groups):
+    """Blocking: precomputes per-group brand, category, stock, hidden id and search text, in display order."""
+    entries = []
+    for key, group in zip(keys, groups):
+        if not isinstance(group, catalog.Group) or not isinstance(group.name, str) or len(group.name) < 3:
+            continue
+        if group.cat and group.cat in QUERY_BANNED_CATEGORIES:
+            continue
+        brand = _display_brand(group.brand)
+        cat = group.cat or "Other"
+        if brand.lower() == "in-house":
+            brand = "Value"
+            if cat.lower() not in ("carts", "disposables"):
+                cat = "In-House"
+        variants = [v for v in (group.products or ()) if isinstance(v, catalog.Variant)]
+        quantities = [_safe_qty(v.qty) for v in variants]
+        search_text = "\0".join([group.name.lower(), brand.lower()] + [(v.name or '').lower() for v in variants])
+        entries.append({
+            "key": key,
+            "group": group,
+            "brand": brand,
+            "cat": cat,
+            "sort_stock": sum(quantities),
+            "stock": sum(q for q in quantities if q > 0),
+            "group_id": variants[0].id if variants else 0,
+            "search": search_text,
+        })
+    # Stable: in-stock groups first, otherwise catalog order (as the WebApp sorts)
+    entries.sort(key=lambda e: 0 if e["sort_stock"] > 0 else 1)
+
+    by_cat = {}
+    by_brand = {}
+    for position, entry in enumerate(entries):
+        by_cat.setdefault(entry["cat"], []).append(position)
+        by_brand.setdefault(entry["brand"], []).append(position)
+    categories = ["Explore"] + [c for c in QUERY_CATEGORY_ORDER if c in by_cat]
+    search = build_search_index(entries)
+
+    with QUERY_CACHE_LOCK:
+        CATALOG_INDEX.update(revision=revision, entries=entries, by_cat=by_cat, by_brand=by_brand, categories=categories, search=search)
+        QUERY_CACHE.clear()
+
+
+def query_catalog(params, admin=False):
+    """Returns the encoded payload for one filtered page of the catalog."""
+    def param(name):
+        return (params.get(name, [''])[0] or '').strip()
+
+    cat = param('cat')
+    if cat == 'Explore':
+        cat = ''
+    brand = param('brand')
+    search = param('q').lower()
+    in_stock_only = param('instock') == '1' or not admin
+    show_hidden = admin and param('hidden') == '1'
+    try:
+        limit = min(max(int(param('limit') or QUERY_DEFAULT_LIMIT), 1), QUERY_MAX_LIMIT)
+        page = max(int(param('page') or 1), 1)
+    except ValueError:
+        limit, page = QUERY_DEFAULT_LIMIT, 1
+
+    hidden = global_config.get("webapp_settings", {}).get("h") or []
+    hidden_ids = frozenset() if show_hidden else frozenset(h for h in hidden if isinstance(h, (int, str)))
+    with QUERY_CACHE_LOCK:
+        index = dict(CATALOG_INDEX)
+        cache_key = (index["revision"], hidden_ids, cat, brand, search, in_stock_only, page, limit)
+        cached = QUERY_CACHE.get(cache_key)
+        if cached:
+            QUERY_CACHE.move_to_end(cache_key)
+            return cached
+
+    entries = index["entries"]
+    if brand:
+        candidates = [entries[i] for i in index["by_brand"].get(brand, [])]
+    elif cat:
+        candidates = [entries[i] for i in index["by_cat"].get(cat, [])]
+    else:
+        candidates = entries
+    matches = [
+        e for e in candidates
+        if (not cat or e["cat"] == cat)
+        and (not in_stock_only or e["stock"] > 0)
+        and e["group_id"] not in hidden_ids
+        and (not search or search in e["search"])
+    ]
+
+    start = (page - 1) * limit
+    page_entries = matches[start:start + limit]
+    meta = PRODUCT_CACHE["data"] or {}
+    body = {
+        "revision": index["revision"],
+        "imagePathPrefix": meta.get("imagePathPrefix"),
+        "imageSizeVariants": meta.get("imageSizeVariants"),
+        "total": len(matches),
+        "page": page,
+        "limit": limit,
+        "pages": (len(matches) + limit - 1) // limit,
+        "categories": index["categories"],
+        "keys": [e["key"] for e in page_entries],
+        "data": [e["group"] for e in page_entries],
+    }
+    payload = build_product_payload(body)
+    with QUERY_CACHE_LOCK:
+        if index["revision"] == CATALOG_INDEX["revision"]:
+            QUERY_CACHE[cache_key] = payload
+            while len(QUERY_CACHE) > QUERY_CACHE_SIZE:
+                QUERY_CACHE.popitem(last=False)
+    return payload
+
+
+# ===== CATALOG SEARCH =====
+# /api/search?q= ranks groups from a token index built with the query index: token -> {entry position:
+# field weight} over group name, brand and variant names. Each query token matches vocabulary tokens
+# exactly, by prefix, or (from SEARCH_FUZZY_MIN_LENGTH letters) with one typo, found through a table of
+# single-character deletions. Every query token must match; results are in-stock first, then by score.
+SEARCH_TOKEN_PATTERN = re.compile(r'[^\W_]+')
+SEARCH_FIELD_WEIGHTS = {"name": 3, "brand": 2, "variant": 1}
+SEARCH_EXACT, SEARCH_PREFIX, SEARCH_FUZZY = 1.0, 0.7, 0.5
+SEARCH_PREFIX_MIN_LENGTH = 2
+SEARCH_FUZZY_MIN_LENGTH = 4
+SEARCH_DEFAULT_LIMIT = 50
+SEARCH_MAX_LIMIT = 500
+
+
+def _search_tokens(text):
+    return SEARCH_TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+def _deletions(token):
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+def _within_one_edit(a, b):
+    """True if a and b differ by at most one insertion, deletion, substitution or adjacent swap."""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    i = 0
+    while i < min(len(a), len(b)) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:] or (a[i:i + 2] == b[i:i + 2][::-1] and a[i + 2:] == b[i + 2:])
+    return a[i + 1:] == b[i:] if len(a) > len(b) else a[i:] == b[i + 1:]
+
+
+def build_search_index(entries):
+    postings = {}
+    for position, entry in enumerate(entries):
+        fields = [(SEARCH_FIELD_WEIGHTS["name"], entry["group"].name), (SEARCH_FIELD_WEIGHTS["brand"], entry["brand"])]
+        fields += [(SEARCH_FIELD_WEIGHTS["variant"], v.name) for v in entry["group"].products or () if isinstance(v, catalog.Variant)]
+        for weight, text in fields:
+            for token in _search_tokens(text):
+                posting = postings.setdefault(token, {})
+                if posting.get(position, 0) < weight:
+                    posting[position] = weight
+    deletions = {}
+    for token in postings:
+        if len(token) >= SEARCH_FUZZY_MIN_LENGTH:
+            for deleted in _deletions(token):
+                deletions.setdefault(deleted, []).append(token)
+    return {"postings": postings, "vocab": sorted(postings), "deletions": deletions}
+
+
+def _match_token(index, query_token):
+    """Vocabulary tokens matching one query token, with their match weight."""
+    postings, vocab = index["postings"], index["vocab"]
+    matches = {}
+    if query_token in postings:
+        matches[query_token] = SEARCH_EXACT
+    if len(query_token) >= SEARCH_PREFIX_MIN_LENGTH:
+        i = bisect.bisect_right(vocab, query_token)
+        while i < len(vocab) and vocab[i].startswith(query_token):
+            matches[vocab[i]] = SEARCH_PREFIX
+            i += 1
+    if len(query_token) >= SEARCH_FUZZY_MIN_LENGTH:
+        deletions = index["deletions"]
+        candidates = set(deletions.get(query_token, ()))
+        for deleted in _deletions(query_token):
+            if deleted in postings:
+                candidates.add(deleted)
+            candidates.update(deletions.get(deleted, ()))
+        for token in candidates:
+            if token not in matches and _within_one_edit(query_token, token):
+                matches[token] = SEARCH_FUZZY
+    return matches
+
+
+def search_catalog(query, limit=SEARCH_DEFAULT_LIMIT, admin=False, show_hidden=False):
+    """Group keys matching every token of query, in-stock first and then by relevance."""
+    with QUERY_CACHE_LOCK:
+        index = dict(CATALOG_INDEX)
+    search = index["search"]
+    tokens = list(dict.fromkeys(_search_tokens(query)))
+    if not search or not tokens:
+        return {"revision": index["revision"], "q": query, "total": 0, "keys": []}
+
+    scores = None
+    for query_token in tokens:
+        token_scores = {}
+        for token, match_weight in _match_token(search, query_token).items():
+            for position, field_weight in search["postings"][token].items():
+                score = field_weight * match_weight
+                if token_scores.get(position, 0) < score:
+                    token_scores[position] = score
+        if scores is None:
+            scores = token_scores
+        else:
+            scores = {p: s + token_scores[p] for p, s in scores.items() if p in token_scores}
+        if not scores:
+            break
+
+    entries = index["entries"]
+    hidden = global_config.get("webapp_settings", {}).get("h") or []
+    hidden_ids = frozenset() if admin and show_hidden else frozenset(h for h in hidden if isinstance(h, (int, str)))
+    matches = [p for p in scores if entries[p]["group_id"] not in hidden_ids]
+    ranked = heapq.nsmallest(limit, matches, key=lambda p: (entries[p]["stock"] <= 0, -scores[p], p))
+    return {"revision": index["revision"], "q": query, "total": len(matches), "keys": [entries[p]["key"] for p in ranked]}
+
+
+def _set_product_cache(result):
+    # Groups are kept as compact catalog.Group records; the payloads serialize them to the same JSON
+    result = dict(result, data=catalog.build_catalog(result.get('data') or []))
+    revision = stamp_catalog_revision(result)
+    payload = build_product_payload(dict(result, revision=revision, keys=CATALOG_STATE["keys"]))
+    build_catalog_index(revision, CATALOG_STATE["keys"], result["data"])
+    PRODUCT_CACHE["data"] = result
+    PRODUCT_CACHE["payload"] = payload
+    PRODUCT_CACHE["timestamp"] = time.time()
+    sizes = ", ".join(f"{enc} {len(body) // 1024}KB" for enc, (body, _) in payload.items())
+    print(f"📦 Product payload built: {sizes}")
+
+
 def _load_initial_cache():
-    import os
-    base_dir = os.path.dirname(os.path.abspath(__file__))
+    """Runs in a background thread at startup; CATALOG_LOADED is set when it finishes either way."""
+    try:
+        _load_catalog_from_disk()
+    finally:
+        with CATALOG_WAITERS_LOCK:
+            CATALOG_LOADED.set()
+            waiters = list(CATALOG_WAITERS.items())
+            CATALOG_WAITERS.clear()
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # that loop has already closed
+
 
+def _load_catalog_from_disk():
+    data = None
+    started = time.perf_counter()
     try:
-        full_path = os.path.join(base_dir, "scraped_products.json")
-        if os.path.exists(full_path):
-            with open(full_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            if data and isinstance(data.get('data'), list) and len(data['data']) > 0:
-                print(f"📦 Loaded {len(data['data'])} groups from scraped_products.json")
-                return {"data": data, "timestamp": time.time(), "last_attempt": 0}
+        if os.path.exists(PRODUCT_SNAPSHOT_FILE):
+            data = catalog_io.load_snapshot(PRODUCT_SNAPSHOT_FILE)
+            source = "products.snapshot"
+    except Exception as e:
+        print(f"⚠️ Could not load products.snapshot: {e}")
+
+    try:
+        # Deployments from before snapshots only have the JSON file; convert it once
+        if data is None and os.path.exists(SCRAPED_PRODUCTS_FILE):
+            data = catalog_io.load_catalog(SCRAPED_PRODUCTS_FILE)
+            source = "scraped_products.json"
+            if data and data.get('data'):
+                catalog_io.write_snapshot(PRODUCT_SNAPSHOT_FILE, data)
     except Exception as e:
         print(f"⚠️ Could not load scraped_products.json: {e}")
 
-    return {"data": None, "timestamp": 0, "last_attempt": 0}
+    if data and isinstance(data.get('data'), list) and len(data['data']) > 0:
+        loaded = time.perf_counter()
+        _set_product_cache(data)
+        print(f"📦 Loaded {len(data['data'])} groups from {source} in background: "
+              f"read {(loaded - started) * 1000:.0f}ms, payload {(time.perf_counter() - loaded) * 1000:.0f}ms")
+
+
+async def wait_for_catalog(timeout=30):
+    """Waits (without blocking the event loop or holding an executor thread) until the startup catalog
+    load has finished. Waiters share one asyncio.Event per loop, set from the loader thread."""
+    if CATALOG_LOADED.is_set():
+        return
+    loop = asyncio.get_running_loop()
+    with CATALOG_WAITERS_LOCK:
+        if CATALOG_LOADED.is_set():
+            return
+        event = CATALOG_WAITERS.get(loop)
+        if event is None:
+            event = CATALOG_WAITERS[loop] = asyncio.Event()
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
 
 
-PRODUCT_CACHE = _load_initial_cache()
+PRODUCT_CACHE = {"data": None, "payload": None, "timestamp": 0, "last_attempt": 0}
+CATALOG_LOADED = threading.Event()
+# Event loop -> asyncio.Event for coroutines waiting in wait_for_catalog (the web server and PTB run separate loops)
+CATALOG_WAITERS = {}
+CATALOG_WAITERS_LOCK = threading.Lock()
 CACHE_DURATION = 21600
 FAILURE_COOLDOWN = 3600
 SCRAPE_LOCK = threading.Lock()
 SCRAPE_IN_PROGRESS = False
 
 
-class BotRequestHandler(SimpleHTTPRequestHandler):
-    def do_GET(self):
+# ===== WEB SERVER =====
+# Single asyncio server on its own event loop in the web thread. Connections are kept alive
+# (HTTP/1.1), at most HTTP_MAX_CONNECTIONS are served at once, and upstream image fetches
+# go through one shared httpx client instead of blocking a thread per request.
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS") or 512)
+HTTP_KEEPALIVE_TIMEOUT = 15
+HTTP_MAX_HEADER_SIZE = 64 * 1024
+HTTP_MAX_BODY_SIZE = 1024 * 1024
+HTTP_UPSTREAM_CONNECTIONS = int(os.getenv("HTTP_UPSTREAM_CONNECTIONS") or 16)
+STATIC_EXTENSIONS = {'.html', '.css', '.js', '.png', '.jpg', '.jpeg', '.gif', '.webp', '.svg', '.ico'}
+UPSTREAM_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Referer': 'https://rogersroofing.click/',
+    'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
+}
+HTTP_STATE = {"connections": None, "client": None, "upstream_slots": None}
+IMAGE_INFLIGHT = {}
+
+
+def _get_upstream_client():
+    if HTTP_STATE["client"] is None:
+        HTTP_STATE["client"] = httpx.AsyncClient(
+            headers=UPSTREAM_HEADERS,
+            timeout=15,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=HTTP_UPSTREAM_CONNECTIONS, max_keepalive_connections=HTTP_UPSTREAM_CONNECTIONS),
+        )
+    return HTTP_STATE["client"]
+
+
+async def fetch_upstream_image(url):
+    async with HTTP_STATE["upstream_slots"]:
+        started = time.time()
+        resp = await _get_upstream_client().get(url)
+        resp.raise_for_status()
+        image_cache.record_upstream(time.time() - started, len(resp.content))
+    return resp.content, resp.headers.get('Content-Type', 'image/webp')
+
+
+async def _fetch_and_cache_image(url, cache_name):
+    img_data, content_type = await fetch_upstream_image(url)
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, image_cache.store, cache_name, img_data, content_type)
+    except Exception as e:
+        print(f"⚠️ Could not cache image {cache_name}: {e}")
+    return img_data, content_type
+
+
+def _finish_single_flight(key, task):
+    IMAGE_INFLIGHT.pop(key, None)
+    if not task.cancelled():
+        task.exception()
+
+
+async def single_flight(key, factory):
+    """Runs factory() once per key at a time; concurrent callers with the same key share its result."""
+    task = IMAGE_INFLIGHT.get(key)
+    if task is None:
+        task = asyncio.ensure_future(factory())
+        IMAGE_INFLIGHT[key] = task
+        task.add_done_callback(lambda t: _finish_single_flight(key, t))
+    else:
+        image_cache.record_coalesced()
+    # Shielded so a client disconnecting does not cancel the work other requests are waiting on
+    return await asyncio.shield(task)
+
+
+async def fetch_image_single_flight(url, cache_name):
+    """One upstream fetch per URL at a time; concurrent misses for the same URL share its result."""
+    return await single_flight(url, lambda: _fetch_and_cache_image(url, cache_name))
+
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class HttpRequest:
+    def __init__(self, method, path, version, headers, body):
+        self.method = method
+        self.path = path
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self):
+        connection = (self.headers.get('Connection') or '').lower()
+        if self.version == 'HTTP/1.0':
+            return connection == 'keep-alive'
+        return connection != 'close'
+
+
+async def read_http_request(reader):
+    """Returns the next request on the connection, None when the client is done, or raises ValueError."""
+    try:
+        head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), HTTP_KEEPALIVE_TIMEOUT)
+    except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+        return None
+    except asyncio.LimitOverrunError:
+        raise ValueError("Request header too large")
+
+    request_line, _, header_block = head.partition(b'\r\n')
+    parts = request_line.decode('latin-1').split()
+    if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+        raise ValueError("Malformed request line")
+    method, path, version = parts
+    headers = http.client.parse_headers(io.BytesIO(header_block))
+
+    length = int(headers.get('Content-Length') or 0)
+    if length > HTTP_MAX_BODY_SIZE:
+        raise ValueError("Request body too large")
+    body = await reader.readexactly(length) if length else b''
+    return HttpRequest(method, path, version, headers, body)
+
+
+class BotRequestHandler:
+    def __init__(self, request):
+        self.request = request
+        self.path = request.path
+        self.headers = request.headers
+        self.status = 500
+        self.response_headers = []
+        self.body = b''
+
+    async def handle(self):
+        try:
+            if self.request.method in ('GET', 'HEAD'):
+                await self.do_GET()
+            elif self.request.method == 'POST':
+                await self.do_POST()
+            elif self.request.method == 'OPTIONS':
+                self.do_OPTIONS()
+            else:
+                self.send_text(405, "Method not allowed")
+        except Exception as e:
+            print(f"❌ Unhandled HTTP error for {self.request.method} {self.path}: {e}")
+            self.response_headers = []
+            self.send_text(500, "Internal server error")
+
+    def render(self, keep_alive):
+        lines = [f"HTTP/1.1 {self.status} {http.HTTPStatus(self.status).phrase}"]
+        for name, value in self.response_headers:
+            lines.append(f"{name}: {value}")
+        if self.status != 304 and not any(name == 'Content-Length' for name, _ in self.response_headers):
+            lines.append(f"Content-Length: {len(self.body)}")
+        lines.append("Connection: keep-alive" if keep_alive else "Connection: close")
+        head = ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1')
+        if self.request.method == 'HEAD' or self.status == 304:
+            return head
+        return head + self.body
+
+    def send_response(self, status, body=b'', headers=()):
+        self.status = status
+        self.response_headers = list(headers)
+        self.body = body
+
+    def send_text(self, status, message):
+        self.send_response(status, message.encode('utf-8'), [
+            ('Content-Type', 'text/plain'),
+            ('Access-Control-Allow-Origin', '*'),
+        ])
+
+    async def do_GET(self):
         global PRODUCT_CACHE
 
         if self.path == '/favicon.ico':
             self.send_response(204)
-            self.end_headers()
             return
 
         if self.path.startswith('/api/settings'):
@@ -2438,192 +3749,218 @@ class BotRequestHandler(SimpleHTTPRequestHandler):
             return
 
         if self.path.startswith('/api/img'):
+            await self.send_image()
+            return
+
+        if self.path.startswith('/api/products/changes'):
+            params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
             try:
-                import hashlib as img_hashlib
-                parsed = urllib.parse.urlparse(self.path)
-                params = urllib.parse.parse_qs(parsed.query)
-                raw_path = params.get('u', [''])[0]
-                if not raw_path:
-                    self.send_response(400)
-                    self.send_header('Content-Type', 'text/plain')
-                    self.end_headers()
-                    self.wfile.write(b"Missing ?u= parameter")
-                    return
+                since = int(params.get('since', ['0'])[0])
+            except ValueError:
+                since = 0
+            payload = get_catalog_changes(since) if since else None
+            if payload:
+                self.send_products(payload)
+            else:
+                self.send_json({"full": True, "revision": CATALOG_STATE["revision"]})
+            return
 
-                base_dir = os.path.dirname(os.path.abspath(__file__))
-                cache_dir = os.path.join(base_dir, "cached_images")
-                os.makedirs(cache_dir, exist_ok=True)
-
-                ct_map = {'webp': 'image/webp', 'png': 'image/png', 'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'gif': 'image/gif'}
-
-                if raw_path.startswith('__cached__:'):
-                    cache_name = raw_path[len('__cached__:'):]
-                    import re as re_mod
-                    if not re_mod.match(r'^[a-f0-9]+\.\w+$', cache_name):
-                        self.send_response(400)
-                        self.send_header('Content-Type', 'text/plain')
-                        self.end_headers()
-                        self.wfile.write(b"Invalid cache key")
-                        return
-                    cache_path = os.path.join(cache_dir, cache_name)
-                    if os.path.exists(cache_path):
-                        with open(cache_path, 'rb') as cf:
-                            img_data = cf.read()
-                        ext = cache_name.rsplit('.', 1)[-1].lower() if '.' in cache_name else ''
-                        content_type = ct_map.get(ext, 'image/webp')
-                        self.send_response(200)
-                        self.send_header('Content-Type', content_type)
-                        self.send_header('Access-Control-Allow-Origin', '*')
-                        self.send_header('Cache-Control', 'public, max-age=86400')
-                        self.send_header('Content-Length', str(len(img_data)))
-                        self.end_headers()
-                        self.wfile.write(img_data)
-                        return
-                    else:
-                        self.send_response(404)
-                        self.send_header('Content-Type', 'text/plain')
-                        self.send_header('Access-Control-Allow-Origin', '*')
-                        self.end_headers()
-                        self.wfile.write(b"Cached image not found")
-                        return
-
-                if raw_path.startswith('http://') or raw_path.startswith('https://'):
-                    img_url = raw_path
-                else:
-                    if not raw_path.startswith('/'):
-                        raw_path = '/' + raw_path
-                    img_url = f"https://rogersroofing.click{raw_path}"
+        if self.path.startswith('/api/search'):
+            params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            try:
+                limit = min(max(int(params.get('limit', [SEARCH_DEFAULT_LIMIT])[0]), 1), SEARCH_MAX_LIMIT)
+            except ValueError:
+                limit = SEARCH_DEFAULT_LIMIT
+            await wait_for_catalog()
+            admin = params.get('token', [''])[0] == ADMIN_TOKEN
+            self.send_json(search_catalog(
+                params.get('q', [''])[0][:200], limit=limit,
+                admin=admin, show_hidden=params.get('hidden', [''])[0] == '1',
+            ))
+            return
 
-                req = urllib.request.Request(img_url, headers={
-                    'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                    'Referer': 'https://rogersroofing.click/',
-                    'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
-                })
+        if self.path.startswith('/api/products'):
+            params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            if QUERY_PARAMS & params.keys():
+                await wait_for_catalog()
+                if not PRODUCT_CACHE["payload"]:
+                    self.send_json({"data": [], "error": True, "message": "Catalog not loaded yet"}, status=503)
+                    return
+                admin = params.get('token', [''])[0] == ADMIN_TOKEN
+                self.send_products(query_catalog(params, admin=admin))
+                return
+            await self.send_product_list()
+            return
 
-                with urllib.request.urlopen(req, timeout=15) as resp:
-                    img_data = resp.read()
-                    content_type = resp.headers.get('Content-Type', 'image/webp')
+        await self.send_static()
 
-                if len(img_data) > 500:
-                    try:
-                        with open(cache_path, 'wb') as cf:
-                            cf.write(img_data)
-                    except:
-                        pass
+    async def send_image(self):
+        try:
+            parsed = urllib.parse.urlparse(self.path)
+            params = urllib.parse.parse_qs(parsed.query)
+            raw_path = params.get('u', [''])[0]
+            if not raw_path:
+                self.send_response(400, b"Missing ?u= parameter", [('Content-Type', 'text/plain')])
+                return
 
-                self.send_response(200)
-                self.send_header('Content-Type', content_type)
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.send_header('Cache-Control', 'public, max-age=86400')
-                self.send_header('Content-Length', str(len(img_data)))
-                self.end_headers()
-                self.wfile.write(img_data)
-            except Exception as e:
-                print(f"❌ Image proxy error for {self.path}: {e}")
-                self.send_response(404)
-                self.send_header('Content-Type', 'text/plain')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(f"Image proxy error: {e}".encode())
-            return
+            img_url = None
+            if raw_path.startswith('__cached__:'):
+                cache_name = raw_path[len('__cached__:'):]
+                if not image_cache.CACHE_NAME_PATTERN.match(cache_name):
+                    self.send_response(400, b"Invalid cache key", [('Content-Type', 'text/plain')])
+                    return
+                names = [cache_name]
+            else:
+                # Absolute URLs on other hosts are served from the cache the scraper filled, never fetched
+                img_url = image_cache.upstream_url(raw_path)
+                names = image_cache.candidate_names(img_url or raw_path)
+
+            # ?w= asks for a resized rendition, encoded in the best format the client accepts
+            rendition = None
+            width = image_cache.rendition_width(params.get('w', [''])[0])
+            if width and image_cache.Image is not None and not names[0].endswith('.gif'):
+                fmt = image_cache.negotiate_format(self.headers.get('Accept'))
+                rendition = (image_cache.rendition_name(names[0], width, fmt), width, fmt)
+                cached = await self.lookup_image([rendition[0]])
+                if cached:
+                    self.send_image_bytes(*cached, vary=True)
+                    return
 
-        if self.path.startswith('/api/products'):
-            http_started_scrape = False
-            try:
-                if PRODUCT_CACHE["data"]:
-                    items = PRODUCT_CACHE["data"].get("data", [])
-                    print(f"✅ Serving {len(items)} products from cache")
-                    self.send_json(PRODUCT_CACHE["data"])
+            source = await self.lookup_image(names)
+            if not source:
+                if img_url is None:
+                    self.send_text(404, "Cached image not found")
                     return
+                source = await fetch_image_single_flight(img_url, names[-1])
 
-                with SCRAPE_LOCK:
-                    global SCRAPE_IN_PROGRESS
-                    now = time.time()
+            if rendition:
+                name, width, fmt = rendition
+                source = await single_flight(
+                    name,
+                    lambda: asyncio.get_running_loop().run_in_executor(None, image_cache.build_rendition, name, *source, width, fmt)
+                )
+            self.send_image_bytes(*source, vary=bool(rendition))
+        except Exception as e:
+            image_cache.record_error()
+            print(f"❌ Image proxy error for {self.path}: {e}")
+            self.send_text(404, f"Image proxy error: {e}")
+
+    async def lookup_image(self, names):
+        for name in names:
+            cached = image_cache.from_memory(name)
+            if cached:
+                return cached
+        loop = asyncio.get_running_loop()
+        for name in names:
+            cached = await loop.run_in_executor(None, image_cache.from_disk, name)
+            if cached:
+                return cached
+        return None
 
-                    if PRODUCT_CACHE["data"]:
-                        self.send_json(PRODUCT_CACHE["data"])
-                        return
+    def send_image_bytes(self, img_data, content_type, vary=False):
+        headers = [
+            ('Content-Type', content_type),
+            ('Access-Control-Allow-Origin', '*'),
+            ('Cache-Control', 'public, max-age=86400'),
+        ]
+        if vary:
+            headers.append(('Vary', 'Accept'))
+        self.send_response(200, img_data, headers)
 
-                    if SCRAPE_IN_PROGRESS:
-                        print("⏳ Scrape already in progress. Serving empty.")
-                        self.send_json({"data": [], "error": True, "message": "Scrape in progress, please wait"})
-                        return
+    async def send_product_list(self):
+        global SCRAPE_IN_PROGRESS
+        http_started_scrape = False
+        try:
+            # Right after boot the catalog may still be loading from disk; don't start a scrape for that
+            await wait_for_catalog()
+            if PRODUCT_CACHE["payload"]:
+                self.send_products()
+                return
 
-                    if now - PRODUCT_CACHE.get("last_attempt", 0) < FAILURE_COOLDOWN:
-                        print("⏳ Scrape cooldown active. Serving empty.")
-                        self.send_json({"data": [], "error": True, "message": "Scrape cooldown active"})
-                        return
+            with SCRAPE_LOCK:
+                now = time.time()
 
-                    PRODUCT_CACHE["last_attempt"] = now
-                    SCRAPE_IN_PROGRESS = True
-                    http_started_scrape = True
+                if PRODUCT_CACHE["payload"]:
+                    self.send_products()
+                    return
 
-                try:
-                    print("📂 No cached data - running initial scrape...")
-                    scraper = RogersRoofingScraper(
-                        username=CHADS_USERNAME,
-                        password=CHADS_PASSWORD,
-                        api_key=CHADS_API_KEY
-                    )
-                    fresh_result = scraper.get_products()
-                finally:
-                    if http_started_scrape:
-                        with SCRAPE_LOCK:
-                            SCRAPE_IN_PROGRESS = False
-
-                if fresh_result and isinstance(fresh_result.get('data'), list) and len(fresh_result['data']) > 0:
-                    new_count = len(fresh_result['data'])
-                    print(f"📊 Scrape found: {new_count} products.")
-
-                    if not fresh_result.get('imagePathPrefix'):
-                        fresh_result['imagePathPrefix'] = "/uploads/products/"
+                if SCRAPE_IN_PROGRESS:
+                    print("⏳ Scrape already in progress. Serving empty.")
+                    self.send_json({"data": [], "error": True, "message": "Scrape in progress, please wait"})
+                    return
 
-                    try:
-                        with open("scraped_products.json", "w", encoding="utf-8") as f:
-                            json.dump(fresh_result, f, indent=2)
-                    except:
-                        pass
+                if now - PRODUCT_CACHE.get("last_attempt", 0) < FAILURE_COOLDOWN:
+                    print("⏳ Scrape cooldown active. Serving empty.")
+                    self.send_json({"data": [], "error": True, "message": "Scrape cooldown active"})
+                    return
 
-                    PRODUCT_CACHE["data"] = fresh_result
-                    PRODUCT_CACHE["timestamp"] = time.time()
-                    self.send_json(fresh_result)
-                else:
-                    print("❌ Scrape returned no products.")
-                    if PRODUCT_CACHE["data"]:
-                        self.send_json(PRODUCT_CACHE["data"])
-                    else:
-                        self.send_json({"error": True, "message": "Could not load product data"})
+                PRODUCT_CACHE["last_attempt"] = now
+                SCRAPE_IN_PROGRESS = True
+                http_started_scrape = True
 
-            except Exception as e:
+            try:
+                print("📂 No cached data - running initial scrape...")
+                fresh_result = await run_scraper_process()
+            finally:
                 if http_started_scrape:
                     with SCRAPE_LOCK:
                         SCRAPE_IN_PROGRESS = False
-                print(f"❌ Critical error in API proxy: {str(e)}")
-                import traceback
-                traceback.print_exc()
 
-                if PRODUCT_CACHE["data"]:
-                    print("⚠️ Serving stale cache due to critical error.")
-                    self.send_json(PRODUCT_CACHE["data"])
+            if fresh_result and isinstance(fresh_result.get('data'), list) and len(fresh_result['data']) > 0:
+                new_count = len(fresh_result['data'])
+                print(f"📊 Scrape found: {new_count} products.")
+
+                if not fresh_result.get('imagePathPrefix'):
+                    fresh_result['imagePathPrefix'] = "/uploads/products/"
+
+                # Catalog build, compression and index builds are CPU work; keep the event loop serving
+                await asyncio.get_running_loop().run_in_executor(None, _set_product_cache, fresh_result)
+                self.send_products()
+            else:
+                print("❌ Scrape returned no products.")
+                if PRODUCT_CACHE["payload"]:
+                    self.send_products()
                 else:
-                    self.send_json({"data": [], "error": True, "message": f"Error fetching products: {str(e)}"})
-            return
+                    self.send_json({"error": True, "message": "Could not load product data"})
 
-        return super().do_GET()
+        except Exception as e:
+            if http_started_scrape:
+                with SCRAPE_LOCK:
+                    SCRAPE_IN_PROGRESS = False
+            print(f"❌ Critical error in API proxy: {str(e)}")
+            import traceback
+            traceback.print_exc()
+
+            if PRODUCT_CACHE["payload"]:
+                print("⚠️ Serving stale cache due to critical error.")
+                self.send_products()
+            else:
+                self.send_json({"data": [], "error": True, "message": f"Error fetching products: {str(e)}"})
+
+    async def send_static(self):
+        # Only front-end assets next to bot.py; the database, config and source files are never served
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        rel_path = urllib.parse.unquote(urllib.parse.urlparse(self.path).path).lstrip('/')
+        full_path = os.path.realpath(os.path.join(base_dir, rel_path or 'index.html'))
+        ext = os.path.splitext(full_path)[1].lower()
+        if not full_path.startswith(base_dir + os.sep) or ext not in STATIC_EXTENSIONS or not os.path.isfile(full_path):
+            self.send_text(404, "File not found")
+            return
+        content = await asyncio.get_running_loop().run_in_executor(None, _read_file, full_path)
+        content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+        self.send_response(200, content, [('Content-Type', content_type)])
 
     def do_OPTIONS(self):
-        self.send_response(200)
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
-        self.end_headers()
+        self.send_response(200, headers=[
+            ('Access-Control-Allow-Origin', '*'),
+            ('Access-Control-Allow-Methods', 'GET, POST, OPTIONS'),
+            ('Access-Control-Allow-Headers', 'Content-Type, Authorization'),
+        ])
 
-    def do_POST(self):
+    async def do_POST(self):
         if self.path.startswith('/api/save_settings'):
             try:
-                content_length = int(self.headers.get('Content-Length', 0))
-                body = self.rfile.read(content_length)
-                data = json.loads(body.decode('utf-8'))
+                data = json.loads(self.request.body.decode('utf-8'))
 
                 token = data.get('token', '')
                 if token != ADMIN_TOKEN:
@@ -2641,7 +3978,7 @@ class BotRequestHandler(SimpleHTTPRequestHandler):
                     new_settings['r'] = {}
 
                 global_config["webapp_settings"] = new_settings
-                save_config()
+                await run_db(save_config)
                 print(f"✅ Admin settings saved: {len(new_settings.get('h', []))} hidden items")
                 self.send_json({"success": True, "message": "Settings saved"})
             except Exception as e:
@@ -2652,30 +3989,85 @@ class BotRequestHandler(SimpleHTTPRequestHandler):
         self.send_json({"error": True, "message": "Not found"}, status=404)
 
     def send_json(self, data, status=200):
+        response = json.dumps(data).encode('utf-8')
+        self.send_response(status, response, [
+            ('Content-type', 'application/json'),
+            ('Access-Control-Allow-Origin', '*'),
+            ('Cache-Control', 'no-cache'),
+        ])
+
+    def send_products(self, payload=None):
+        payload = payload or PRODUCT_CACHE["payload"]
+        encoding = _pick_encoding(self.headers.get('Accept-Encoding'), payload)
+        body, etag = payload[encoding]
+        matched = _matching_etag(self.headers.get('If-None-Match'), payload, encoding)
+        if matched:
+            self.send_response(304, headers=[
+                ('ETag', matched),
+                ('Vary', 'Accept-Encoding'),
+                ('Access-Control-Allow-Origin', '*'),
+                ('Cache-Control', 'no-cache'),
+            ])
+            return
+        headers = [('Content-type', 'application/json')]
+        if encoding != "identity":
+            headers.append(('Content-Encoding', encoding))
+        headers += [
+            ('ETag', etag),
+            ('Vary', 'Accept-Encoding'),
+            ('Access-Control-Allow-Origin', '*'),
+            ('Cache-Control', 'no-cache'),
+        ]
+        self.send_response(200, body, headers)
+
+
+async def handle_http_connection(reader, writer):
+    async with HTTP_STATE["connections"]:
         try:
-            response = json.dumps(data).encode('utf-8')
-            self.send_response(status)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Cache-Control', 'no-cache')
-            self.end_headers()
-            self.wfile.write(response)
-        except (BrokenPipeError, ConnectionResetError):
+            while True:
+                try:
+                    request = await read_http_request(reader)
+                except ValueError as e:
+                    writer.write(f"HTTP/1.1 400 Bad Request\r\nContent-Length: {len(str(e))}\r\nConnection: close\r\n\r\n{e}".encode('latin-1'))
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+
+                handler = BotRequestHandler(request)
+                await handler.handle()
+                keep_alive = request.keep_alive
+                writer.write(handler.render(keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
             pass
+        finally:
+            writer.close()
 
-    def log_message(self, format, *args):
-        pass  # Suppress default HTTP server logs
+
+async def serve_http(host, port):
+    HTTP_STATE["connections"] = asyncio.Semaphore(HTTP_MAX_CONNECTIONS)
+    HTTP_STATE["upstream_slots"] = asyncio.Semaphore(HTTP_UPSTREAM_CONNECTIONS)
+    server = await asyncio.start_server(handle_http_connection, host, port, limit=HTTP_MAX_HEADER_SIZE, backlog=1024)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if HTTP_STATE["client"] is not None:
+            await HTTP_STATE["client"].aclose()
+            HTTP_STATE["client"] = None
 
 
 def run_simple_server():
     port = int(os.getenv("PORT", 8080))
     print(f"🌍 Starting Web Server on port {port}…")
-    server_address = ('0.0.0.0', port)
-    httpd = ThreadingHTTPServer(server_address, BotRequestHandler)
-    httpd.serve_forever()
+    asyncio.run(serve_http('0.0.0.0', port))
 
 
 def main():
+    mark_startup("imports")
     print(f"🚀 Bot is starting… (PTB Version: {ptb_version})")
     if not TOKEN:
         print("❌ Error: BOT_TOKEN is missing! Set it in your environment variables.")
@@ -2698,13 +4090,16 @@ def main():
 
     conn = init_db()
     migrate_json_to_db(conn)
-    conn.close()
+    mark_startup("database")
+    load_user_cache()
     load_config()
+    mark_startup("user cache & config")
 
+    threading.Thread(target=_load_initial_cache, name="catalog-load", daemon=True).start()
     if os.getenv("PORT"):
         threading.Thread(target=run_simple_server, daemon=True).start()
 
-    app = ApplicationBuilder().token(TOKEN).post_init(set_commands).build()
+    app = ApplicationBuilder().token(TOKEN).post_init(on_startup).post_shutdown(stop_outbound).build()
 
     # Handlers
     app.add_handler(CommandHandler("start", start))
@@ -2727,6 +4122,7 @@ def main():
     app.add_handler(CommandHandler("myreferrals", myreferrals_command))
     app.add_handler(CommandHandler("listreferrals", listreferrals_command))
     app.add_handler(CommandHandler("redeempoints", redeempoints_command))
+    app.add_handler(CommandHandler("stats", stats_command))
     app.add_handler(CommandHandler("help", help_command))
 
     app.add_handler(CallbackQueryHandler(handle_reply_selection, pattern=r"^reply_[\w-]+$"))
@@ -2749,8 +4145,9 @@ def main():
 
     # Job Queue
     app.job_queue.run_repeating(check_timeouts, interval=60, first=10)
-    app.job_queue.run_repeating(auto_refresh_job, interval=21600, first=30)
+    app.job_queue.run_once(auto_refresh_job, when=30, name="auto_refresh")
     app.job_queue.run_repeating(cleanup_database, interval=86400, first=60)
+    mark_startup("application")
 
     print("Bot is running...")
     app.run_polling(drop_pending_updates=True)
@@ -0,0 +1,104 @@
+import sys
+
+# Compact in-memory form of the scraped catalog. Groups and variants are __slots__ records with
+# interned brand/category/tag strings and price tiers packed into tuples. Each record keeps the key
+# order of the dict it was built from (one shared tuple per distinct layout) plus any keys it does
+# not model, so json.dumps(..., default=to_json) writes exactly the bytes the raw dicts would.
+
+_LAYOUTS = {}
+TIER_KEYS = ('price', 'qty')
+
+
+def _layout(raw):
+    keys = tuple(sys.intern(k) for k in raw)
+    return _LAYOUTS.setdefault(keys, keys)
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _strings(values, intern=False):
+    """A list of strings as a tuple (interned if asked); anything else is kept as is."""
+    if isinstance(values, list) and all(isinstance(v, str) for v in values):
+        return tuple(sys.intern(v) for v in values) if intern else tuple(values)
+    return values
+
+
+class _Record:
+    __slots__ = ('_layout', '_extra')
+    FIELDS = frozenset()
+
+    def __init__(self, raw):
+        extra = None
+        for name in self.FIELDS:
+            setattr(self, name, None)
+        for key, value in raw.items():
+            if key in self.FIELDS:
+                setattr(self, key, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        self._layout = _layout(raw)
+        self._extra = extra
+
+    def get(self, key, default=None):
+        """Dict-style read of any key the source dict had, modelled or not."""
+        if key not in self._layout:
+            return default
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        return getattr(self, key)
+
+    def to_json(self):
+        extra = self._extra
+        if extra is None:
+            return {key: getattr(self, key) for key in self._layout}
+        return {key: extra[key] if key in extra else getattr(self, key) for key in self._layout}
+
+
+class Variant(_Record):
+    __slots__ = ('id', 'name', 'price', 'qty', 'desc', 'tags', 'images', 'tiers')
+    FIELDS = frozenset(__slots__)
+
+    def __init__(self, raw):
+        super().__init__(raw)
+        self.qty = _intern(self.qty)
+        self.tags = _strings(self.tags, intern=True)
+        self.images = _strings(self.images)
+        tiers = self.tiers
+        # [{"price": 15.99, "qty": "5+"}, ...] -> ((15.99, "5+"), ...); other shapes are kept as they came
+        if isinstance(tiers, list) and all(isinstance(t, dict) and tuple(t) == TIER_KEYS for t in tiers):
+            self.tiers = tuple((t['price'], _intern(t['qty'])) for t in tiers)
+
+    def to_json(self):
+        data = super().to_json()
+        if type(self.tiers) is tuple:
+            data['tiers'] = [{'price': price, 'qty': qty} for price, qty in self.tiers]
+        return data
+
+
+class Group(_Record):
+    __slots__ = ('name', 'desc', 'brand', 'cat', 'tags', 'imgs', 'products')
+    FIELDS = frozenset(__slots__)
+
+    def __init__(self, raw):
+        super().__init__(raw)
+        self.brand = _intern(self.brand)
+        self.cat = _intern(self.cat)
+        self.tags = _strings(self.tags, intern=True)
+        if isinstance(self.products, list):
+            self.products = tuple(Variant(p) if isinstance(p, dict) else p for p in self.products)
+
+
+def build_catalog(groups):
+    """Records for the raw group dicts of a scrape result (non-dict entries are kept as they are)."""
+    return [Group(g) if isinstance(g, dict) else g for g in groups]
+
+
+def to_json(obj):
+    """`default` hook for json.dumps."""
+    if isinstance(obj, _Record):
+        return obj.to_json()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import marshal
+import mmap
+import os
+import re
+import struct
+import sys
+
+# Incremental reading of catalog payloads (the upstream scrape response, the scraper's result
+# file, scraped_products.json). The document is read in chunks and the big "data" array is decoded
+# one group at a time, so the raw text is never held in memory as one string.
+
+CHUNK_CHARS = 64 * 1024
+
+# Binary snapshot of a scrape result: SNAPSHOT_MAGIC, "<HI" (marshal version, header length), the
+# marshalled top-level keys other than "data", then the marshalled group list. Short strings are
+# interned before writing, so repeated brands/categories/attributes are stored once and come back
+# as one shared object after loading.
+SNAPSHOT_MAGIC = b"RRSNAP1\n"
+SNAPSHOT_INTERN_MAX = 64
+_SNAPSHOT_HEADER = struct.Struct('<HI')
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_NUMBER_END = re.compile(r'[^0-9.eE+-]')
+
+
+class _Stream:
+    def __init__(self, fp):
+        self.fp = fp
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        if self.eof:
+            return False
+        chunk = self.fp.read(CHUNK_CHARS)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character without consuming it, '' at end of input."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, chars):
+        ch = self.peek()
+        if not ch or ch not in chars:
+            raise ValueError(f"Expected one of {chars!r} but found {ch!r}")
+        self.pos += 1
+        return ch
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # Numbers are the only values not self-delimiting: one cut at the buffer edge ("12" of
+            # "12.5e3") decodes early, so make sure a delimiter follows before accepting it
+            if isinstance(value, (int, float)) and not isinstance(value, bool) \
+                    and not _NUMBER_END.match(self.buf, end) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def read_object(fp, stream_key="data", on_item=None):
+    """Parses the JSON object in the text file fp. Elements of the array under stream_key are decoded
+    one at a time and passed through on_item (its return value is kept in place of the element).
+    Returns the object with stream_key mapped to the collected list."""
+    stream = _Stream(fp)
+    result = {}
+    stream.expect('{')
+    if stream.peek() == '}':
+        return result
+    while True:
+        key = stream.value()
+        stream.expect(':')
+        if key == stream_key and stream.peek() == '[':
+            stream.pos += 1
+            items = []
+            if stream.peek() == ']':
+                stream.pos += 1
+            else:
+                while True:
+                    item = stream.value()
+                    items.append(item if on_item is None else on_item(item))
+                    if stream.expect(',]') == ']':
+                        break
+            result[key] = items
+        else:
+            result[key] = stream.value()
+        if stream.expect(',}') == '}':
+            return result
+
+
+def load_catalog(path, on_item=None):
+    with open(path, 'r', encoding='utf-8') as f:
+        return read_object(f, on_item=on_item)
+
+
+def catalog_hash(groups):
+    """md5 of json.dumps(groups, sort_keys=True), computed group by group."""
+    hasher = hashlib.md5(b'[')
+    for i, group in enumerate(groups):
+        if i:
+            hasher.update(b', ')
+        hasher.update(json.dumps(group, sort_keys=True).encode())
+    hasher.update(b']')
+    return hasher.hexdigest()
+
+
+# ===== SNAPSHOTS =====
+def _intern_strings(obj):
+    if isinstance(obj, dict):
+        return {sys.intern(k) if isinstance(k, str) else k: _intern_strings(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_intern_strings(v) for v in obj]
+    if isinstance(obj, str) and len(obj) <= SNAPSHOT_INTERN_MAX:
+        return sys.intern(obj)
+    return obj
+
+
+def write_snapshot(path, result):
+    """Blocking: writes a scrape result as a snapshot (temp file + rename)."""
+    groups = _intern_strings(result.get('data') or [])
+    meta = marshal.dumps({k: v for k, v in result.items() if k != 'data'}, 4)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(_SNAPSHOT_HEADER.pack(marshal.version, len(meta)))
+        f.write(meta)
+        marshal.dump(groups, f, 4)
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path):
+    """Blocking: memory-maps a snapshot and returns the result dict. Raises ValueError for files that are
+    not snapshots or were written with another marshal version."""
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+        start = len(SNAPSHOT_MAGIC) + _SNAPSHOT_HEADER.size
+        if len(view) < start or view[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a catalog snapshot")
+        version, meta_len = _SNAPSHOT_HEADER.unpack_from(view, len(SNAPSHOT_MAGIC))
+        if version != marshal.version:
+            raise ValueError(f"{path} was written with marshal version {version}")
+        try:
+            with view[start:start + meta_len] as meta_view:
+                meta = marshal.loads(meta_view)
+            with view[start + meta_len:] as groups_view:
+                groups = marshal.loads(groups_view)
+        except (EOFError, TypeError) as e:
+            raise ValueError(f"{path} is truncated or corrupt: {e}")
+    return {"data": groups, **meta}
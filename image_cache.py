@@ -0,0 +1,386 @@
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = None
+
+# Shared naming for cached_images/ so the scraper's downloads and the /api/img proxy hit the
+# same files. Every size of one product image (".../abc-x450-1.webp", ".../abc-x_imgvariantsize-1.webp")
+# maps to the same master file "<md5 of canonical path>.<ext>", which holds the largest
+# rendition the scraper found. Sized images the proxy fetches on a miss are kept beside it as
+# "<hash>_<size>.<ext>" so they never replace a master.
+
+UPSTREAM_BASE = "https://rogersroofing.click"
+UPSTREAM_HOST = urlparse(UPSTREAM_BASE).netloc
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cached_images")
+MEMORY_CACHE_BYTES = int(os.getenv("IMAGE_MEMORY_CACHE_MB") or 64) * 1024 * 1024
+MEMORY_MAX_ITEM_BYTES = 2 * 1024 * 1024
+MIN_IMAGE_BYTES = 500
+MANIFEST_FILE = "manifest.json"
+CACHE_GC_GRACE_SECONDS = 15 * 60
+
+CONTENT_TYPES = {'webp': 'image/webp', 'png': 'image/png', 'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'gif': 'image/gif'}
+SIZE_PATTERN = re.compile(r'x(\d+)-')
+TEMPLATE_TOKEN = 'x_imgvariantsize-'
+CACHE_NAME_PATTERN = re.compile(r'^[a-f0-9]+(_\d+)?\.\w+$')
+
+# Resized renditions for ?w=, stored as "<hash>_w<width>.<format>" next to the master
+RENDITION_WIDTHS = (250, 450, 950)
+RENDITION_QUALITY = {'avif': 55, 'webp': 80, 'jpeg': 82}
+RENDITION_CONTENT_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+RENDITION_NAME_PATTERN = re.compile(r'^[a-f0-9]+_w\d+\.\w+$')
+
+
+def upstream_url(raw_path):
+    """Full upstream URL for a proxy ?u= value (absolute URL or site-relative path), or None for an
+    absolute URL on any other host, so the proxy cannot be pointed at arbitrary sites."""
+    if raw_path.startswith('http://') or raw_path.startswith('https://'):
+        parsed = urlparse(raw_path)
+        if parsed.netloc.lower() != UPSTREAM_HOST:
+            return None
+        # Rebuilt on UPSTREAM_BASE so the scheme and host are always the upstream's own
+        return UPSTREAM_BASE + (parsed.path or '/') + (f"?{parsed.query}" if parsed.query else '')
+    if not raw_path.startswith('/'):
+        raw_path = '/' + raw_path
+    return UPSTREAM_BASE + raw_path
+
+
+def canonical_path(url):
+    parsed = urlparse(url)
+    if parsed.netloc and parsed.netloc != UPSTREAM_HOST:
+        path = f"{parsed.netloc}{parsed.path}"
+    else:
+        path = parsed.path
+    path = re.sub(r'/{2,}', '/', path)
+    return SIZE_PATTERN.sub(TEMPLATE_TOKEN, path)
+
+
+def image_ext(url):
+    path = urlparse(url).path
+    if '.' in path:
+        ext = path.rsplit('.', 1)[-1].lower()
+        if ext in CONTENT_TYPES:
+            return ext
+    return 'webp'
+
+
+def requested_size(url):
+    match = SIZE_PATTERN.search(urlparse(url).path)
+    return int(match.group(1)) if match else None
+
+
+def cache_name(url):
+    """Master cache file name for any size of this image."""
+    url_hash = hashlib.md5(canonical_path(url).encode()).hexdigest()[:16]
+    return f"{url_hash}.{image_ext(url)}"
+
+
+def sized_cache_name(url):
+    size = requested_size(url)
+    name = cache_name(url)
+    if size is None:
+        return name
+    stem, ext = name.rsplit('.', 1)
+    return f"{stem}_{size}.{ext}"
+
+
+def candidate_names(url):
+    """Cache names to try for a proxied URL, best first."""
+    master = cache_name(url)
+    sized = sized_cache_name(url)
+    return [master] if sized == master else [master, sized]
+
+
+def content_type_for(name):
+    ext = name.rsplit('.', 1)[-1].lower()
+    return CONTENT_TYPES.get(ext) or RENDITION_CONTENT_TYPES.get(ext, 'image/webp')
+
+
+# ===== RENDITIONS =====
+def _supports(fmt):
+    try:
+        return bool(features.check(fmt))
+    except Exception:
+        return False
+
+
+RENDITION_FORMATS = [fmt for fmt in ('avif', 'webp') if Image is not None and _supports(fmt)] + ['jpeg']
+
+
+def rendition_width(requested):
+    """Smallest configured width covering the requested one, or None if it is not a number."""
+    try:
+        requested = int(requested)
+    except (TypeError, ValueError):
+        return None
+    if requested <= 0:
+        return None
+    for width in RENDITION_WIDTHS:
+        if width >= requested:
+            return width
+    return RENDITION_WIDTHS[-1]
+
+
+def negotiate_format(accept):
+    accept = (accept or '').lower()
+    for fmt in RENDITION_FORMATS[:-1]:
+        if f"image/{fmt}" in accept:
+            return fmt
+    return 'jpeg'
+
+
+def rendition_name(source_name, width, fmt):
+    stem = source_name.rsplit('.', 1)[0].split('_', 1)[0]
+    return f"{stem}_w{width}.{fmt}"
+
+
+def make_rendition(data, width, fmt):
+    """CPU-bound: downscales to at most `width` pixels wide and re-encodes as `fmt`."""
+    with Image.open(io.BytesIO(data)) as im:
+        im.draft('RGB', (width, width * 4))
+        if im.width > width:
+            im = im.resize((width, max(1, round(im.height * width / im.width))), Image.LANCZOS)
+        if fmt == 'jpeg':
+            if im.mode in ('RGBA', 'LA', 'P'):
+                im = im.convert('RGBA')
+                background = Image.new('RGB', im.size, (255, 255, 255))
+                background.paste(im, mask=im.getchannel('A'))
+                im = background
+            elif im.mode != 'RGB':
+                im = im.convert('RGB')
+        elif im.mode not in ('RGB', 'RGBA'):
+            im = im.convert('RGBA')
+        out = io.BytesIO()
+        if fmt == 'jpeg':
+            im.save(out, 'JPEG', quality=RENDITION_QUALITY[fmt], optimize=True, progressive=True)
+        else:
+            im.save(out, fmt.upper(), quality=RENDITION_QUALITY[fmt])
+    return out.getvalue()
+
+
+def build_rendition(name, data, content_type, width, fmt):
+    """Blocking: creates and caches a rendition. Keeps the source bytes when re-encoding does not make them smaller."""
+    try:
+        rendered = make_rendition(data, width, fmt)
+    except Exception as e:
+        print(f"⚠️ Could not resize image for {name}: {e}")
+        return data, content_type
+    if len(rendered) >= len(data) and content_type == RENDITION_CONTENT_TYPES.get(fmt):
+        rendered = data
+    store(name, rendered, RENDITION_CONTENT_TYPES[fmt], min_bytes=0)
+    return rendered, RENDITION_CONTENT_TYPES[fmt]
+
+
+# ===== MEMORY TIER =====
+class MemoryCache:
+    """Byte-bounded LRU of cache name -> (data, content_type)."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            item = self._items.get(name)
+            if item is not None:
+                self._items.move_to_end(name)
+            return item
+
+    def put(self, name, data, content_type):
+        if len(data) > MEMORY_MAX_ITEM_BYTES:
+            return
+        with self._lock:
+            old = self._items.pop(name, None)
+            if old is not None:
+                self.bytes -= len(old[0])
+            self._items[name] = (data, content_type)
+            self.bytes += len(data)
+            while self.bytes > self.max_bytes and self._items:
+                _, (evicted, _) = self._items.popitem(last=False)
+                self.bytes -= len(evicted)
+
+    def discard(self, name):
+        with self._lock:
+            old = self._items.pop(name, None)
+            if old is not None:
+                self.bytes -= len(old[0])
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._items)
+
+
+MEMORY = MemoryCache(MEMORY_CACHE_BYTES)
+
+
+# ===== STATS =====
+_stats_lock = threading.Lock()
+STATS = {
+    "memory_hits": 0, "disk_hits": 0, "upstream": 0, "coalesced": 0, "errors": 0,
+    "memory_bytes": 0, "disk_bytes": 0, "upstream_bytes": 0,
+    "upstream_seconds": 0.0, "upstream_max": 0.0,
+}
+
+
+def _record(tier, nbytes):
+    with _stats_lock:
+        STATS[f"{tier}_hits"] += 1
+        STATS[f"{tier}_bytes"] += nbytes
+
+
+def record_upstream(seconds, nbytes):
+    with _stats_lock:
+        STATS["upstream"] += 1
+        STATS["upstream_bytes"] += nbytes
+        STATS["upstream_seconds"] += seconds
+        STATS["upstream_max"] = max(STATS["upstream_max"], seconds)
+
+
+def record_coalesced():
+    with _stats_lock:
+        STATS["coalesced"] += 1
+
+
+def record_error():
+    with _stats_lock:
+        STATS["errors"] += 1
+
+
+def get_stats():
+    with _stats_lock:
+        stats = dict(STATS)
+    served = stats["memory_hits"] + stats["disk_hits"] + stats["upstream"] + stats["coalesced"]
+    stats["hit_ratio"] = (served - stats["upstream"]) / served if served else 0.0
+    stats["upstream_avg"] = stats["upstream_seconds"] / stats["upstream"] if stats["upstream"] else 0.0
+    stats["memory_items"] = len(MEMORY)
+    stats["memory_used"] = MEMORY.bytes
+    return stats
+
+
+# ===== LOOKUP / STORE =====
+def from_memory(name):
+    item = MEMORY.get(name)
+    if item is not None:
+        _record("memory", len(item[0]))
+    return item
+
+
+def from_disk(name):
+    """Blocking: reads cached_images/<name> and promotes it to the memory tier."""
+    path = os.path.join(CACHE_DIR, name)
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    content_type = content_type_for(name)
+    MEMORY.put(name, data, content_type)
+    _record("disk", len(data))
+    return data, content_type
+
+
+def store(name, data, content_type=None, min_bytes=MIN_IMAGE_BYTES):
+    """Blocking: writes a fetched image to disk (atomically) and the memory tier."""
+    if len(data) <= min_bytes:
+        return False
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, name)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    MEMORY.put(name, data, content_type or content_type_for(name))
+    return True
+
+
+# ===== SYNC MANIFEST =====
+# cache name -> {"template", "url", "size", "etag", "last_modified", "checked_at", "last_seen"},
+# written by the scraper so refreshes only download new or changed images.
+def load_manifest():
+    try:
+        with open(os.path.join(CACHE_DIR, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        return manifest if isinstance(manifest, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, MANIFEST_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def _stem(name):
+    return name.split('.', 1)[0].split('_', 1)[0]
+
+
+def _is_cache_entry(name):
+    """Masters, sized copies and renditions; not the manifest, foreign files or in-progress writes
+    (store()'s .tmp files, the scraper's .part downloads)."""
+    if name.endswith(('.tmp', '.part')):
+        return False
+    return bool(CACHE_NAME_PATTERN.match(name) or RENDITION_NAME_PATTERN.match(name))
+
+
+def drop_derived(name):
+    """Removes the memory copy, sized proxy copies and renditions of a master that was replaced."""
+    stem = _stem(name)
+    MEMORY.discard(name)
+    try:
+        entries = os.listdir(CACHE_DIR)
+    except OSError:
+        return
+    for entry in entries:
+        if entry != name and _stem(entry) == stem and _is_cache_entry(entry):
+            MEMORY.discard(entry)
+            try:
+                os.remove(os.path.join(CACHE_DIR, entry))
+            except OSError:
+                pass
+
+
+def collect_garbage(referenced_names, grace=CACHE_GC_GRACE_SECONDS):
+    """Deletes files (masters and everything derived from them) whose image is no longer in the catalog.
+    Files modified in the last `grace` seconds are kept: the proxy may have just cached them."""
+    keep = {_stem(name) for name in referenced_names}
+    removed = 0
+    freed = 0
+    try:
+        entries = os.listdir(CACHE_DIR)
+    except OSError:
+        return 0, 0
+    cutoff = time.time() - grace
+    for entry in entries:
+        if not _is_cache_entry(entry) or _stem(entry) in keep:
+            continue
+        path = os.path.join(CACHE_DIR, entry)
+        try:
+            st = os.stat(path)
+            if st.st_mtime > cutoff:
+                continue
+            os.remove(path)
+            freed += st.st_size
+            removed += 1
+        except OSError:
+            pass
+        MEMORY.discard(entry)
+    return removed, freed
@@ -1,12 +1,15 @@
 import asyncio
 import json
 import os
-import hashlib
-import base64
 import time
 import shutil
+import tempfile
+from contextlib import contextmanager
 from pyppeteer import launch
 import requests
+import httpx
+import image_cache
+import catalog_io
 
 try:
     from dotenv import load_dotenv
@@ -17,13 +20,61 @@ except ImportError:
 _stored_cookies = []
 _stored_user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
 
+# Login cookies are persisted here so later scrapes can fetch over plain HTTP without Chromium
+SESSION_FILE = os.getenv("SCRAPER_SESSION_FILE") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "scraper_session.json")
+SCRAPE_HTTP_TIMEOUT = 120
+
 def get_stored_cookies():
     return _stored_cookies, _stored_user_agent
 
+def load_session():
+    global _stored_cookies, _stored_user_agent
+    try:
+        with open(SESSION_FILE, "r", encoding="utf-8") as f:
+            session = json.load(f)
+    except (OSError, ValueError):
+        return False
+    now = time.time()
+    # Drop cookies whose expiry has passed; session cookies (expires -1) are kept and validated by use
+    cookies = [c for c in session.get('cookies', []) if not c.get('expires') or c['expires'] < 0 or c['expires'] > now]
+    if not cookies:
+        return False
+    _stored_cookies = cookies
+    _stored_user_agent = session.get('user_agent') or _stored_user_agent
+    return True
+
+def save_session():
+    tmp_path = f"{SESSION_FILE}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"cookies": _stored_cookies, "user_agent": _stored_user_agent, "saved_at": time.time()}, f)
+        os.replace(tmp_path, SESSION_FILE)
+    except Exception as e:
+        print(f"  Warning: Could not save session: {e}")
+
+def clear_session():
+    global _stored_cookies
+    _stored_cookies = []
+    try:
+        os.remove(SESSION_FILE)
+    except OSError:
+        pass
+
+# Browser flow timeouts (ms) and retry backoff (s); waits end as soon as their condition holds
+SCRAPER_NAV_TIMEOUT = int(os.getenv("SCRAPER_NAV_TIMEOUT") or 120000)
+SCRAPER_WAIT_TIMEOUT = int(os.getenv("SCRAPER_WAIT_TIMEOUT") or 10000)
+SCRAPER_LOGIN_TIMEOUT = int(os.getenv("SCRAPER_LOGIN_TIMEOUT") or 30000)
+SCRAPER_TYPE_DELAY = int(os.getenv("SCRAPER_TYPE_DELAY") or 0)
+SCRAPER_RETRY_BACKOFF = float(os.getenv("SCRAPER_RETRY_BACKOFF") or 1.0)
+
 IMAGE_PATH_PREFIX = "/uploads/products/"
 IMAGE_SIZE = 450
 IMAGE_SIZE_VARIANTS = [950, 750, 450, 400, 375, 325, 300, 250, 225, 178, 80]
 IMAGE_MIN_SIZE = 300  # Minimum acceptable image size to prevent tiny fallbacks
+IMAGE_DOWNLOAD_CONCURRENCY = int(os.getenv("IMAGE_DOWNLOAD_CONCURRENCY") or 16)
+IMAGE_DOWNLOAD_TIMEOUT = 30
+IMAGE_CHUNK_SIZE = 64 * 1024
+IMAGE_REVALIDATE_SECONDS = int(os.getenv("IMAGE_REVALIDATE_SECONDS") or 86400)  # Trust a cached image this long before a conditional re-check
 
 CATEGORIES = [
     "Accessories", "BYOB", "Carts", "Concentrates",
@@ -39,6 +90,80 @@ class RogersRoofingScraper:
         self.password = password
         self.api_key = api_key
         self.base_url = "https://rogersroofing.click"
+        self.timings = {}
+
+    @contextmanager
+    def _phase(self, name):
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0) + time.time() - started
+
+    def _print_timings(self):
+        total = sum(self.timings.values())
+        parts = ", ".join(f"{name} {secs:.1f}s" for name, secs in self.timings.items())
+        print(f"Scrape timings: {parts} (total {total:.1f}s)")
+
+    async def _first_success(self, awaitables, timeout_ms):
+        """True as soon as any awaitable finishes without raising; False if all fail or the timeout passes."""
+        loop = asyncio.get_event_loop()
+        pending = {asyncio.ensure_future(a) for a in awaitables}
+        deadline = loop.time() + timeout_ms / 1000
+        try:
+            while pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return False
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not task.cancelled() and task.exception() is None:
+                        return True
+            return False
+        finally:
+            for task in pending:
+                task.cancel()
+            # Let the cancelled waits run their own cleanup (pyppeteer removes its listeners then)
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _wait_ready(self, page, timeout_ms=None):
+        """Waits for the document to finish loading instead of sleeping a fixed time."""
+        try:
+            await page.waitForFunction('() => document.readyState === "complete"', {'timeout': timeout_ms or SCRAPER_WAIT_TIMEOUT})
+        except Exception:
+            pass
+
+    async def _goto(self, page, url, label):
+        for attempt in range(3):
+            try:
+                await page.goto(url, {'waitUntil': 'domcontentloaded', 'timeout': SCRAPER_NAV_TIMEOUT})
+                break
+            except Exception as e:
+                print(f"  {label} attempt {attempt+1} failed: {e}")
+                if attempt == 2:
+                    raise
+                await asyncio.sleep(SCRAPER_RETRY_BACKOFF * 2 ** attempt)
+        await self._wait_ready(page)
+
+    async def _click_and_settle(self, page, el, gone_check=True):
+        """Clicks el, then waits for a navigation or (for overlays) for el to disappear."""
+        conditions = [page.waitForNavigation({'waitUntil': 'networkidle2', 'timeout': SCRAPER_WAIT_TIMEOUT})]
+        if gone_check:
+            conditions.append(page.waitForFunction(
+                '(el) => !el.isConnected || el.offsetParent === null',
+                {'timeout': SCRAPER_WAIT_TIMEOUT}, el
+            ))
+        settled = asyncio.ensure_future(self._first_success(conditions, SCRAPER_WAIT_TIMEOUT))
+        try:
+            await page.evaluate('(el) => el.click()', el)
+        except Exception:
+            try:
+                await el.click()
+            except Exception:
+                settled.cancel()
+                return False
+        await settled
+        return True
 
     def _find_chromium(self):
         exec_path = os.getenv("PUPPETEER_EXECUTABLE_PATH")
@@ -85,14 +210,8 @@ class RogersRoofingScraper:
                     if any(neg in text_lower for neg in negative_words) and not any(pos in text_lower for pos in positive_words):
                         continue
                     if any(pos in text_lower for pos in positive_words):
-                        try:
-                            await page.evaluate('(el) => el.click()', el)
-                        except:
-                            try:
-                                await el.click()
-                            except:
-                                continue
-                        await asyncio.sleep(3)
+                        if not await self._click_and_settle(page, el):
+                            continue
                         return True
 
             for xpath in [
@@ -105,8 +224,7 @@ class RogersRoofingScraper:
                         text = await page.evaluate('(el) => (el.innerText || "").trim()', el)
                         if any(neg in text.lower() for neg in negative_words):
                             continue
-                        await page.evaluate('(el) => el.click()', el)
-                        await asyncio.sleep(3)
+                        await self._click_and_settle(page, el)
                         return True
                 except:
                     pass
@@ -121,23 +239,14 @@ class RogersRoofingScraper:
             return
 
         print("Navigating to login page...")
-        for attempt in range(3):
-            try:
-                await page.goto(f"{self.base_url}/login", {'waitUntil': 'domcontentloaded', 'timeout': 120000})
-                break
-            except Exception as e:
-                print(f"  Login nav attempt {attempt+1} failed: {e}")
-                if attempt == 2:
-                    raise
-                await asyncio.sleep(5)
-        await asyncio.sleep(3)
+        await self._goto(page, f"{self.base_url}/login", "Login nav")
 
         await self._handle_age_gate(page)
 
         try:
-            await page.waitForSelector("input[type='password']", {'timeout': 10000})
+            await page.waitForSelector("input[type='password']", {'visible': True, 'timeout': SCRAPER_WAIT_TIMEOUT})
         except:
-            await asyncio.sleep(2)
+            print("  Password field did not appear within timeout")
 
         email_filled = False
         for sel in ["input[name='email']", "input[type='email']", "input[name='username']", "input[type='text']"]:
@@ -146,8 +255,7 @@ class RogersRoofingScraper:
                 if el:
                     await page.evaluate('(el) => { el.value = ""; }', el)
                     await el.click()
-                    await asyncio.sleep(0.3)
-                    await page.type(sel, self.username, {'delay': 50})
+                    await page.type(sel, self.username, {'delay': SCRAPER_TYPE_DELAY})
                     email_filled = True
                     print(f"  Filled username using: {sel}")
                     break
@@ -161,45 +269,55 @@ class RogersRoofingScraper:
             pwd_el = await page.querySelector("input[type='password']")
             if pwd_el:
                 await pwd_el.click()
-                await asyncio.sleep(0.3)
-                await page.type("input[type='password']", self.password, {'delay': 50})
+                await page.type("input[type='password']", self.password, {'delay': SCRAPER_TYPE_DELAY})
         except Exception as e:
             print(f"Password fill error: {e}")
 
-        await asyncio.sleep(1)
-
-        login_submitted = False
-        for sel in ["button[type='submit']", "input[type='submit']", "button.login-btn", "button.btn-primary"]:
-            try:
-                btn = await page.querySelector(sel)
-                if btn:
-                    await btn.click()
-                    login_submitted = True
-                    break
-            except:
-                pass
-
-        if not login_submitted:
-            try:
-                btns = await page.querySelectorAll("button")
-                for btn in btns:
-                    text = await page.evaluate('(el) => el.innerText || ""', btn)
-                    if any(w in text.lower() for w in ['log in', 'login', 'sign in', 'submit']):
+        # Start listening before submitting so a fast redirect is not missed; SPA logins may
+        # only change the URL, so leaving /login also counts
+        navigation = asyncio.ensure_future(page.waitForNavigation({'waitUntil': 'networkidle2', 'timeout': SCRAPER_LOGIN_TIMEOUT}))
+        left_login = page.waitForFunction('() => !location.pathname.toLowerCase().includes("login")', {'timeout': SCRAPER_LOGIN_TIMEOUT})
+        logged_in = asyncio.ensure_future(self._first_success([navigation, left_login], SCRAPER_LOGIN_TIMEOUT))
+        try:
+            login_submitted = False
+            for sel in ["button[type='submit']", "input[type='submit']", "button.login-btn", "button.btn-primary"]:
+                try:
+                    btn = await page.querySelector(sel)
+                    if btn:
                         await btn.click()
                         login_submitted = True
                         break
-            except:
-                pass
+                except:
+                    pass
 
-        if not login_submitted:
-            await page.keyboard.press('Enter')
+            if not login_submitted:
+                try:
+                    btns = await page.querySelectorAll("button")
+                    for btn in btns:
+                        text = await page.evaluate('(el) => el.innerText || ""', btn)
+                        if any(w in text.lower() for w in ['log in', 'login', 'sign in', 'submit']):
+                            await btn.click()
+                            login_submitted = True
+                            break
+                except:
+                    pass
 
-        try:
-            await page.waitForNavigation({'waitUntil': 'networkidle2', 'timeout': 30000})
-        except:
-            pass
+            if not login_submitted:
+                await page.keyboard.press('Enter')
 
-        await asyncio.sleep(2)
+            await logged_in
+        finally:
+            # If submitting raised, nothing is left waiting: the navigation watcher drops its
+            # listeners and the URL poll is unregistered from the frame instead of running to its timeout
+            logged_in.cancel()
+            navigation.cancel()
+            await asyncio.gather(logged_in, navigation, return_exceptions=True)
+            try:
+                left_login.terminate(asyncio.CancelledError())
+            except KeyError:
+                pass  # it finished (or timed out) and already unregistered itself
+
+        await self._wait_ready(page)
         current_url = page.url
         if 'login' not in current_url.lower():
             print("Login successful.")
@@ -210,6 +328,7 @@ class RogersRoofingScraper:
                 if ua:
                     _stored_user_agent = ua
                 print(f"  Stored {len(_stored_cookies)} cookies for image proxy")
+                save_session()
             except Exception as ce:
                 print(f"  Warning: Could not extract cookies: {ce}")
         else:
@@ -239,13 +358,13 @@ class RogersRoofingScraper:
 
                 if not json_text:
                     print(f"  Attempt {attempt+1}: Empty response")
-                    await asyncio.sleep(3)
+                    await asyncio.sleep(SCRAPER_RETRY_BACKOFF * 2 ** attempt)
                     continue
 
                 data = json.loads(json_text)
                 if isinstance(data, dict) and data.get('_error'):
                     print(f"  Attempt {attempt+1}: API error: {data['_error']}")
-                    await asyncio.sleep(3)
+                    await asyncio.sleep(SCRAPER_RETRY_BACKOFF * 2 ** attempt)
                     continue
 
                 if isinstance(data, dict) and isinstance(data.get('data'), list):
@@ -253,14 +372,122 @@ class RogersRoofingScraper:
                     return data
 
                 print(f"  Attempt {attempt+1}: Unexpected format, keys: {list(data.keys()) if isinstance(data, dict) else type(data)}")
-                await asyncio.sleep(3)
+                await asyncio.sleep(SCRAPER_RETRY_BACKOFF * 2 ** attempt)
 
             except Exception as e:
                 print(f"  Attempt {attempt+1} error: {e}")
-                await asyncio.sleep(3)
+                await asyncio.sleep(SCRAPER_RETRY_BACKOFF * 2 ** attempt)
+
+        return None
 
+    async def _fetch_scrape_http(self):
+        """Fetches the scrape endpoint with the saved session, without a browser. None if the session is not accepted."""
+        cookies, _ = get_stored_cookies()
+        if not cookies and not self.api_key:
+            return None
+
+        url = f"{self.base_url}/api/products/scrape"
+        print(f"Fetching scrape endpoint over HTTP with saved session: {url}")
+        headers = {}
+        if self.api_key:
+            headers['X-Api-Key'] = self.api_key
+        # The response is spooled to disk and parsed group by group instead of being held as one string
+        fd, spool_path = tempfile.mkstemp(prefix="scrape_payload_", suffix=".json")
+        try:
+            with os.fdopen(fd, 'wb') as spool:
+                async with self._session_client('application/json', timeout=SCRAPE_HTTP_TIMEOUT, follow_redirects=False) as client:
+                    async with client.stream('GET', url, headers=headers) as resp:
+                        location = resp.headers.get('Location', '')
+                        if resp.status_code in (401, 403) or 'login' in location.lower():
+                            print(f"  Saved session rejected (HTTP {resp.status_code} {location})")
+                            clear_session()
+                            return None
+                        if resp.status_code != 200:
+                            print(f"  HTTP fetch failed: HTTP {resp.status_code}")
+                            return None
+                        async for chunk in resp.aiter_bytes():
+                            spool.write(chunk)
+            data = catalog_io.load_catalog(spool_path)
+        except Exception as e:
+            print(f"  HTTP fetch failed: {e}")
+            return None
+        finally:
+            try:
+                os.remove(spool_path)
+            except OSError:
+                pass
+
+        if isinstance(data, dict) and isinstance(data.get('data'), list):
+            print(f"  Success: {len(data['data'])} product groups")
+            return data
+        print(f"  Unexpected format over HTTP, keys: {list(data.keys()) if isinstance(data, dict) else type(data)}")
         return None
 
+    async def _fetch_scrape_browser(self):
+        """Full browser flow: launch Chromium, clear the age gate, log in (saving the session) and fetch."""
+        browser = None
+        try:
+            exec_path = self._find_chromium()
+            if not exec_path:
+                print("ERROR: No chromium binary found.")
+                return None
+
+            print(f"Using browser: {exec_path}")
+            launch_started = time.time()
+            browser = await launch(
+                headless=True,
+                executablePath=exec_path,
+                args=[
+                    '--no-sandbox', '--disable-setuid-sandbox',
+                    '--disable-dev-shm-usage', '--disable-gpu',
+                    '--disable-extensions', '--no-first-run',
+                    '--disable-background-networking', '--disable-default-apps',
+                    '--disable-sync', '--disable-translate',
+                    '--hide-scrollbars', '--mute-audio',
+                ],
+                autoClose=False,
+                handleSIGINT=False, handleSIGTERM=False, handleSIGHUP=False,
+                dumpio=False,
+            )
+            page = await browser.newPage()
+            self.timings["launch"] = time.time() - launch_started
+            await page.setUserAgent(
+                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                "AppleWebKit/537.36 (KHTML, like Gecko) "
+                "Chrome/120.0.0.0 Safari/537.36"
+            )
+            await page.setViewport({'width': 1280, 'height': 800})
+
+            print("Navigating to site...")
+            with self._phase("navigate"):
+                await self._goto(page, self.base_url, "Nav")
+
+            content = await page.content()
+            if "performing updates" in content.lower() or "maintenance" in content.lower():
+                raise Exception("Site Under Maintenance")
+
+            print("Checking age verification...")
+            with self._phase("age_gate"):
+                age_handled = await self._handle_age_gate(page)
+            if age_handled:
+                print("Age verification completed.")
+
+            with self._phase("login"):
+                await self._login(page)
+
+            # Login saved the session, so the catalog can be streamed over HTTP; in-page fetch is the fallback
+            with self._phase("fetch"):
+                data = await self._fetch_scrape_http()
+                if data is None:
+                    data = await self._fetch_scrape_endpoint(page)
+                return data
+        finally:
+            if browser:
+                try:
+                    await browser.close()
+                except:
+                    pass
+
     def _resolve_image_url(self, img_val, img_prefix, size=None):
         """Resolve a single image URL, optionally with a specific size"""
         if not isinstance(img_val, str) or not img_val:
@@ -287,23 +514,101 @@ class RogersRoofingScraper:
                     variants.append(url)
         return variants
 
-    async def _download_images(self, page, groups, img_prefix):
-        img_cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cached_images")
+    def _session_client(self, accept, **kwargs):
+        """httpx client carrying the cookies and user agent captured at login."""
+        cookies, user_agent = get_stored_cookies()
+        jar = httpx.Cookies()
+        for c in cookies:
+            try:
+                jar.set(c['name'], c['value'], domain=c.get('domain', ''), path=c.get('path', '/'))
+            except Exception:
+                pass
+        return httpx.AsyncClient(
+            cookies=jar,
+            headers={
+                'User-Agent': user_agent,
+                'Referer': f"{self.base_url}/",
+                'Accept': accept,
+            },
+            **{'follow_redirects': True, **kwargs},
+        )
+
+    def _image_client(self):
+        """Pooled keep-alive client for image downloads."""
+        return self._session_client(
+            'image/webp,image/apng,image/*,*/*;q=0.8',
+            timeout=IMAGE_DOWNLOAD_TIMEOUT,
+            limits=httpx.Limits(max_connections=IMAGE_DOWNLOAD_CONCURRENCY, max_keepalive_connections=IMAGE_DOWNLOAD_CONCURRENCY),
+        )
+
+    async def _fetch_to_file(self, client, url, path, headers):
+        """Streams url to path. Returns "not_modified", a manifest entry for the new file, or None."""
+        tmp_path = f"{path}.part"
+        try:
+            async with client.stream('GET', url, headers=headers) as resp:
+                if resp.status_code == 304:
+                    return "not_modified"
+                if resp.status_code != 200:
+                    return None
+                size = 0
+                with open(tmp_path, 'wb') as f:
+                    async for chunk in resp.aiter_bytes(IMAGE_CHUNK_SIZE):
+                        f.write(chunk)
+                        size += len(chunk)
+                if size <= image_cache.MIN_IMAGE_BYTES:
+                    return None
+                os.replace(tmp_path, path)
+                now = time.time()
+                return {
+                    "url": url,
+                    "size": size,
+                    "etag": resp.headers.get('ETag'),
+                    "last_modified": resp.headers.get('Last-Modified'),
+                    "checked_at": now,
+                }
+        except Exception:
+            return None
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    async def _sync_image(self, client, semaphore, variants, cache_fname, entry):
+        """Brings cached_images/<cache_fname> up to date.
+
+        Returns (status, entry) where status is "fresh" (checked recently, no request),
+        "unchanged" (304), "downloaded" or "failed" (an existing file is kept).
+        """
+        path = os.path.join(image_cache.CACHE_DIR, cache_fname)
+        have_file = bool(entry) and os.path.exists(path)
+        if have_file and time.time() - entry.get('checked_at', 0) < IMAGE_REVALIDATE_SECONDS:
+            return "fresh", entry
+
+        async with semaphore:
+            if have_file and entry.get('url') in variants:
+                headers = {}
+                if entry.get('etag'):
+                    headers['If-None-Match'] = entry['etag']
+                if entry.get('last_modified'):
+                    headers['If-Modified-Since'] = entry['last_modified']
+                result = await self._fetch_to_file(client, entry['url'], path, headers)
+                if result == "not_modified":
+                    entry['checked_at'] = time.time()
+                    return "unchanged", entry
+                if result:
+                    return "downloaded", result
+
+            for url in variants:
+                result = await self._fetch_to_file(client, url, path, {})
+                if isinstance(result, dict):
+                    return "downloaded", result
+
+        return "failed", entry if have_file else None
+
+    async def _download_images(self, groups, img_prefix):
+        img_cache_dir = image_cache.CACHE_DIR
         os.makedirs(img_cache_dir, exist_ok=True)
         
-        # Clear cached images to ensure we get fresh, highest-quality versions
-        print(f"\n--- CLEARING IMAGE CACHE ---")
-        cleared_count = 0
-        if os.path.exists(img_cache_dir):
-            for f in os.listdir(img_cache_dir):
-                try:
-                    os.remove(os.path.join(img_cache_dir, f))
-                    cleared_count += 1
-                except Exception as e:
-                    pass
-        print(f"  Cleared {cleared_count} old cached images")
-        
-        print(f"\n--- DOWNLOADING IMAGES ---")
+        print(f"\n--- SYNCING IMAGES ---")
 
         # Build URL variant mapping (template -> list of variants from largest to smallest)
         url_variants_map = {}
@@ -326,111 +631,59 @@ class RogersRoofingScraper:
                         if variants:
                             url_variants_map[img_val] = variants
 
-        # Build cache mapping using template key
+        # Build cache mapping using the shared image_cache key, so all sizes of the same image
+        # use the same cache file and the /api/img proxy finds it
         url_map = {}
         for img_template, variants in url_variants_map.items():
             if variants:
-                ext = 'webp'
-                if '.' in img_template:
-                    raw_ext = img_template.rsplit('.', 1)[-1].lower()
-                    if raw_ext in ('webp', 'png', 'jpg', 'jpeg', 'gif'):
-                        ext = raw_ext
-                # Use template as cache key so all sizes of same image use same cache file
-                url_hash = hashlib.md5(img_template.encode()).hexdigest()[:16]
-                cache_fname = f"{url_hash}.{ext}"
+                cache_fname = image_cache.cache_name(variants[0])
+                ext = image_cache.image_ext(variants[0])
                 url_map[img_template] = (variants, cache_fname, ext)
 
         print(f"  Unique images: {len(url_map)}")
 
-        if url_map and page:
-            batch_size = 50
-            items = list(url_map.items())
-            downloaded = 0
-            failed = 0
-            total = len(items)
+        if url_map:
+            manifest = image_cache.load_manifest()
+            new_manifest = {}
+            counts = {"fresh": 0, "unchanged": 0, "downloaded": 0, "failed": 0}
+            total = len(url_map)
             start_time = time.time()
-            
-            for i in range(0, total, batch_size):
-                batch = items[i:i + batch_size]
-                # Prepare variants list for JS (map of template -> variants list)
-                variants_for_js = {template: variants for template, (variants, _, _) in batch}
-                
-                results = {}
-                for attempt in range(2):
-                    try:
-                        results = await page.evaluate('''async (variantsMap) => {
-                            const out = {};
-                            const CONCURRENCY = 10;
-                            const templates = Object.keys(variantsMap);
-                            
-                            for (let ti = 0; ti < templates.length; ti += CONCURRENCY) {
-                                const templateChunk = templates.slice(ti, ti + CONCURRENCY);
-                                await Promise.allSettled(templateChunk.map(async (template) => {
-                                    const variants = variantsMap[template];
-                                    // Try each variant from largest to smallest
-                                    for (const url of variants) {
-                                        try {
-                                            const r = await fetch(url, {credentials: 'include'});
-                                            if (r.ok) {
-                                                const blob = await r.blob();
-                                                const reader = new FileReader();
-                                                const b64 = await new Promise((resolve, reject) => {
-                                                    reader.onload = () => resolve(reader.result);
-                                                    reader.onerror = reject;
-                                                    reader.readAsDataURL(blob);
-                                                });
-                                                out[template] = {data: b64, url: url};
-                                                return; // Success, stop trying variants
-                                            }
-                                        } catch(e) {
-                                            // Try next variant
-                                        }
-                                    }
-                                    // All variants failed
-                                    out[template] = {error: 'All variants failed'};
-                                }));
-                            }
-                            return out;
-                        }''', variants_for_js)
-                        break
-                    except Exception as batch_err:
-                        if attempt == 0:
-                            print(f"  Batch retry after error: {batch_err}")
-                            await asyncio.sleep(1)
-                        else:
-                            print(f"  Batch failed: {batch_err}")
-                            results = {}
-
-                for img_template, (variants, cache_fname, ext) in batch:
-                    result = results.get(img_template, {})
-                    b64_data = result.get('data') if isinstance(result, dict) else None
-                    if b64_data and ',' in b64_data:
-                        raw_bytes = base64.b64decode(b64_data.split(',', 1)[1])
-                        if len(raw_bytes) > 500:
-                            with open(os.path.join(img_cache_dir, cache_fname), 'wb') as imgf:
-                                imgf.write(raw_bytes)
-                            downloaded += 1
-                            used_url = result.get('url', 'unknown')
-                            # Extract size from URL if possible and log to console
-                            size_match = used_url.split('x')
-                            size_str = size_match[1].split('/')[0] if len(size_match) > 1 else '?'
-                            if size_str != '?':
-                                print(f"    ✓ {cache_fname[:8]}... (x{size_str})")
-                        else:
-                            failed += 1
-                    else:
-                        failed += 1
-                
-                processed = min(i + batch_size, total)
-                elapsed = time.time() - start_time
-                rate = processed / elapsed if elapsed > 0 else 0
-                remaining = (total - processed) / rate if rate > 0 else 0
-                print(f"  Progress: {processed}/{total} ({downloaded} ok, {failed} fail) ~{remaining:.0f}s remaining")
-                await asyncio.sleep(0.05)
-            
-            print(f"  Downloaded: {downloaded}, Failed: {failed}, Time: {time.time() - start_time:.1f}s")
+            semaphore = asyncio.Semaphore(IMAGE_DOWNLOAD_CONCURRENCY)
+
+            async def sync(img_template, variants, cache_fname):
+                status, entry = await self._sync_image(client, semaphore, variants, cache_fname, manifest.get(cache_fname))
+                return img_template, cache_fname, status, entry
+
+            async with self._image_client() as client:
+                tasks = [sync(t, variants, cache_fname) for t, (variants, cache_fname, _) in url_map.items()]
+                for processed, task in enumerate(asyncio.as_completed(tasks), 1):
+                    img_template, cache_fname, status, entry = await task
+                    counts[status] += 1
+                    if entry:
+                        entry['template'] = img_template
+                        entry['last_seen'] = start_time
+                        new_manifest[cache_fname] = entry
+                    if status == "downloaded":
+                        # A replaced master invalidates its renditions and the proxy's sized copies
+                        if cache_fname in manifest:
+                            image_cache.drop_derived(cache_fname)
+                        size_match = image_cache.requested_size(entry['url'])
+                        if size_match:
+                            print(f"    ✓ {cache_fname[:8]}... (x{size_match})")
+
+                    if processed % 500 == 0 or processed == total:
+                        elapsed = time.time() - start_time
+                        rate = processed / elapsed if elapsed > 0 else 0
+                        remaining = (total - processed) / rate if rate > 0 else 0
+                        print(f"  Progress: {processed}/{total} ({counts['downloaded']} downloaded, {counts['unchanged'] + counts['fresh']} unchanged, {counts['failed']} fail) ~{remaining:.0f}s remaining")
+
+            image_cache.save_manifest(new_manifest)
+            removed, freed = image_cache.collect_garbage([cache_fname for _, cache_fname, _ in url_map.values()])
+            print(f"  Downloaded: {counts['downloaded']}, Unchanged: {counts['unchanged']} (304) + {counts['fresh']} (recently checked), "
+                  f"Failed: {counts['failed']}, Time: {time.time() - start_time:.1f}s")
+            print(f"  Removed {removed} unreferenced files ({freed // 1024}KB)")
         else:
-            print("  No images to download")
+            print("  No images to sync")
 
         cached_count = len(os.listdir(img_cache_dir)) if os.path.exists(img_cache_dir) else 0
         print(f"  Total cached images on disk: {cached_count}")
@@ -441,71 +694,35 @@ class RogersRoofingScraper:
             result_map[img_template] = (variants[0], cache_fname)  # Use largest variant as reference
         return result_map
 
-    async def _scrape_async(self):
+    async def _scrape_async(self, known_last_updated=None, known_catalog_hash=None):
         print("=" * 60)
         print("Starting Rogers Roofing scraper (scrape endpoint)")
         print("=" * 60)
 
-        browser = None
-
+        self.timings = {}
         try:
-            exec_path = self._find_chromium()
-            if not exec_path:
-                print("ERROR: No chromium binary found.")
-                return {"data": []}
-
-            print(f"Using browser: {exec_path}")
-            browser = await launch(
-                headless=True,
-                executablePath=exec_path,
-                args=[
-                    '--no-sandbox', '--disable-setuid-sandbox',
-                    '--disable-dev-shm-usage', '--disable-gpu',
-                    '--disable-extensions', '--no-first-run',
-                    '--disable-background-networking', '--disable-default-apps',
-                    '--disable-sync', '--disable-translate',
-                    '--hide-scrollbars', '--mute-audio',
-                ],
-                autoClose=False,
-                handleSIGINT=False, handleSIGTERM=False, handleSIGHUP=False,
-                dumpio=False,
-            )
-            page = await browser.newPage()
-            await page.setUserAgent(
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/120.0.0.0 Safari/537.36"
-            )
-            await page.setViewport({'width': 1280, 'height': 800})
-
-            print("Navigating to site...")
-            for attempt in range(3):
-                try:
-                    await page.goto(self.base_url, {'waitUntil': 'domcontentloaded', 'timeout': 120000})
-                    break
-                except Exception as e:
-                    print(f"  Nav attempt {attempt+1} failed: {e}")
-                    if attempt == 2:
-                        raise
-                    await asyncio.sleep(5)
-            await asyncio.sleep(3)
-
-            content = await page.content()
-            if "performing updates" in content.lower() or "maintenance" in content.lower():
-                raise Exception("Site Under Maintenance")
-
-            print("Checking age verification...")
-            age_handled = await self._handle_age_gate(page)
-            if age_handled:
-                print("Age verification completed.")
-
-            await self._login(page)
-
-            scrape_data = await self._fetch_scrape_endpoint(page)
+            load_session()
+            with self._phase("http_fetch"):
+                scrape_data = await self._fetch_scrape_http()
+            if scrape_data is None:
+                print("Falling back to browser login...")
+                scrape_data = await self._fetch_scrape_browser()
             if not scrape_data or not isinstance(scrape_data.get('data'), list):
                 print("ERROR: Failed to fetch scrape endpoint")
                 return {"data": []}
 
+            # Compared as text: from the bot's subprocess the known value arrives as a command-line string,
+            # while upstream may send epoch seconds/ms as numbers
+            if known_last_updated and str(scrape_data.get('lastUpdated')) == str(known_last_updated):
+                print(f"Upstream lastUpdated unchanged ({known_last_updated}) - skipping processing")
+                return {
+                    "data": [],
+                    "unchanged": True,
+                    "lastUpdated": scrape_data.get('lastUpdated'),
+                    "nextUpdate": scrape_data.get('nextUpdate'),
+                }
+
+            process_started = time.time()
             all_groups = scrape_data['data']
             img_prefix = scrape_data.get('imagePathPrefix', IMAGE_PATH_PREFIX)
             if not img_prefix.startswith('/'):
@@ -570,13 +787,14 @@ class RogersRoofingScraper:
                                 normalized_count += 1
             print(f"  Normalized {normalized_count} group images to use variant template")
 
-            await self._download_images(page, all_groups, img_prefix)
+            catalog_hash = catalog_io.catalog_hash(all_groups)
+            self.timings["process"] = time.time() - process_started
 
-            try:
-                await browser.close()
-                browser = None
-            except:
-                pass
+            if known_catalog_hash and catalog_hash == known_catalog_hash:
+                print(f"\nCatalog hash unchanged ({catalog_hash[:12]}) - skipping image phase")
+            else:
+                with self._phase("images"):
+                    await self._download_images(all_groups, img_prefix)
 
             return {
                 "data": all_groups,
@@ -584,6 +802,7 @@ class RogersRoofingScraper:
                 "imageSizeVariants": scrape_data.get('imageSizeVariants', IMAGE_SIZE_VARIANTS),
                 "lastUpdated": scrape_data.get('lastUpdated'),
                 "nextUpdate": scrape_data.get('nextUpdate'),
+                "catalogHash": catalog_hash,
             }
 
         except Exception as e:
@@ -591,20 +810,18 @@ class RogersRoofingScraper:
             import traceback
             traceback.print_exc()
         finally:
-            if browser:
-                try:
-                    await browser.close()
-                except:
-                    pass
+            self._print_timings()
 
         return {"data": [], "imagePathPrefix": IMAGE_PATH_PREFIX}
 
-    def get_products(self):
+    def get_products(self, known_last_updated=None, known_catalog_hash=None):
+        """Runs a full scrape. With the lastUpdated / catalogHash of the previous result it returns
+        {"unchanged": True, ...} early or skips the image phase when upstream has not changed."""
         loop = None
         try:
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
-            return loop.run_until_complete(self._scrape_async())
+            return loop.run_until_complete(self._scrape_async(known_last_updated, known_catalog_hash))
         except Exception as e:
             print(f"Scraper Wrapper Error: {e}")
             import traceback
@@ -619,14 +836,29 @@ class RogersRoofingScraper:
 
 
 if __name__ == "__main__":
-    print("Running local scraper test...")
+    import argparse
+    parser = argparse.ArgumentParser(description="Scrape the Rogers Roofing catalog.")
+    parser.add_argument("--output", help="write the result here as a catalog snapshot (used by the bot's scraper subprocess)")
+    parser.add_argument("--known-last-updated")
+    parser.add_argument("--known-catalog-hash")
+    args = parser.parse_args()
+
     scraper = RogersRoofingScraper(
         username=os.getenv("CHADS_USERNAME"),
-        password=os.getenv("CHADS_PASSWORD")
+        password=os.getenv("CHADS_PASSWORD"),
+        api_key=os.getenv("CHADS_API_KEY")
     )
-    result = scraper.get_products()
-    count = len(result.get('data', []))
-    print(f"Test Complete! Found {count} products.")
-    with open("scraped_products_test.json", "w", encoding="utf-8") as f:
-        json.dump(result, f, indent=2)
-    print("Saved results to scraped_products_test.json")
\ No newline at end of file
+    if args.output:
+        result = scraper.get_products(
+            known_last_updated=args.known_last_updated,
+            known_catalog_hash=args.known_catalog_hash,
+        )
+        catalog_io.write_snapshot(args.output, result)
+    else:
+        print("Running local scraper test...")
+        result = scraper.get_products()
+        count = len(result.get('data', []))
+        print(f"Test Complete! Found {count} products.")
+        with open("scraped_products_test.json", "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print("Saved results to scraped_products_test.json")
@@ -0,0 +1,50 @@
+import os
+import socket
+import sys
+import tempfile
+import textwrap
+
+import pytest
+
+# Tests import the bot modules straight from the repository root, with the database in a scratch directory
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DB_FILE", os.path.join(tempfile.mkdtemp(prefix="bot-tests-"), "bot_database.db"))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def stand_in_scraper(tmp_path):
+    """Path of a scraper script that writes `result` as its snapshot, like scraper.py --output does."""
+    def make(result):
+        script = tmp_path / "stand_in_scraper.py"
+        script.write_text(textwrap.dedent(f"""
+            import sys
+            sys.path.insert(0, {ROOT!r})
+            import catalog_io
+            catalog_io.write_snapshot(sys.argv[sys.argv.index("--output") + 1], {result!r})
+        """))
+        return str(script)
+    return make
+
+
+@pytest.fixture
+def catalog_index(monkeypatch):
+    """Builds the query/search indexes from raw group dicts (keys g0, g1, ...) with `hidden` variant ids."""
+    import bot
+    import catalog
+
+    monkeypatch.setattr(bot, "CATALOG_INDEX", dict(bot.CATALOG_INDEX))
+    monkeypatch.setattr(bot, "QUERY_CACHE", type(bot.QUERY_CACHE)())
+    monkeypatch.setitem(bot.PRODUCT_CACHE, "data", {"imagePathPrefix": "/uploads/products/"})
+
+    def build(groups, hidden=()):
+        monkeypatch.setitem(bot.global_config, "webapp_settings", {"h": list(hidden), "r": {}})
+        bot.build_catalog_index(1, [f"g{i}" for i in range(len(groups))], catalog.build_catalog(groups))
+        return bot.CATALOG_INDEX
+    return build
@@ -0,0 +1,148 @@
+import asyncio
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import catalog
+import catalog_io
+import scraper
+
+RESULT = {
+    "lastUpdated": 1760000000,
+    "data": [
+        {"name": "Cloud [Max] {v2}", "brand": "Cloud Co", "cat": "Pods", "tags": ["new"], "imgs": {"1": "x_imgvariantsize-a.jpg"},
+         "products": [{"id": 1, "name": "Mint \"Ice\"", "price": 12.5e3, "qty": 3, "tiers": [{"price": 11.25, "qty": "5+"}]},
+                      {"id": 2, "name": "Grape \\u00e9", "price": -0.5, "qty": 0, "tags": [], "images": []}]},
+        {"name": "Bare", "brand": "Cloud Co", "products": [], "extra": None, "flag": True},
+    ] * 40,
+    "imagePathPrefix": "/uploads/products/",
+}
+
+
+@pytest.mark.parametrize("chunk", [1, 7, 64 * 1024])
+def test_streaming_parse_matches_json_loads_at_any_chunk_size(monkeypatch, chunk):
+    monkeypatch.setattr(catalog_io, "CHUNK_CHARS", chunk)
+    text = json.dumps(RESULT, indent=2)
+
+    assert catalog_io.read_object(io.StringIO(text)) == json.loads(text)
+
+
+def test_groups_are_passed_through_on_item_one_at_a_time():
+    seen = []
+
+    def on_item(group):
+        seen.append(group["name"])
+        return catalog.Group(group)
+
+    result = catalog_io.read_object(io.StringIO(json.dumps(RESULT)), on_item=on_item)
+
+    assert len(seen) == len(RESULT["data"])
+    assert all(isinstance(g, catalog.Group) for g in result["data"])
+    assert result["lastUpdated"] == RESULT["lastUpdated"] and result["imagePathPrefix"] == RESULT["imagePathPrefix"]
+
+
+@pytest.mark.parametrize("text", ['{}', '{"data": []}', '{"data": [], "x": [1, 2]}', ' { "x" : {"data": [1]} , "data" : [ ] } '])
+def test_edge_shapes(text):
+    assert catalog_io.read_object(io.StringIO(text)) == json.loads(text)
+
+
+@pytest.mark.parametrize("text", ['', '[]', '{"data": [1, 2}', '{"data": [1] "x": 2}'])
+def test_malformed_input_raises_value_error(text):
+    with pytest.raises(ValueError):
+        catalog_io.read_object(io.StringIO(text))
+
+
+def test_catalog_hash_matches_hashing_the_whole_dump():
+    expected = hashlib.md5(json.dumps(RESULT["data"], sort_keys=True).encode()).hexdigest()
+
+    assert catalog_io.catalog_hash(RESULT["data"]) == expected
+    assert catalog_io.catalog_hash([]) == hashlib.md5(b"[]").hexdigest()
+
+
+def test_snapshot_round_trips_with_shared_strings(tmp_path):
+    path = str(tmp_path / "products.snapshot")
+    catalog_io.write_snapshot(path, RESULT)
+
+    loaded = catalog_io.load_snapshot(path)
+
+    assert loaded == RESULT
+    brands = [g["brand"] for g in loaded["data"]]
+    assert all(b is brands[0] for b in brands)
+    assert brands[0] is sys.intern("Cloud Co")
+
+
+def test_broken_snapshots_raise_value_error(tmp_path):
+    path = tmp_path / "products.snapshot"
+    catalog_io.write_snapshot(str(path), RESULT)
+    path.write_bytes(path.read_bytes()[:-20])
+    with pytest.raises(ValueError):
+        catalog_io.load_snapshot(str(path))
+
+    path.write_text(json.dumps(RESULT))
+    with pytest.raises(ValueError):
+        catalog_io.load_snapshot(str(path))
+
+
+def test_records_serialize_byte_for_byte_like_the_dicts():
+    groups = catalog.build_catalog(RESULT["data"])
+
+    assert json.dumps(groups, default=catalog.to_json) == json.dumps(RESULT["data"])
+    assert groups[0].get("brand") == "Cloud Co" and groups[0].get("missing", 1) == 1
+    assert groups[0].products[0].tiers == ((11.25, "5+"),)
+    assert groups[0].brand is groups[2].brand
+
+
+class _ScrapeEndpoint(BaseHTTPRequestHandler):
+    """Stand-in scrape endpoint: RESULT in small chunks for the "session=ok" cookie, a login redirect otherwise."""
+    def do_GET(self):
+        if "session=ok" not in (self.headers.get("Cookie") or ""):
+            self.send_response(302)
+            self.send_header("Location", "/login")
+            self.end_headers()
+            return
+        body = json.dumps(RESULT).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        for i in range(0, len(body), 1000):
+            self.wfile.write(body[i:i + 1000])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def endpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(scraper, "SESSION_FILE", str(tmp_path / "scraper_session.json"))
+    monkeypatch.setattr(scraper, "_stored_cookies", [{"name": "session", "value": "ok", "domain": "127.0.0.1", "path": "/"}])
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path / "spool"))
+    os.mkdir(tempfile.tempdir)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ScrapeEndpoint)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    s = scraper.RogersRoofingScraper()
+    s.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield s
+    server.shutdown()
+    server.server_close()
+
+
+def test_http_fetch_spools_the_payload_and_removes_the_spool_file(endpoint):
+    data = asyncio.run(endpoint._fetch_scrape_http())
+
+    assert data == RESULT
+    assert os.listdir(tempfile.tempdir) == []
+
+
+def test_http_fetch_with_a_rejected_session_clears_it(endpoint):
+    scraper._stored_cookies[0]["value"] = "expired"
+
+    assert asyncio.run(endpoint._fetch_scrape_http()) is None
+    assert scraper.get_stored_cookies()[0] == []
+    assert os.listdir(tempfile.tempdir) == []
@@ -0,0 +1,118 @@
+import asyncio
+import http.client
+import io
+import json
+import urllib.parse
+
+import pytest
+
+import bot
+
+GROUPS = [
+    {"name": "Alpha Cart", "brand": "In-House", "cat": "Carts", "products": [{"id": 10, "name": "A", "qty": 0}]},
+    {"name": "Beta Gummies", "brand": "In-House", "cat": "Edibles", "products": [{"id": 11, "name": "B", "qty": 5}]},
+    {"name": "Merch Tee", "brand": "Geekd", "cat": "Merch", "products": [{"id": 12, "name": "M", "qty": 9}]},
+    {"name": "Gamma Pen", "brand": "Geekd", "cat": "Disposables", "products": [{"id": 13, "name": "G", "qty": 2}]},
+    {"name": "Delta Pen", "brand": {"name": "Geekd"}, "cat": "Disposables", "products": [{"id": 14, "name": "D", "qty": "500+"}]},
+    {"name": "Epsilon Flower", "brand": "Lumen", "products": [{"id": 777, "name": "E", "qty": 3}]},
+    {"name": "Zeta Rosin", "brand": "Lumen", "cat": "Concentrates", "products": [{"id": 16, "name": "Z", "qty": 1}, {"id": 17, "name": "Z2", "qty": -4}]},
+    {"name": "Xy", "brand": "Lumen", "cat": "Flower", "products": [{"id": 18, "name": "X", "qty": 1}]},
+]
+
+
+@pytest.fixture
+def index(catalog_index):
+    return catalog_index(GROUPS, hidden=[777])
+
+
+def _query(query="", admin=False):
+    body, _ = bot.query_catalog(urllib.parse.parse_qs(query), admin=admin)["identity"]
+    return json.loads(body)
+
+
+def test_index_applies_the_webapp_rules(index):
+    entries = {e["key"]: e for e in index["entries"]}
+
+    # Banned categories and names shorter than three characters are never listed
+    assert "g2" not in entries and "g7" not in entries
+    # In-House becomes Value; only its carts and disposables keep their category
+    assert (entries["g0"]["brand"], entries["g0"]["cat"]) == ("Value", "Carts")
+    assert (entries["g1"]["brand"], entries["g1"]["cat"]) == ("Value", "In-House")
+    assert entries["g4"]["brand"] == "Geekd" and entries["g4"]["stock"] == 500
+    assert entries["g5"]["cat"] == "Other"
+    assert entries["g6"]["stock"] == 1 and entries["g6"]["sort_stock"] == -3
+    assert index["categories"] == ["Explore", "In-House", "Carts", "Concentrates", "Disposables"]
+
+
+def test_customers_get_in_stock_unhidden_groups_in_stock_first_order(index):
+    body = _query()
+
+    assert body["keys"] == ["g1", "g3", "g4", "g6"]
+    assert body["total"] == 4 and body["pages"] == 1
+    assert [g["name"] for g in body["data"]] == ["Beta Gummies", "Gamma Pen", "Delta Pen", "Zeta Rosin"]
+    assert body["data"][0] == GROUPS[1]
+    assert body["imagePathPrefix"] == "/uploads/products/"
+
+
+def test_admins_see_out_of_stock_and_optionally_hidden_groups(index):
+    # g6 nets out to negative stock, so (like the WebApp) it sorts with the out-of-stock groups
+    assert _query(admin=True)["keys"] == ["g1", "g3", "g4", "g0", "g6"]
+    assert _query("instock=1", admin=True)["keys"] == ["g1", "g3", "g4", "g6"]
+    assert _query("hidden=1", admin=True)["keys"] == ["g1", "g3", "g4", "g5", "g0", "g6"]
+    # Only admins can unhide
+    assert _query("hidden=1")["keys"] == ["g1", "g3", "g4", "g6"]
+
+
+@pytest.mark.parametrize("query, keys", [
+    ("cat=Carts", ["g0"]),
+    ("cat=In-House", ["g1"]),
+    ("cat=Explore", ["g1", "g3", "g4", "g0", "g6"]),
+    ("cat=Merch", []),
+    ("brand=Value", ["g1", "g0"]),
+    ("brand=Geekd", ["g3", "g4"]),
+    ("brand=Geekd&cat=Carts", []),
+    ("q=PEN", ["g3", "g4"]),
+    ("q=eta", ["g1", "g6"]),
+    ("q=value", ["g1", "g0"]),
+    ("cat=Disposables&q=delta", ["g4"]),
+])
+def test_filters(index, query, keys):
+    body = _query(query, admin=True)
+
+    assert body["keys"] == keys
+    assert body["total"] == len(keys)
+
+
+def test_paging(index):
+    pages = [_query(f"limit=2&page={n}", admin=True) for n in (1, 2, 3, 4)]
+
+    assert [p["keys"] for p in pages] == [["g1", "g3"], ["g4", "g0"], ["g6"], []]
+    assert all(p["total"] == 5 and p["pages"] == 3 and p["limit"] == 2 for p in pages)
+    assert _query("limit=x&page=y", admin=True)["limit"] == bot.QUERY_DEFAULT_LIMIT
+    assert _query("limit=100000", admin=True)["limit"] == bot.QUERY_MAX_LIMIT
+
+
+def test_cached_pages_follow_hidden_items_and_rebuilds(index, catalog_index):
+    assert _query()["keys"] == ["g1", "g3", "g4", "g6"]
+
+    bot.global_config["webapp_settings"]["h"].append(13)
+    assert _query()["keys"] == ["g1", "g4", "g6"]
+
+    catalog_index(GROUPS[:2])
+    assert _query()["keys"] == ["g1"]
+
+
+def test_products_route_answers_query_parameters_from_the_index(index, monkeypatch):
+    monkeypatch.setitem(bot.PRODUCT_CACHE, "payload", {"identity": (b"{}", '"full"')})
+    monkeypatch.setattr(bot.CATALOG_LOADED, "is_set", lambda: True)
+
+    def get(path):
+        handler = bot.BotRequestHandler(bot.HttpRequest("GET", path, "HTTP/1.1", http.client.parse_headers(io.BytesIO(b"\r\n")), b""))
+        asyncio.run(handler.handle())
+        return handler.status, json.loads(handler.body)
+
+    assert get("/api/products?cat=Carts") == (200, _query("cat=Carts"))
+    assert get("/api/products?cat=Carts")[1]["keys"] == []
+    assert get(f"/api/products?cat=Carts&token={bot.ADMIN_TOKEN}")[1]["keys"] == ["g0"]
+    # Without query parameters the full precomputed catalog is served
+    assert get("/api/products") == (200, {})
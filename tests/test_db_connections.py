@@ -0,0 +1,89 @@
+import threading
+
+import pytest
+
+import bot
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A migrated database in tmp_path with an empty, loaded user state cache."""
+    monkeypatch.setattr(bot, "DB_FILE", str(tmp_path / "bot_database.db"))
+    monkeypatch.setattr(bot._db_local, "conn", None, raising=False)
+    monkeypatch.setattr(bot, "USER_CACHE", {})
+    monkeypatch.setattr(bot, "USER_CACHE_STATS", {"hits": 0, "misses": 0, "loaded": False})
+    conn = bot.init_db()
+    bot.load_user_cache()
+    yield conn
+    conn.close()
+
+
+def _on_thread(func):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(func()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def test_each_thread_reuses_its_own_wal_connection(db):
+    assert bot.get_db() is bot.get_db() is db
+    other = _on_thread(bot.get_db)
+
+    assert other is not db
+    assert db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert db.execute("PRAGMA busy_timeout").fetchone()[0] == int(bot.DB_BUSY_TIMEOUT * 1000)
+
+
+def test_writes_are_committed_for_other_threads(db):
+    bot.db_create_ticket("T1", 42, "Singles")
+    bot.db_close_ticket("T1")
+
+    assert _on_thread(lambda: bot.db_get_ticket("T1"))["closed"] == 1
+
+
+def test_ticket_counter_never_repeats_across_threads(db):
+    numbers = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(50):
+            n = bot.get_next_counter()
+            with lock:
+                numbers.append(n)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(numbers) == list(range(1, 201))
+
+
+def test_user_checks_are_answered_from_the_cache(db):
+    bot.db_register_user(1)
+    bot.db_set_user_banned(2, True)
+    bot.db_add_user_points(1, 5)
+    statements = []
+    db.set_trace_callback(statements.append)
+
+    assert bot.db_check_user_started(1) and not bot.db_is_user_banned(1)
+    assert bot.db_is_user_banned(2)
+    assert bot.db_get_user_points(1) == 5
+    assert not bot.db_check_user_started(3)
+
+    db.set_trace_callback(None)
+    assert statements == []
+    assert bot.USER_CACHE_STATS["hits"] == 4 and bot.USER_CACHE_STATS["misses"] == 1
+
+
+def test_cache_writes_go_through_to_the_database(db):
+    bot.db_register_user(1)
+    bot.db_set_user_banned(1, True)
+    bot.db_add_user_points(1, 3)
+    bot.db_set_user_banned(1, False)
+
+    bot.load_user_cache()
+
+    assert bot.USER_CACHE == {1: {"banned": False, "points": 3}}
@@ -0,0 +1,55 @@
+import time
+
+import pytest
+
+import bot
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A migrated database in tmp_path, with some tickets and referrals in it."""
+    monkeypatch.setattr(bot, "DB_FILE", str(tmp_path / "bot_database.db"))
+    monkeypatch.setattr(bot._db_local, "conn", None, raising=False)
+    conn = bot.init_db()
+    now = time.time()
+    with conn:
+        conn.executemany(
+            "INSERT INTO tickets (id, user_id, section, created_at, last_activity, closed, next_check_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(f"T{i}", i % 50, "Singles", now - i, now - i, int(i % 10 != 0), now - i + 86400) for i in range(500)],
+        )
+        conn.executemany("INSERT INTO referrals (code, user_id, created_at) VALUES (?, ?, ?)",
+                         [(f"R{i}", i, now) for i in range(50)])
+    yield conn
+    conn.close()
+
+
+def _plans(conn, call):
+    """EXPLAIN QUERY PLAN details for every SELECT/DELETE a db_* helper runs."""
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        call()
+    finally:
+        conn.set_trace_callback(None)
+    queries = [s for s in statements if s.lstrip().upper().startswith(("SELECT", "DELETE"))]
+    assert queries
+    return [" | ".join(row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {q}")) for q in queries]
+
+
+@pytest.mark.parametrize("helper, args, index", [
+    ("db_get_active_tickets", (7,), "idx_tickets_user_open"),
+    ("db_get_due_tickets", (time.time(),), "idx_tickets_open_deadline"),
+    ("db_get_recent_open_tickets", (20,), "idx_tickets_closed_activity"),
+    ("db_delete_closed_tickets", (0,), "idx_tickets_closed_activity"),
+    ("db_get_user_referral_code", (7,), "idx_referrals_user"),
+])
+def test_hot_queries_use_their_index(db, helper, args, index):
+    for plan in _plans(db, lambda: getattr(bot, helper)(*args)):
+        assert f"INDEX {index}" in plan, plan
+        assert "TEMP B-TREE" not in plan, plan
+
+
+def test_migrations_record_the_schema_version(db):
+    assert bot.get_schema_version(db) == bot.SCHEMA_MIGRATIONS[-1][0]
+    indexes = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"idx_tickets_user_open", "idx_tickets_closed_activity", "idx_tickets_open_deadline", "idx_referrals_user"} <= indexes
@@ -0,0 +1,111 @@
+import asyncio
+import gzip
+import http.client
+import io
+import json
+import threading
+import urllib.request
+
+import pytest
+
+import bot
+import catalog
+from conftest import free_port
+
+
+def _get(port, path):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=30) as response:
+        return response.read()
+
+
+def test_initial_scrape_builds_cache_off_the_event_loop(tmp_path, monkeypatch, stand_in_scraper):
+    monkeypatch.setattr(bot, "SCRAPER_SCRIPT", stand_in_scraper({"data": [{"name": "Group", "brand": "B", "products": []}]}))
+    monkeypatch.setattr(bot, "PRODUCT_SNAPSHOT_FILE", str(tmp_path / "products.snapshot"))
+    for key, value in {"data": None, "payload": None, "last_attempt": 0}.items():
+        monkeypatch.setitem(bot.PRODUCT_CACHE, key, value)
+    monkeypatch.setattr(bot.CATALOG_LOADED, "is_set", lambda: True)
+    builder_threads = []
+    set_product_cache = bot._set_product_cache
+
+    def recording_set_product_cache(result):
+        builder_threads.append(threading.get_ident())
+        set_product_cache(result)
+
+    monkeypatch.setattr(bot, "_set_product_cache", recording_set_product_cache)
+
+    async def main():
+        port = free_port()
+        server = asyncio.create_task(bot.serve_http("127.0.0.1", port))
+        await asyncio.sleep(0.2)
+        body = await asyncio.get_running_loop().run_in_executor(None, _get, port, "/api/products")
+        server.cancel()
+        return json.loads(body)
+
+    loop_thread = threading.get_ident()
+    body = asyncio.run(main())
+
+    assert [group["name"] for group in body["data"]] == ["Group"]
+    assert builder_threads and builder_threads[0] != loop_thread
+
+
+CATALOG = {"data": [{"name": "Group", "brand": "B", "cat": "Pods", "products": [{"id": 1, "name": "Mint", "qty": 3}]}],
+           "lastUpdated": 1760000000}
+
+
+@pytest.fixture
+def payload(monkeypatch):
+    payload = bot.build_product_payload(dict(CATALOG, data=catalog.build_catalog(CATALOG["data"])))
+    monkeypatch.setitem(bot.PRODUCT_CACHE, "payload", payload)
+    monkeypatch.setattr(bot.CATALOG_LOADED, "is_set", lambda: True)
+    return payload
+
+
+def _request(path, headers=()):
+    """Runs one GET through BotRequestHandler; returns (status, headers dict, bytes on the wire)."""
+    head = "".join(f"{name}: {value}\r\n" for name, value in headers) + "\r\n"
+    handler = bot.BotRequestHandler(bot.HttpRequest("GET", path, "HTTP/1.1", http.client.parse_headers(io.BytesIO(head.encode())), b""))
+    asyncio.run(handler.handle())
+    return handler.status, dict(handler.response_headers), handler.render(keep_alive=False)
+
+
+def test_every_encoding_carries_the_same_json(payload):
+    body, _ = payload["identity"]
+
+    assert json.loads(body) == CATALOG
+    assert gzip.decompress(payload["gzip"][0]) == body
+    assert len({etag for _, etag in payload.values()}) == len(payload)
+
+
+def test_products_are_served_precompressed_with_length_and_etag(payload):
+    status, headers, wire = _request("/api/products", [("Accept-Encoding", "gzip")])
+
+    assert status == 200
+    assert headers["Content-Encoding"] == "gzip"
+    assert headers["ETag"] == payload["gzip"][1]
+    assert wire.endswith(b"\r\n\r\n" + payload["gzip"][0])
+    assert f"Content-Length: {len(payload['gzip'][0])}".encode() in wire
+
+
+def test_revalidation_matches_the_etag_of_any_encoding(payload):
+    # Cached uncompressed (e.g. through a proxy that stripped Accept-Encoding), now revalidating with gzip
+    identity_etag = payload["identity"][1]
+    status, headers, wire = _request("/api/products", [("Accept-Encoding", "gzip"), ("If-None-Match", f'"stale", {identity_etag}')])
+
+    assert status == 304
+    assert headers["ETag"] == identity_etag
+    assert wire.endswith(b"\r\n\r\n")
+
+
+def test_revalidation_prefers_the_chosen_encodings_etag(payload):
+    tags = ", ".join(etag for _, etag in payload.values())
+    status, headers, _ = _request("/api/products", [("Accept-Encoding", "gzip"), ("If-None-Match", tags)])
+
+    assert status == 304
+    assert headers["ETag"] == payload["gzip"][1]
+
+
+def test_stale_etag_gets_the_full_body(payload):
+    status, headers, _ = _request("/api/products", [("If-None-Match", '"stale"')])
+
+    assert status == 200
+    assert headers["ETag"] == payload["identity"][1]
@@ -0,0 +1,50 @@
+import os
+import time
+
+import image_cache
+
+OLD = time.time() - 2 * image_cache.CACHE_GC_GRACE_SECONDS
+
+
+def _write(directory, name, age=OLD):
+    path = directory / name
+    path.write_bytes(b"x" * 1000)
+    os.utime(path, (age, age))
+    return path
+
+
+def test_garbage_collection_only_deletes_old_unreferenced_cache_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_cache, "CACHE_DIR", str(tmp_path))
+    kept = [
+        "aaaa.webp", "aaaa_450.webp", "aaaa_w250.avif",          # referenced master and its derived files
+        image_cache.MANIFEST_FILE,
+        "bbbb.webp.4242.140000.tmp", "cccc.jpg.part",           # writes in progress
+        "README", "notes.txt", ".keep",                         # not cache files
+    ]
+    removed = ["dddd.webp", "dddd_450.webp", "dddd_w950.jpeg", "eeee.png"]
+    for name in kept + removed:
+        _write(tmp_path, name)
+    _write(tmp_path, "ffff.webp", age=time.time())              # just cached by the proxy
+    kept.append("ffff.webp")
+    image_cache.MEMORY.put("dddd.webp", b"x" * 1000, "image/webp")
+
+    assert image_cache.collect_garbage(["aaaa.webp"]) == (len(removed), 1000 * len(removed))
+    assert sorted(os.listdir(tmp_path)) == sorted(kept)
+    assert image_cache.from_memory("dddd.webp") is None
+
+
+def test_grace_period_can_be_disabled(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_cache, "CACHE_DIR", str(tmp_path))
+    _write(tmp_path, "ffff.webp", age=time.time())
+
+    assert image_cache.collect_garbage([], grace=0) == (1, 1000)
+
+
+def test_replacing_a_master_leaves_in_progress_writes_alone(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_cache, "CACHE_DIR", str(tmp_path))
+    for name in ["aaaa.webp", "aaaa_450.webp", "aaaa_w450.webp", "aaaa.webp.1.2.tmp", "aaaa.webp.part", "bbbb.webp"]:
+        _write(tmp_path, name)
+
+    image_cache.drop_derived("aaaa.webp")
+
+    assert sorted(os.listdir(tmp_path)) == ["aaaa.webp", "aaaa.webp.1.2.tmp", "aaaa.webp.part", "bbbb.webp"]
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+import bot
+import image_cache
+from conftest import free_port
+
+IMAGE_BYTES = b"RIFF" + bytes(range(256)) * 8
+
+
+class _Upstream(BaseHTTPRequestHandler):
+    """Stand-in image host: counts hits and answers slowly so proxy misses overlap."""
+    hits = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            type(self).hits += 1
+        time.sleep(0.3)
+        self.send_response(200)
+        self.send_header("Content-Type", "image/webp")
+        self.send_header("Content-Length", str(len(IMAGE_BYTES)))
+        self.end_headers()
+        self.wfile.write(IMAGE_BYTES)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    _Upstream.hits = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Upstream)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setattr(image_cache, "UPSTREAM_BASE", base)
+    monkeypatch.setattr(image_cache, "UPSTREAM_HOST", base.split("//", 1)[1])
+    yield base
+    server.shutdown()
+    server.server_close()
+
+
+def test_concurrent_misses_share_one_upstream_fetch(tmp_path, monkeypatch, upstream):
+    monkeypatch.setattr(image_cache, "CACHE_DIR", str(tmp_path / "cached_images"))
+    image_cache.MEMORY.clear()
+    url = f"{upstream}/uploads/products/x450-single-flight.png.webp"
+
+    async def main():
+        port = free_port()
+        server = asyncio.create_task(bot.serve_http("127.0.0.1", port))
+        await asyncio.sleep(0.2)
+        async with httpx.AsyncClient(limits=httpx.Limits(max_connections=100), timeout=30) as client:
+            responses = await asyncio.gather(*[
+                client.get(f"http://127.0.0.1:{port}/api/img", params={"u": url}) for _ in range(100)
+            ])
+        server.cancel()
+        return responses
+
+    responses = asyncio.run(main())
+
+    assert [r.status_code for r in responses] == [200] * 100
+    assert all(r.content == IMAGE_BYTES for r in responses)
+    assert _Upstream.hits == 1
+    assert not bot.IMAGE_INFLIGHT
+    image_cache.MEMORY.clear()
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("/uploads/products/a.webp", "https://rogersroofing.click/uploads/products/a.webp"),
+    ("uploads/products/a.webp", "https://rogersroofing.click/uploads/products/a.webp"),
+    ("//evil.example/a.webp", "https://rogersroofing.click//evil.example/a.webp"),
+    ("http://ROGERSROOFING.click/uploads/a.webp?v=2", "https://rogersroofing.click/uploads/a.webp?v=2"),
+    ("https://evil.example/uploads/a.webp", None),
+    ("https://rogersroofing.click@evil.example/a.webp", None),
+    ("https://rogersroofing.click:8443/a.webp", None),
+    ("https://rogersroofing.click.evil.example/a.webp", None),
+    ("http://169.254.169.254/latest/meta-data/", None),
+])
+def test_upstream_url_only_reaches_the_upstream_host(raw, expected):
+    assert image_cache.upstream_url(raw) == expected
+
+
+def test_proxy_never_fetches_from_other_hosts(tmp_path, monkeypatch, upstream):
+    monkeypatch.setattr(image_cache, "CACHE_DIR", str(tmp_path / "cached_images"))
+    monkeypatch.setattr(image_cache, "UPSTREAM_BASE", "https://images.example")
+    monkeypatch.setattr(image_cache, "UPSTREAM_HOST", "images.example")
+    image_cache.MEMORY.clear()
+    foreign = f"{upstream}/uploads/products/x450-foreign.png.webp"
+    # A catalog image on another host that the scraper already downloaded is still served from disk
+    cached = f"{upstream}/uploads/products/x450-cached.png.webp"
+    image_cache.store(image_cache.cache_name(cached), IMAGE_BYTES)
+    image_cache.MEMORY.clear()
+
+    async def main():
+        port = free_port()
+        server = asyncio.create_task(bot.serve_http("127.0.0.1", port))
+        await asyncio.sleep(0.2)
+        async with httpx.AsyncClient(timeout=30) as client:
+            responses = [await client.get(f"http://127.0.0.1:{port}/api/img", params={"u": u}) for u in (foreign, cached)]
+        server.cancel()
+        return responses
+
+    missing, served = asyncio.run(main())
+
+    assert missing.status_code == 404
+    assert served.status_code == 200 and served.content == IMAGE_BYTES
+    assert _Upstream.hits == 0
+    image_cache.MEMORY.clear()
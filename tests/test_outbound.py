@@ -0,0 +1,72 @@
+import asyncio
+
+from telegram.error import RetryAfter
+
+import bot
+
+
+class FakeBot:
+    """Records sends; raises RetryAfter for the first `flood` calls into a chat."""
+
+    def __init__(self, flood=0, retry_after=0.05):
+        self.sent = []
+        self.flood = flood
+        self.retry_after = retry_after
+        self.blocked = set()
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if chat_id in self.blocked:
+            raise RuntimeError("Forbidden: bot was blocked by the user")
+        if self.flood:
+            self.flood -= 1
+            raise RetryAfter(self.retry_after)
+        self.sent.append((chat_id, text))
+        return text
+
+
+def _run(dispatcher, sends):
+    async def main():
+        futures = [dispatcher.submit(*args, **kwargs) for args, kwargs in sends]
+        results = await asyncio.gather(*futures)
+        await dispatcher.stop()
+        return results
+    return asyncio.run(main())
+
+
+def test_one_chat_keeps_order_when_rate_limited():
+    fake = FakeBot()
+    dispatcher = bot.OutboundDispatcher(global_rate=1000, private_rate=100, group_rate=50)
+    sends = [((fake, "send_message", 42, bot.PRIORITY_CUSTOMER), {"text": str(i)}) for i in range(6)]
+    sends += [((fake, "send_message", -100, bot.PRIORITY_NORMAL), {"text": str(i)}) for i in range(30)]
+    _run(dispatcher, sends)
+    assert [t for c, t in fake.sent if c == 42] == [str(i) for i in range(6)]
+    assert [t for c, t in fake.sent if c == -100] == [str(i) for i in range(30)]
+    # One park per message at most: the chat is woken once per refill, not once per message
+    assert dispatcher.stats["deferred"] <= 36
+    assert not dispatcher.parked and not dispatcher.releasing
+
+
+def test_retry_after_resends_head_first():
+    fake = FakeBot(flood=2)
+    dispatcher = bot.OutboundDispatcher(global_rate=1000, private_rate=100)
+    sends = [((fake, "send_message", 7, bot.PRIORITY_CUSTOMER), {"text": str(i)}) for i in range(5)]
+    _run(dispatcher, sends)
+    assert [t for _, t in fake.sent] == [str(i) for i in range(5)]
+    assert dispatcher.stats["retried"] == 2
+
+
+def test_report_failure_tells_staff_without_waiting():
+    fake = FakeBot()
+    fake.blocked.add(7)
+
+    async def main():
+        future = bot.report_failure(bot.queue_message(fake, 7, "hi", priority=bot.PRIORITY_CUSTOMER), fake, 99, "the reply to user 7")
+        assert not future.done()
+        for _ in range(100):
+            if fake.sent:
+                break
+            await asyncio.sleep(0.01)
+        await bot.OUTBOUND.stop()
+
+    asyncio.run(main())
+    assert fake.sent == [(99, "❌ Failed to send the reply to user 7: Forbidden: bot was blocked by the user")]
@@ -0,0 +1,192 @@
+"""Offline harness for the scraper's browser flow: the age gate and login run in a real headless
+Chromium against local stand-in pages (tests/fixtures/scraper_site), so the event-driven waits
+(_first_success, _click_and_settle, waitForSelector/waitForNavigation) are exercised end to end.
+Skipped when pyppeteer or a Chromium binary (PUPPETEER_EXECUTABLE_PATH) is not available."""
+import asyncio
+import json
+import os
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("pyppeteer")
+import scraper
+
+SITE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "scraper_site")
+CHROMIUM = scraper.RogersRoofingScraper()._find_chromium()
+pytestmark = pytest.mark.skipif(not CHROMIUM, reason="no Chromium binary (set PUPPETEER_EXECUTABLE_PATH)")
+
+USERNAME = "staff@example.com"
+PASSWORD = "hunter2"
+CATALOG = {"data": [{"name": "Group", "brand": "Brand", "products": [{"id": 1, "name": "Variant", "qty": 3}]}],
+           "lastUpdated": 1760000000, "imagePathPrefix": "/uploads/products/"}
+PAGES = {"/": "index.html", "/gate-link": "gate-link.html", "/shop": "shop.html", "/login": "login.html", "/account": "account.html"}
+
+
+class _Site(BaseHTTPRequestHandler):
+    """Stand-in for the shop: static fixture pages, a form login that sets a session cookie after a
+    short delay, and the scrape endpoint behind that cookie."""
+
+    def do_GET(self):
+        path = urllib.parse.urlparse(self.path).path
+        if path == "/api/products/scrape":
+            if "session=ok" not in (self.headers.get("Cookie") or ""):
+                self._redirect("/login")
+                return
+            self._send(200, "application/json", json.dumps(CATALOG).encode())
+        elif path in PAGES:
+            with open(os.path.join(SITE_DIR, PAGES[path]), "rb") as f:
+                self._send(200, "text/html; charset=utf-8", f.read())
+        else:
+            self._send(404, "text/plain", b"not found")
+
+    def do_POST(self):
+        form = urllib.parse.parse_qs(self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode())
+        time.sleep(0.3)
+        if form.get("email") == [USERNAME] and form.get("password") == [PASSWORD]:
+            self._redirect("/account", [("Set-Cookie", "session=ok; Path=/; HttpOnly")])
+        else:
+            self._redirect("/login?error=1")
+
+    def _redirect(self, location, headers=()):
+        self.send_response(303)
+        self.send_header("Location", location)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def site(tmp_path, monkeypatch):
+    monkeypatch.setattr(scraper, "SESSION_FILE", str(tmp_path / "scraper_session.json"))
+    monkeypatch.setattr(scraper, "_stored_cookies", [])
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Site)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _scraper(site):
+    s = scraper.RogersRoofingScraper(username=USERNAME, password=PASSWORD)
+    s.base_url = site
+    return s
+
+
+def _with_page(test):
+    """Runs test(page) in a fresh headless browser."""
+    async def main():
+        browser = await scraper.launch(
+            headless=True, executablePath=CHROMIUM, args=["--no-sandbox", "--disable-gpu", "--disable-dev-shm-usage"],
+            handleSIGINT=False, handleSIGTERM=False, handleSIGHUP=False,
+        )
+        try:
+            return await test(await browser.newPage())
+        finally:
+            await browser.close()
+    return asyncio.run(main())
+
+
+def test_age_gate_overlay_waits_for_the_overlay_to_close(site):
+    s = _scraper(site)
+
+    async def run(page):
+        await s._goto(page, site, "Nav")
+        started = time.monotonic()
+        handled = await s._handle_age_gate(page)
+        elapsed = time.monotonic() - started
+        hidden = await page.evaluate('() => document.getElementById("age-gate").offsetParent === null')
+        declined = await page.evaluate("() => !!window.declined")
+        return handled, elapsed, hidden, declined
+
+    handled, elapsed, hidden, declined = _with_page(run)
+
+    assert handled and hidden and not declined
+    # Ends when the overlay's 250 ms close lands, not after a fixed sleep or the wait timeout
+    assert 0.2 < elapsed < scraper.SCRAPER_WAIT_TIMEOUT / 1000 / 2
+
+
+def test_age_gate_link_waits_for_the_navigation(site):
+    s = _scraper(site)
+
+    async def run(page):
+        await s._goto(page, f"{site}/gate-link", "Nav")
+        handled = await s._handle_age_gate(page)
+        return handled, page.url
+
+    handled, url = _with_page(run)
+
+    assert handled
+    assert url == f"{site}/shop"
+
+
+def test_login_waits_for_the_late_password_field_and_redirect(site):
+    s = _scraper(site)
+
+    async def run(page):
+        started = time.monotonic()
+        await s._login(page)
+        return page.url, time.monotonic() - started
+
+    url, elapsed = _with_page(run)
+
+    assert url == f"{site}/account"
+    assert elapsed < scraper.SCRAPER_LOGIN_TIMEOUT / 1000 / 2
+    with open(scraper.SESSION_FILE, encoding="utf-8") as f:
+        assert [c["name"] for c in json.load(f)["cookies"]] == ["session"]
+
+
+def test_login_stops_waiting_when_submitting_raises(site):
+    s = _scraper(site)
+    submit_selectors = {"button[type='submit']", "input[type='submit']", "button.login-btn", "button.btn-primary"}
+
+    async def run(page):
+        query_selector = page.querySelector
+
+        async def no_submit_button(selector):
+            return None if selector in submit_selectors else await query_selector(selector)
+
+        async def press(key, options=None):
+            raise RuntimeError("keyboard gone")
+
+        async def no_buttons(selector):
+            return []
+
+        page.querySelector = no_submit_button
+        page.querySelectorAll = no_buttons
+        page.keyboard.press = press
+        with pytest.raises(RuntimeError, match="keyboard gone"):
+            await s._login(page)
+        await asyncio.sleep(0.1)
+        waits = [t for t in asyncio.all_tasks() if not t.done()
+                 and any(name in repr(t.get_coro()) for name in ("_first_success", "waitForNavigation", "timer"))]
+        return waits, len(page.mainFrame._waitTasks)
+
+    waits, wait_tasks = _with_page(run)
+
+    assert waits == []
+    assert wait_tasks == 0
+
+
+def test_browser_flow_fetches_with_the_login_session_and_times_each_phase(site, monkeypatch):
+    monkeypatch.setenv("PUPPETEER_EXECUTABLE_PATH", CHROMIUM)
+    s = _scraper(site)
+
+    data = asyncio.run(s._fetch_scrape_browser())
+
+    assert data["data"] == CATALOG["data"]
+    assert list(s.timings) == ["launch", "navigate", "age_gate", "login", "fetch"]
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import image_cache
+import scraper
+
+IMAGE_BYTES = bytes(range(256)) * 40
+
+
+class _Images(BaseHTTPRequestHandler):
+    """Stand-in image host: behind the session cookie, only the x450 size exists, "tiny" is a
+    placeholder below MIN_IMAGE_BYTES, and every image revalidates against ETag "v1"."""
+    protocol_version = "HTTP/1.1"
+    requests = []
+
+    def do_GET(self):
+        type(self).requests.append((self.path, self.headers.get("If-None-Match")))
+        if "session=ok" not in (self.headers.get("Cookie") or ""):
+            self._send(403, b"")
+        elif "/x450-" not in self.path:
+            self._send(404, b"")
+        elif self.headers.get("If-None-Match") == '"v1"':
+            self._send(304, None)
+        else:
+            self._send(200, b"x" * 100 if "tiny" in self.path else IMAGE_BYTES)
+
+    def _send(self, status, body):
+        self.send_response(status)
+        self.send_header("ETag", '"v1"')
+        if body is not None:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def site(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_cache, "CACHE_DIR", str(tmp_path / "cached_images"))
+    monkeypatch.setattr(scraper, "_stored_cookies", [{"name": "session", "value": "ok", "domain": "127.0.0.1", "path": "/"}])
+    _Images.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Images)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+GROUPS = [{"name": "Group", "imgs": {"1": "x_imgvariantsize-a.jpg"},
+           "products": [{"id": 1, "images": ["x_imgvariantsize-a.jpg", "x_imgvariantsize-tiny.jpg"]}]}]
+
+
+def _sync(site):
+    s = scraper.RogersRoofingScraper()
+    s.base_url = site
+    return asyncio.run(s._download_images(GROUPS, "/uploads/products/"))
+
+
+def test_images_stream_to_disk_trying_sizes_largest_first(site):
+    result = _sync(site)
+
+    url, name = result["x_imgvariantsize-a.jpg"]
+    assert url == f"{site}/uploads/products/x950-a.jpg"
+    with open(os.path.join(image_cache.CACHE_DIR, name), "rb") as f:
+        assert f.read() == IMAGE_BYTES
+    tried = [path for path, _ in _Images.requests if path.endswith("-a.jpg")]
+    assert tried == ["/uploads/products/x950-a.jpg", "/uploads/products/x750-a.jpg", "/uploads/products/x450-a.jpg"]
+    # The placeholder was never renamed into place, and no partial downloads are left behind
+    assert sorted(os.listdir(image_cache.CACHE_DIR)) == sorted([name, image_cache.MANIFEST_FILE])
+    assert image_cache.load_manifest()[name]["url"] == f"{site}/uploads/products/x450-a.jpg"
+
+
+def test_stale_images_are_revalidated_with_their_etag(site):
+    name = _sync(site)["x_imgvariantsize-a.jpg"][1]
+    manifest = image_cache.load_manifest()
+    manifest[name]["checked_at"] = 0
+    image_cache.save_manifest(manifest)
+    _Images.requests = []
+
+    _sync(site)
+
+    assert [r for r in _Images.requests if "-a.jpg" in r[0]] == [("/uploads/products/x450-a.jpg", '"v1"')]
+    with open(os.path.join(image_cache.CACHE_DIR, name), "rb") as f:
+        assert f.read() == IMAGE_BYTES
+    assert image_cache.load_manifest()[name]["checked_at"] > 0
+
+
+def test_recently_checked_images_are_not_requested(site):
+    _sync(site)
+    _Images.requests = []
+
+    _sync(site)
+
+    assert not [r for r in _Images.requests if "-a.jpg" in r[0]]
+
+
+def test_images_are_fetched_with_the_login_cookies(site, monkeypatch):
+    monkeypatch.setattr(scraper, "_stored_cookies", [])
+
+    result = _sync(site)
+
+    assert not os.path.exists(os.path.join(image_cache.CACHE_DIR, result["x_imgvariantsize-a.jpg"][1]))
+    assert _Images.requests
@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+import bot
+import image_cache
+
+
+@pytest.mark.parametrize("result, keeps_memory", [
+    ({"data": [{"name": "Group", "products": []}], "lastUpdated": 1}, False),
+    ({"data": [], "unchanged": True, "lastUpdated": 1}, True),
+])
+def test_refresh_invalidates_image_memory_tier(tmp_path, monkeypatch, stand_in_scraper, result, keeps_memory):
+    monkeypatch.setattr(bot, "SCRAPER_SCRIPT", stand_in_scraper(result))
+    monkeypatch.setattr(bot, "PRODUCT_SNAPSHOT_FILE", str(tmp_path / "products.snapshot"))
+    image_cache.MEMORY.put("0123456789abcdef.webp", b"x" * 1000, "image/webp")
+
+    scraped = asyncio.run(bot.run_scraper_process(known_last_updated=1))
+
+    assert scraped["lastUpdated"] == 1
+    assert (image_cache.MEMORY.get("0123456789abcdef.webp") is not None) == keeps_memory
+    image_cache.MEMORY.clear()
+
+
+def test_known_last_updated_matches_numeric_upstream_value(monkeypatch):
+    pytest.importorskip("pyppeteer")
+    import scraper
+
+    async def fetch_http(self):
+        return {"data": [{"name": "Group"}], "lastUpdated": 1760000000123, "nextUpdate": 1760003600000}
+
+    monkeypatch.setattr(scraper, "load_session", lambda: False)
+    monkeypatch.setattr(scraper.RogersRoofingScraper, "_fetch_scrape_http", fetch_http)
+    # The bot's subprocess hands the value over as a command-line string
+    result = asyncio.run(scraper.RogersRoofingScraper()._scrape_async(known_last_updated="1760000000123"))
+
+    assert result["unchanged"] is True
+    assert result["lastUpdated"] == 1760000000123
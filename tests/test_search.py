@@ -0,0 +1,94 @@
+import pytest
+
+import bot
+
+
+def _group(name, brand, variants, qty=1, first_id=None):
+    first_id = first_id or abs(hash(name)) % 10**6
+    return {"name": name, "brand": brand, "cat": "Disposables",
+            "products": [{"id": first_id + i, "name": v, "qty": qty} for i, v in enumerate(variants)]}
+
+
+GROUPS = [
+    _group("Mango Bar", "Geekd", ["Mango Ice", "Blue Razz"], qty=5),
+    _group("Strawberry Cube", "Cloud Co", ["Strawberry Kiwi"], qty=0),
+    _group("Peach Stick", "Mango Labs", ["Peach Rings"], qty=3),
+    _group("Watermelon Wave", "Lumen", ["Watermelon 50mg", "Mango Peach"], qty=2),
+    _group("Vanilla Core", "Arc", ["Vanilla Custard"], first_id=900),
+    _group("Cola Cube", "Arc", ["Strawberry Cola"], qty=4),
+]
+
+
+@pytest.fixture
+def index(catalog_index):
+    return catalog_index(GROUPS, hidden=[900])
+
+
+@pytest.mark.parametrize("a, b, expected", [
+    ("mango", "mango", True),
+    ("mango", "mbngo", True),   # substitution
+    ("mango", "mangoo", True),  # insertion
+    ("mango", "mngo", True),    # deletion
+    ("mango", "mnago", True),   # adjacent swap
+    ("mango", "mbngp", False),
+    ("mango", "ogman", False),
+    ("mango", "man", False),
+    ("ab", "ba", True),
+    ("abc", "cab", False),
+])
+def test_within_one_edit(a, b, expected):
+    assert bot._within_one_edit(a, b) is expected
+    assert bot._within_one_edit(b, a) is expected
+
+
+def test_query_tokens_match_exactly_by_prefix_or_with_one_typo(index):
+    search = index["search"]
+
+    assert bot._match_token(search, "mango") == {"mango": bot.SEARCH_EXACT}
+    assert bot._match_token(search, "straw") == {"strawberry": bot.SEARCH_PREFIX}
+    assert bot._match_token(search, "mnago") == {"mango": bot.SEARCH_FUZZY}
+    assert bot._match_token(search, "watermelln") == {"watermelon": bot.SEARCH_FUZZY}
+    assert bot._match_token(search, "pea") == {"peach": bot.SEARCH_PREFIX}
+
+
+def test_short_tokens_are_not_matched_loosely(index):
+    search = index["search"]
+
+    assert bot._match_token(search, "m") == {}
+    assert bot._match_token(search, "ic") == {"ice": bot.SEARCH_PREFIX}
+    # Three letters is below SEARCH_FUZZY_MIN_LENGTH: "ixe" is not treated as a typo of "ice"
+    assert bot._match_token(search, "ixe") == {}
+
+
+def test_every_query_token_must_match(index):
+    assert bot.search_catalog("mango razz")["keys"] == ["g0"]
+    assert bot.search_catalog("mango peach")["keys"] == ["g2", "g3"]
+    assert bot.search_catalog("mango kiwi") == {"revision": 1, "q": "mango kiwi", "total": 0, "keys": []}
+
+
+def test_results_rank_in_stock_first_then_by_field_and_match(index):
+    # Name (x3) beats brand (x2) beats variant (x1) among in-stock groups
+    assert bot.search_catalog("mango")["keys"] == ["g0", "g2", "g3"]
+    # The out-of-stock name match comes after the in-stock variant match
+    assert bot.search_catalog("strawberry")["keys"] == ["g5", "g1"]
+    # An exact match outranks a prefix match in the same field
+    assert bot.search_catalog("cube")["keys"][0] == "g5"
+    assert bot.search_catalog("cub")["keys"] == ["g5", "g1"]
+
+
+def test_typos_and_prefixes_find_the_same_groups(index):
+    assert bot.search_catalog("strawbery")["keys"] == bot.search_catalog("straw")["keys"] == ["g5", "g1"]
+    assert bot.search_catalog("WATERMELLN!")["keys"] == ["g3"]
+
+
+def test_hidden_groups_are_left_out_unless_an_admin_asks(index):
+    assert bot.search_catalog("vanilla")["keys"] == []
+    assert bot.search_catalog("vanilla", admin=True)["keys"] == []
+    assert bot.search_catalog("vanilla", admin=True, show_hidden=True)["keys"] == ["g4"]
+
+
+def test_limit_caps_keys_but_not_total(index):
+    result = bot.search_catalog("mango", limit=2)
+
+    assert result["keys"] == ["g0", "g2"]
+    assert result["total"] == 3
@@ -0,0 +1,57 @@
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import bot
+from conftest import ROOT
+
+
+def test_importing_bot_does_not_import_the_scraper_stack(tmp_path):
+    # A pyppeteer that fails loudly, ahead of any installed one, in a fresh interpreter
+    sentinel = tmp_path / "pyppeteer"
+    sentinel.mkdir()
+    (sentinel / "__init__.py").write_text("raise ImportError('pyppeteer imported at bot startup')\n")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(tmp_path), ROOT, os.environ.get("PYTHONPATH")])))
+
+    completed = subprocess.run(
+        [sys.executable, "-c", "import sys, bot; print(sorted(m for m in ('pyppeteer', 'scraper') if m in sys.modules))"],
+        cwd=str(tmp_path), env=env, capture_output=True, text=True, timeout=60,
+    )
+
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stdout.strip().splitlines()[-1] == "[]"
+
+
+def test_catalog_waiters_are_woken_without_executor_threads(monkeypatch):
+    monkeypatch.setattr(bot, "CATALOG_LOADED", threading.Event())
+    monkeypatch.setattr(bot, "_load_catalog_from_disk", lambda: time.sleep(0.2))
+
+    async def main():
+        loop = asyncio.get_running_loop()
+
+        def no_executor(*args):
+            raise AssertionError("wait_for_catalog used an executor thread")
+
+        loop.run_in_executor = no_executor
+        waiters = [asyncio.ensure_future(bot.wait_for_catalog(timeout=5)) for _ in range(200)]
+        await asyncio.sleep(0)
+        threading.Thread(target=bot._load_initial_cache).start()
+        started = time.monotonic()
+        await asyncio.gather(*waiters)
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(main())
+
+    assert elapsed < 2
+    assert bot.CATALOG_LOADED.is_set() and not bot.CATALOG_WAITERS
+
+
+def test_wait_for_catalog_gives_up_after_the_timeout(monkeypatch):
+    monkeypatch.setattr(bot, "CATALOG_LOADED", threading.Event())
+    monkeypatch.setattr(bot, "CATALOG_WAITERS", {})
+    started = time.monotonic()
+    asyncio.run(bot.wait_for_catalog(timeout=0.1))
+    assert 0.1 <= time.monotonic() - started < 1
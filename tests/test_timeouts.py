@@ -0,0 +1,85 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import bot
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, "DB_FILE", str(tmp_path / "bot_database.db"))
+    monkeypatch.setattr(bot._db_local, "conn", None, raising=False)
+    conn = bot.init_db()
+
+    async def run_db(func, *args):
+        return func(*args)
+
+    monkeypatch.setattr(bot, "run_db", run_db)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def prompts(monkeypatch):
+    sent = []
+
+    async def send_to_support_group(bot_, text, **kwargs):
+        sent.append(text)
+
+    monkeypatch.setattr(bot, "send_to_support_group", send_to_support_group)
+    monkeypatch.setattr(bot, "queue_message", lambda *args, **kwargs: None)
+    return sent
+
+
+def _ticket(conn, ticket_id, last_activity, last_prompt_at=None, snooze_until=None, next_check_at=None):
+    with conn:
+        conn.execute(
+            "INSERT INTO tickets (id, user_id, section, created_at, last_activity, last_prompt_at, snooze_until, next_check_at) "
+            "VALUES (?, 1, 'Singles', ?, ?, ?, ?, ?)",
+            (ticket_id, last_activity, last_activity, last_prompt_at, snooze_until, next_check_at))
+
+
+def _next_check(conn, ticket_id):
+    return conn.execute("SELECT next_check_at FROM tickets WHERE id = ?", (ticket_id,)).fetchone()[0]
+
+
+def _run():
+    asyncio.run(bot.check_timeouts(SimpleNamespace(bot=None)))
+
+
+def test_expired_snooze_on_a_fresh_ticket_waits_for_the_inactivity_timeout(db, prompts):
+    now = time.time()
+    # "Keep Open" pressed on an old alert after the customer wrote again; that snooze has now run out
+    _ticket(db, "T1", now - 3600, snooze_until=now - 60, next_check_at=now - 60)
+
+    _run()
+
+    assert prompts == []
+    assert _next_check(db, "T1") == pytest.approx(now - 3600 + bot.TICKET_TIMEOUT)
+    assert bot.db_get_due_tickets(time.time() + 60) == []
+
+
+def test_expired_snooze_on_a_quiet_ticket_prompts_again(db, prompts):
+    now = time.time()
+    last_activity = now - bot.TICKET_TIMEOUT - 5 * 3600
+    _ticket(db, "T1", last_activity, last_prompt_at=now - 4 * 3600, snooze_until=now - 60, next_check_at=now - 60)
+
+    _run()
+
+    assert len(prompts) == 1 and "T1" in prompts[0]
+    assert _next_check(db, "T1") == pytest.approx(last_activity + bot.DELETE_TIMEOUT)
+
+
+def test_due_tickets_are_prompted_or_closed(db, prompts):
+    now = time.time()
+    _ticket(db, "T1", now - 3600, next_check_at=now - 3600 + bot.TICKET_TIMEOUT)
+    _ticket(db, "T2", now - bot.TICKET_TIMEOUT - 60, next_check_at=now - 60)
+    _ticket(db, "T3", now - bot.DELETE_TIMEOUT - 60, last_prompt_at=now - 86400, next_check_at=now - 60)
+
+    _run()
+
+    assert len(prompts) == 2 and "T3 closed" in prompts[0] and "T2 has been inactive" in prompts[1]
+    assert db.execute("SELECT closed FROM tickets WHERE id = 'T3'").fetchone()[0] == 1
+    assert _next_check(db, "T1") == pytest.approx(now - 3600 + bot.TICKET_TIMEOUT)